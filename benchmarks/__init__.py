@@ -0,0 +1,3 @@
+"""
+Nuqql-based benchmarks
+"""
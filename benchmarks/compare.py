@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+Compare the JSON results of two load benchmark runs
+"""
+
+import argparse
+import json
+import sys
+
+from typing import Any, Dict, Iterator, Tuple
+
+# metrics where higher values are better, lower is better for all others
+HIGHER_IS_BETTER = ("throughput_rps", )
+
+
+def get_metrics(results: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """
+    Get the compared metrics of benchmark results as (name, value) tuples
+    """
+
+    yield "throughput_rps", results["throughput_rps"]
+    for cmd, latency in results["latency"].items():
+        for key in ("p50_us", "p99_us", "p999_us"):
+            if key in latency:
+                yield f"{cmd} {key}", latency[key]
+    for key, value in results.get("memory", {}).items():
+        yield key, value
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any],
+            threshold: float) -> int:
+    """
+    Print the changes of all metrics from old to new results and return the
+    number of metrics that got worse by more than threshold percent
+    """
+
+    new_metrics = dict(get_metrics(new))
+    regressions = 0
+    print(f"{'metric':<24} {'old':>14} {'new':>14} {'change':>9}")
+    for name, old_value in get_metrics(old):
+        if name not in new_metrics:
+            continue
+        new_value = new_metrics[name]
+        change = (new_value - old_value) / old_value * 100 if old_value \
+            else 0.0
+        worse = -change if name in HIGHER_IS_BETTER else change
+        mark = ""
+        if worse > threshold:
+            mark = " !"
+            regressions += 1
+        print(f"{name:<24} {old_value:>14.1f} {new_value:>14.1f} "
+              f"{change:>+8.1f}%{mark}")
+    return regressions
+
+
+def main() -> int:
+    """
+    Main entry point, returns 1 if a metric regressed more than threshold
+    """
+
+    parser = argparse.ArgumentParser(description="Compare results of two "
+                                     "load benchmark runs.")
+    parser.add_argument("old", help="JSON results of the old run")
+    parser.add_argument("new", help="JSON results of the new run")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="set maximum regression of a metric in percent")
+    args = parser.parse_args()
+
+    with open(args.old, encoding="UTF-8") as old_file:
+        old = json.load(old_file)
+    with open(args.new, encoding="UTF-8") as new_file:
+        new = json.load(new_file)
+
+    if old.get("config") != new.get("config"):
+        print("warning: runs use different configurations", file=sys.stderr)
+    if compare(old, new, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
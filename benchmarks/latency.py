@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""
+Latency benchmark: runs the same workload over an AF_UNIX and an AF_INET
+endpoint of a single backend and compares the round trip times
+"""
+
+import argparse
+import json
+import pathlib
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Any, Dict, List
+
+# based.py helper script in the repository root
+BASED = pathlib.Path(__file__).resolve().parents[1] / "based.py"
+
+
+def connect(family: int, addr: Any, timeout: float = 10.0) -> socket.socket:
+    """
+    Connect to the backend, tries to reach the server until timeout
+    """
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(addr)
+            sock.settimeout(timeout)
+            return sock
+        except OSError:
+            sock.close()
+            time.sleep(0.01)
+    raise TimeoutError("server did not start")
+
+
+def measure(sock: socket.socket, cmd: str, requests: int) -> List[float]:
+    """
+    Send cmd requests times, each after the reply to the previous one, and
+    return the round trip times in seconds
+    """
+
+    if sock.family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    data = f"{cmd}\r\n".encode()
+    times = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        sock.sendall(data)
+        reply = b""
+        while not reply.endswith(b"\r\n"):
+            reply += sock.recv(4096)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    """
+    Summarize round trip times in microseconds
+    """
+
+    times = sorted(times)
+    return {
+        "requests": len(times),
+        "mean_us": statistics.mean(times) * 1e6,
+        "p50_us": times[len(times) // 2] * 1e6,
+        "p99_us": times[int(len(times) * 0.99)] * 1e6,
+        "max_us": times[-1] * 1e6,
+    }
+
+
+def run(cmd: str, requests: int, port: int) -> Dict[str, Dict[str, float]]:
+    """
+    Start the backend listening on an AF_UNIX and an AF_INET endpoint and
+    measure the round trip times of cmd on both endpoints
+    """
+
+    test_dir = tempfile.mkdtemp()
+    proc = subprocess.Popen([sys.executable, str(BASED), "--dir", test_dir,
+                             "--listen", f"inet:localhost:{port}",
+                             "--listen", "unix:latency.sock"],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    endpoints = {
+        "unix": (socket.AF_UNIX, f"{test_dir}/latency.sock"),
+        "inet": (socket.AF_INET, ("localhost", port)),
+    }
+    results = {}
+    try:
+        for name, (family, addr) in endpoints.items():
+            # only one client can be connected at a time, wait until the
+            # server closed the connection before using the next endpoint
+            with connect(family, addr) as sock:
+                results[name] = summarize(measure(sock, cmd, requests))
+                sock.sendall(b"bye\r\n")
+                while sock.recv(4096):
+                    pass
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(test_dir)
+    return results
+
+
+def main() -> int:
+    """
+    Main entry point
+    """
+
+    parser = argparse.ArgumentParser(description="Compare AF_UNIX and "
+                                     "AF_INET latency of nuqql-based.")
+    parser.add_argument("--cmd", default="version",
+                        help="set command sent in every request")
+    parser.add_argument("--requests", type=int, default=10000,
+                        help="set number of requests per endpoint")
+    parser.add_argument("--port", type=int, default=32000,
+                        help="set AF_INET listen port of the backend")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.cmd, args.requests, args.port), indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+
+"""
+Load generator benchmark: drives a configurable mix of account commands
+against a backend over an AF_INET or AF_UNIX connection, or an in-memory
+connection to the dummy backend in the same process, and reports throughput,
+latency percentiles and memory usage of the backend as JSON
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import pathlib
+import platform
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# based.py helper script in the repository root
+BASED = pathlib.Path(__file__).resolve().parents[1] / "based.py"
+
+# commands of the load generator and their default weights
+DEFAULT_MIX = "send=70,chat=10,buddies=15,collect=5"
+COMMANDS = ("send", "chat", "buddies", "collect")
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """
+    Parse a command mix like "send=70,collect=30" into command weights
+    """
+
+    weights = {}
+    for item in mix.split(","):
+        name, _sep, weight = item.partition("=")
+        name = name.strip()
+        if name not in COMMANDS:
+            raise ValueError(f"unknown command {name} in mix")
+        weights[name] = int(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("mix without commands")
+    return weights
+
+
+def percentiles(times: List[float]) -> Dict[str, float]:
+    """
+    Summarize latencies in microseconds
+    """
+
+    if not times:
+        return {"count": 0}
+    times = sorted(times)
+    last = len(times) - 1
+    return {
+        "count": len(times),
+        "mean_us": sum(times) / len(times) * 1e6,
+        "p50_us": times[min(int(len(times) * 0.5), last)] * 1e6,
+        "p99_us": times[min(int(len(times) * 0.99), last)] * 1e6,
+        "p999_us": times[min(int(len(times) * 0.999), last)] * 1e6,
+        "max_us": times[last] * 1e6,
+    }
+
+
+def get_memory(pid: int) -> Dict[str, int]:
+    """
+    Get current and peak resident set size of process pid in KiB, only
+    available on Linux
+    """
+
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="UTF-8") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    memory["rss_kb"] = int(line.split()[1])
+                if line.startswith("VmHWM:"):
+                    memory["rss_peak_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+# pylint: disable=too-many-instance-attributes
+class LoadClient:
+    """
+    Client that sends requests and matches replies to measure latencies
+    """
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter, acc_id: int,
+                 concurrency: int) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.acc_id = acc_id
+        self.slots = asyncio.Semaphore(concurrency)
+
+        # pending requests: send and chat replies contain the request token,
+        # buddies and collect replies arrive in order
+        self.pending_tokens: Dict[str, Tuple[str, float]] = {}
+        self.pending_fifo: Dict[str, Deque[float]] = {
+            "buddies": collections.deque(),
+            "collect": collections.deque(),
+        }
+        self.latencies: Dict[str, List[float]] = {cmd: [] for cmd in COMMANDS}
+        self.completed = 0
+        self.requests = 0
+        self.all_done = asyncio.Event()
+
+    def _done(self, cmd: str, start: float) -> None:
+        self.latencies[cmd].append(time.perf_counter() - start)
+        self.slots.release()
+        self.completed += 1
+        if self.completed == self.requests:
+            self.all_done.set()
+
+    async def read_replies(self) -> None:
+        """
+        Read replies of the backend and complete pending requests
+        """
+
+        buddies = f"info: got buddies for account {self.acc_id}."
+        collect = f"info: collected messages for account {self.acc_id}."
+        while True:
+            line = (await self.reader.readline()).decode().rstrip("\r\n")
+            if not line:
+                return
+            if line.startswith(("message: ", "chat: msg: ")):
+                token = line.rsplit(" ", 1)[-1]
+                pending = self.pending_tokens.pop(token, None)
+                if pending:
+                    self._done(*pending)
+            elif line == buddies:
+                self._done("buddies", self.pending_fifo["buddies"].popleft())
+            elif line == collect:
+                self._done("collect", self.pending_fifo["collect"].popleft())
+
+    def _request(self, cmd: str, seq: int, start: float) -> str:
+        """
+        Create request for cmd and register it as pending
+        """
+
+        if cmd == "send":
+            token = f"T{seq}"
+            self.pending_tokens[token] = (cmd, start)
+            return f"account {self.acc_id} send buddy{seq % 100}@bench {token}"
+        if cmd == "chat":
+            token = f"T{seq}"
+            self.pending_tokens[token] = (cmd, start)
+            return f"account {self.acc_id} chat send chat{seq % 10} {token}"
+        self.pending_fifo[cmd].append(start)
+        return f"account {self.acc_id} {cmd}"
+
+    async def run(self, weights: Dict[str, int], requests: int,
+                  seed: int) -> float:
+        """
+        Send requests with the command weights, return elapsed time after all
+        replies were received
+        """
+
+        rand = random.Random(seed)
+        cmds = list(weights)
+        cmd_weights = [weights[cmd] for cmd in cmds]
+        self.requests = requests
+        reader_task = asyncio.create_task(self.read_replies())
+
+        start = time.perf_counter()
+        for seq in range(requests):
+            await self.slots.acquire()
+            cmd = rand.choices(cmds, cmd_weights)[0]
+            request = self._request(cmd, seq, time.perf_counter())
+            self.writer.write(f"{request}\r\n".encode())
+            await self.writer.drain()
+
+        # wait for remaining replies
+        done_task = asyncio.create_task(self.all_done.wait())
+        await asyncio.wait([done_task, reader_task],
+                           return_when=asyncio.FIRST_COMPLETED)
+        elapsed = time.perf_counter() - start
+        reader_task.cancel()
+        try:
+            await reader_task
+        except asyncio.CancelledError:
+            # reader task was cancelled while waiting for replies
+            pass
+        if not done_task.done():
+            done_task.cancel()
+            raise ConnectionError("backend closed connection")
+        return elapsed
+
+
+async def connect(af: str, addr: Any,
+                  timeout: float = 10.0) -> Tuple[asyncio.StreamReader,
+                                                  asyncio.StreamWriter]:
+    """
+    Connect to the backend, tries to reach the server until timeout
+    """
+
+    if af == "memory":
+        # pylint: disable=import-outside-toplevel
+        import nuqql_based.memory
+        return await nuqql_based.memory.open_connection(addr)
+
+    start = time.perf_counter()
+    while True:
+        try:
+            if af == "unix":
+                return await asyncio.open_unix_connection(addr)
+            return await asyncio.open_connection(*addr)
+        except OSError:
+            if time.perf_counter() - start > timeout:
+                raise
+            await asyncio.sleep(0.01)
+
+
+async def _run(args: argparse.Namespace, addr: Any) -> Dict[str, Any]:
+    """
+    Connect to the backend, add the benchmark account and run the load
+    """
+
+    reader, writer = await connect(args.af, addr)
+
+    # add account used by the benchmark
+    writer.write(b"account add dummy bench@example.com password\r\n")
+    while True:
+        line = (await reader.readline()).decode()
+        if not line:
+            raise ConnectionError("backend closed connection")
+        if line.startswith("info: added account ") or \
+                line.startswith("info: account already exists."):
+            break
+    writer.write(b"account list\r\n")
+    acc_id = -1
+    while True:
+        line = (await reader.readline()).decode()
+        if line.startswith("account: ") and "bench@example.com" in line:
+            acc_id = int(line.split()[1])
+        if line.startswith("info: listed accounts."):
+            break
+
+    client = LoadClient(reader, writer, acc_id, args.concurrency)
+    elapsed = await client.run(parse_mix(args.mix), args.requests, args.seed)
+    writer.write(b"bye\r\n")
+    writer.close()
+
+    all_times = [latency for times in client.latencies.values()
+                 for latency in times]
+    return {
+        "elapsed_s": elapsed,
+        "throughput_rps": args.requests / elapsed,
+        "latency": {
+            "all": percentiles(all_times),
+            **{cmd: percentiles(times)
+               for cmd, times in client.latencies.items() if times},
+        },
+    }
+
+
+async def _run_memory(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Set up the dummy backend in this process and run the load over an
+    in-memory connection
+    """
+
+    # use nuqql_based of this repository like based.py
+    sys.path.insert(0, str(BASED.parent))
+    # pylint: disable=import-outside-toplevel
+    import nuqql_based.main
+
+    test_dir = tempfile.mkdtemp()
+    based = nuqql_based.main.create_based()
+    try:
+        await based.setup(["--dir", test_dir] +
+                          shlex.split(args.backend_args))
+        results = await _run(args, based.server)
+        await based.shutdown()
+    finally:
+        shutil.rmtree(test_dir)
+    return results
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Start the backend unless an address is given, run the load and return
+    the results
+    """
+
+    results: Dict[str, Any] = {
+        "benchmark": "load",
+        "time": int(time.time()),
+        "python": platform.python_version(),
+        "config": {
+            "af": args.af,
+            "mix": args.mix,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "backend_args": args.backend_args,
+        },
+    }
+
+    if args.af == "memory":
+        # client and backend share this process
+        results.update(asyncio.run(_run_memory(args)))
+        results["memory"] = get_memory(os.getpid())
+        return results
+
+    if args.connect:
+        addr: Any = args.connect
+        if args.af == "inet":
+            host, _sep, port = args.connect.rpartition(":")
+            addr = (host, int(port))
+        results.update(asyncio.run(_run(args, addr)))
+        return results
+
+    test_dir = tempfile.mkdtemp()
+    cmd = [sys.executable, str(BASED), "--dir", test_dir, "--af", args.af,
+           "--port", str(args.port)] + shlex.split(args.backend_args)
+    proc: Optional[subprocess.Popen] = None
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+        addr = ("localhost", args.port)
+        if args.af == "unix":
+            addr = f"{test_dir}/based.sock"
+        results.update(asyncio.run(_run(args, addr)))
+        results["memory"] = get_memory(proc.pid)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+        shutil.rmtree(test_dir)
+    return results
+
+
+def main() -> int:
+    """
+    Main entry point
+    """
+
+    parser = argparse.ArgumentParser(description="Generate load on "
+                                     "nuqql-based and measure throughput, "
+                                     "latency and memory usage.")
+    parser.add_argument("--af", choices=["inet", "unix", "memory"],
+                        default="unix",
+                        help="set socket address family, memory runs the "
+                        "backend in-process with an in-memory connection")
+    parser.add_argument("--port", type=int, default=32000,
+                        help="set AF_INET listen port of the started backend")
+    parser.add_argument("--connect", metavar="ADDRESS",
+                        help="use running backend at ADDRESS (HOST:PORT or "
+                        "socket file) instead of starting one")
+    parser.add_argument("--backend-args", default="",
+                        help="set additional arguments of started backend")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="set command mix as COMMAND=WEIGHT list, "
+                        f"commands: {', '.join(COMMANDS)}")
+    parser.add_argument("--requests", type=int, default=20000,
+                        help="set number of requests")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="set number of outstanding requests")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="set seed of the command mix")
+    parser.add_argument("--output", help="write results to JSON file")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as out_file:
+            out_file.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
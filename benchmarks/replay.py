@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+"""
+Replay benchmark: replays client sessions recorded with the --record option
+against the dummy backend in the same process over an in-memory connection,
+or against a running backend, at original speed or as fast as possible and
+reports throughput, schedule lag and memory usage as JSON
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import platform
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+# use nuqql_based and benchmarks of this repository like based.py
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+from benchmarks.load import connect, get_memory, percentiles  # noqa: E402
+from nuqql_based import record  # noqa: E402
+from nuqql_based.parser import parse_line  # noqa: E402
+
+if TYPE_CHECKING:   # imports for typing
+    from nuqql_based.based import Based  # noqa
+
+
+class Replay:
+    """
+    Replay of recorded sessions
+    """
+
+    def __init__(self, args: argparse.Namespace,
+                 based: Optional["Based"] = None) -> None:
+        self.args = args
+        self.based = based
+        self.commands = 0
+        self.events = 0
+        self.replies = 0
+        self.lags: List[float] = []
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        """
+        Read and count replies of the backend until it closes the connection
+        """
+
+        while await reader.readline():
+            self.replies += 1
+
+    async def _add_accounts(self, session: List[record.Record]) -> None:
+        """
+        Add the accounts of the session to the in-process backend
+        """
+
+        assert self.based
+        accounts = self.based.accounts.get()
+        for _offset, kind, text in session:
+            if kind != record.ACCOUNT:
+                continue
+            acc_id, acc_type, acc_user = text.split(" ", 2)
+            if int(acc_id) not in accounts:
+                await self.based.accounts.add(acc_type, acc_user, "",
+                                              int(acc_id))
+
+    def _inject(self, text: str) -> None:
+        """
+        Inject a recorded event into the in-process backend like the backend
+        would receive it from its account
+        """
+
+        assert self.based
+        event = parse_line(text)
+        acc = self.based.accounts.get().get(getattr(event, "aid", -1))
+        if acc:
+            acc.receive_msg(event)
+        else:
+            self.based.queue.put_nowait(event)
+
+    async def _wait(self, start: float, offset: float) -> None:
+        """
+        Wait until offset seconds of the session passed at replay speed
+        """
+
+        if self.args.speed <= 0:
+            return
+        delay = offset / self.args.speed - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self.lags.append(-delay)
+
+    async def run_session(self, session: List[record.Record],
+                          addr: Any) -> None:
+        """
+        Replay a single session: send its commands and inject its events
+        """
+
+        if self.based:
+            await self._add_accounts(session)
+        reader, writer = await connect(self.args.af, addr)
+        reader_task = asyncio.create_task(self._read_replies(reader))
+        start = time.perf_counter()
+        last = ""
+        for offset, kind, text in session:
+            if kind == record.EVENT and self.args.events:
+                await self._wait(start, offset)
+                self._inject(text)
+                self.events += 1
+            if kind == record.COMMAND:
+                # do not stop the backend, replay quit as bye
+                last = "bye" if text == "quit" else text
+                await self._wait(start, offset)
+                writer.write(f"{last}\r\n".encode())
+                await writer.drain()
+                self.commands += 1
+                if last == "bye":
+                    break
+
+        # the backend handles commands in order, so it handled all commands
+        # when it closes the connection after bye
+        if last != "bye":
+            writer.write(b"bye\r\n")
+        await reader_task
+        writer.close()
+        await writer.wait_closed()
+
+    async def run(self, sessions: List[List[record.Record]],
+                  addr: Any) -> float:
+        """
+        Replay all sessions and return elapsed time
+        """
+
+        start = time.perf_counter()
+        for session in sessions:
+            await self.run_session(session, addr)
+        return time.perf_counter() - start
+
+
+async def _run_memory(args: argparse.Namespace,
+                      sessions: List[List[record.Record]]) -> Dict[str, Any]:
+    """
+    Set up the dummy backend in this process and replay the sessions over
+    in-memory connections
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import nuqql_based.main
+
+    test_dir = tempfile.mkdtemp()
+    based = nuqql_based.main.create_based()
+    try:
+        await based.setup(["--dir", test_dir] +
+                          shlex.split(args.backend_args))
+        replay = Replay(args, based)
+        elapsed = await replay.run(sessions, based.server)
+        await based.shutdown()
+    finally:
+        shutil.rmtree(test_dir)
+    return _get_results(replay, elapsed)
+
+
+async def _run_connect(args: argparse.Namespace, addr: Any,
+                       sessions: List[List[record.Record]]) -> Dict[str, Any]:
+    """
+    Replay the sessions against a running backend
+    """
+
+    replay = Replay(args)
+    elapsed = await replay.run(sessions, addr)
+    return _get_results(replay, elapsed)
+
+
+def _get_results(replay: Replay, elapsed: float) -> Dict[str, Any]:
+    """
+    Get the results of a replay
+    """
+
+    return {
+        "elapsed_s": elapsed,
+        "commands": replay.commands,
+        "events": replay.events,
+        "replies": replay.replies,
+        "throughput_rps": replay.commands / elapsed if elapsed else 0.0,
+        "latency": {
+            "lag": percentiles(replay.lags),
+        },
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Replay the recording and return the results
+    """
+
+    sessions = record.load(pathlib.Path(args.recording))
+    results: Dict[str, Any] = {
+        "benchmark": "replay",
+        "time": int(time.time()),
+        "python": platform.python_version(),
+        "config": {
+            "recording": pathlib.Path(args.recording).name,
+            "sessions": len(sessions),
+            "af": args.af,
+            "speed": args.speed,
+            "events": args.events,
+            "backend_args": args.backend_args,
+        },
+    }
+
+    if args.af == "memory":
+        results.update(asyncio.run(_run_memory(args, sessions)))
+        results["memory"] = get_memory(os.getpid())
+        return results
+
+    addr: Any = args.connect
+    if args.af == "inet":
+        host, _sep, port = args.connect.rpartition(":")
+        addr = (host, int(port))
+    results.update(asyncio.run(_run_connect(args, addr, sessions)))
+    return results
+
+
+def main() -> int:
+    """
+    Main entry point
+    """
+
+    parser = argparse.ArgumentParser(description="Replay recorded client "
+                                     "sessions against nuqql-based.")
+    parser.add_argument("recording", help="recording file created with the "
+                        "--record option of the backend")
+    parser.add_argument("--af", choices=["inet", "unix", "memory"],
+                        default="memory",
+                        help="set socket address family, memory runs the "
+                        "dummy backend in-process with an in-memory "
+                        "connection")
+    parser.add_argument("--connect", metavar="ADDRESS",
+                        help="use running backend at ADDRESS (HOST:PORT or "
+                        "socket file), required for inet and unix")
+    parser.add_argument("--backend-args", default="",
+                        help="set additional arguments of the in-process "
+                        "backend")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="set replay speed relative to the recording, "
+                        "0 replays as fast as possible")
+    parser.add_argument("--events", action="store_true",
+                        help="inject recorded backend events that are not "
+                        "results of commands into the in-process backend")
+    parser.add_argument("--output", help="write results to JSON file")
+    args = parser.parse_args()
+    if args.af != "memory" and not args.connect:
+        parser.error("--connect is required for inet and unix")
+    if args.af != "memory" and args.events:
+        parser.error("--events requires the in-process backend")
+
+    results = run(args)
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as out_file:
+            out_file.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+"""
+Soak test: runs the dummy backend in this process under sustained load
+through many connect/disconnect cycles over in-memory connections, takes
+periodic tracemalloc snapshots and fails if the retained memory per account
+or per connection grows past a threshold
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import pathlib
+import platform
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from typing import TYPE_CHECKING, Any, Dict, List
+
+# use nuqql_based and benchmarks of this repository like based.py
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+from benchmarks.load import DEFAULT_MIX, LoadClient, parse_mix  # noqa: E402
+from nuqql_based.main import create_based  # noqa: E402
+from nuqql_based.memory import open_connection  # noqa: E402
+
+if TYPE_CHECKING:   # imports for typing
+    from nuqql_based.based import Based  # noqa
+
+# traces of the soak test itself are not attributed to the backend
+TRACE_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def get_traced() -> int:
+    """
+    Collect garbage and get the size of the currently traced memory blocks
+    """
+
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def get_top(snapshot: tracemalloc.Snapshot, baseline: tracemalloc.Snapshot,
+            num: int) -> List[Dict[str, Any]]:
+    """
+    Get the num source lines with the largest memory growth since baseline
+    """
+
+    top = []
+    stats = snapshot.filter_traces(TRACE_FILTERS).compare_to(
+        baseline.filter_traces(TRACE_FILTERS), "lineno")
+    stats = sorted([stat for stat in stats if stat.size_diff > 0],
+                   key=lambda stat: stat.size_diff, reverse=True)
+    for stat in stats[:num]:
+        frame = stat.traceback[0]
+        top.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+        })
+    return top
+
+
+async def run_cycle(based: "Based", args: argparse.Namespace,
+                    cycle: int) -> None:
+    """
+    Connect a client, run the load on one of the accounts and disconnect
+    """
+
+    reader, writer = await open_connection(based.server)
+    client = LoadClient(reader, writer, cycle % args.accounts,
+                        args.concurrency)
+    await client.run(parse_mix(args.mix), args.requests, args.seed + cycle)
+    writer.write(b"bye\r\n")
+    while await reader.read(65536):
+        pass
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Set up the dummy backend with the accounts and run the cycles
+    """
+
+    test_dir = tempfile.mkdtemp()
+    based = create_based()
+    try:
+        await based.setup(["--dir", test_dir] +
+                          shlex.split(args.backend_args))
+        for acc_id in range(args.accounts):
+            await based.accounts.add("dummy", f"soak{acc_id}@example.com",
+                                     "password", acc_id)
+
+        # warm up until history, roster and caches reached their size
+        start = time.perf_counter()
+        for cycle in range(args.warmup):
+            await run_cycle(based, args, cycle)
+        baseline_size = get_traced()
+        baseline = tracemalloc.take_snapshot()
+
+        # measure growth of retained memory
+        samples = []
+        for cycle in range(1, args.cycles + 1):
+            await run_cycle(based, args, args.warmup + cycle)
+            if cycle % args.interval == 0 or cycle == args.cycles:
+                samples.append([cycle, get_traced() - baseline_size])
+        growth = get_traced() - baseline_size
+        snapshot = tracemalloc.take_snapshot()
+        elapsed = time.perf_counter() - start
+        await based.shutdown()
+    finally:
+        shutil.rmtree(test_dir)
+
+    per_connection = growth / args.cycles
+    per_account = growth / args.accounts
+    return {
+        "elapsed_s": elapsed,
+        "baseline_bytes": baseline_size,
+        "growth_bytes": growth,
+        "per_connection_bytes": per_connection,
+        "per_account_bytes": per_account,
+        "samples": samples,
+        "top": get_top(snapshot, baseline, args.top),
+        "passed": per_connection <= args.max_per_connection and
+        per_account <= args.max_per_account,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run the soak test with tracemalloc and return the results
+    """
+
+    results: Dict[str, Any] = {
+        "benchmark": "soak",
+        "time": int(time.time()),
+        "python": platform.python_version(),
+        "config": {
+            "accounts": args.accounts,
+            "cycles": args.cycles,
+            "warmup": args.warmup,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "seed": args.seed,
+            "backend_args": args.backend_args,
+            "max_per_connection": args.max_per_connection,
+            "max_per_account": args.max_per_account,
+        },
+    }
+
+    tracemalloc.start(args.frames)
+    try:
+        results.update(asyncio.run(_run(args)))
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def main() -> int:
+    """
+    Main entry point, returns 1 if retained memory grew past a threshold
+    """
+
+    parser = argparse.ArgumentParser(description="Run the dummy backend "
+                                     "under sustained load and detect "
+                                     "memory growth.")
+    parser.add_argument("--accounts", type=int, default=10,
+                        help="set number of accounts")
+    parser.add_argument("--cycles", type=int, default=200,
+                        help="set number of measured connect/disconnect "
+                        "cycles")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="set number of cycles before the baseline")
+    parser.add_argument("--interval", type=int, default=20,
+                        help="set number of cycles between memory samples")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="set number of requests per cycle")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="set number of outstanding requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="set command mix as COMMAND=WEIGHT list")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="set seed of the command mix")
+    parser.add_argument("--backend-args", default="--history-size 100",
+                        help="set additional arguments of the backend")
+    parser.add_argument("--max-per-connection", type=float, default=512,
+                        help="set maximum memory growth per connection in "
+                        "bytes")
+    parser.add_argument("--max-per-account", type=float, default=16384,
+                        help="set maximum memory growth per account in "
+                        "bytes")
+    parser.add_argument("--frames", type=int, default=1,
+                        help="set number of frames tracemalloc stores per "
+                        "allocation")
+    parser.add_argument("--top", type=int, default=10,
+                        help="set number of source lines with the largest "
+                        "growth in the results")
+    parser.add_argument("--output", help="write results to JSON file")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as out_file:
+            out_file.write(output + "\n")
+    if not results["passed"]:
+        print("error: retained memory grew past threshold", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Startup benchmark: measures the time from starting based.py until the first
+client connection is accepted and answered by the server
+"""
+
+import argparse
+import json
+import pathlib
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Dict, List
+
+# based.py helper script in the repository root
+BASED = pathlib.Path(__file__).resolve().parents[1] / "based.py"
+
+# default regression threshold in seconds for the median startup time
+DEFAULT_THRESHOLD = 2.0
+
+
+def measure_startup(timeout: float = 10.0) -> float:
+    """
+    Start based.py with an AF_UNIX socket in a temporary directory and
+    return the time in seconds until the server replied to the version
+    command of the first client connection
+    """
+
+    test_dir = tempfile.mkdtemp()
+    sockfile = pathlib.Path(test_dir) / "based.sock"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, str(BASED), "--dir", test_dir,
+                             "--af", "unix"],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(str(sockfile))
+                except OSError:
+                    time.sleep(0.001)
+                    continue
+                sock.settimeout(timeout)
+                sock.sendall(b"version\r\n")
+                if sock.recv(1024):
+                    return time.perf_counter() - start
+        raise TimeoutError("server did not start")
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(test_dir)
+
+
+def run(runs: int) -> Dict[str, float]:
+    """
+    Measure startup time runs times and return the results in seconds
+    """
+
+    times: List[float] = [measure_startup() for _ in range(runs)]
+    return {
+        "runs": runs,
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+    }
+
+
+def main() -> int:
+    """
+    Main entry point, returns 1 if median startup time exceeds threshold
+    """
+
+    parser = argparse.ArgumentParser(description="Measure startup time of "
+                                     "nuqql-based.")
+    parser.add_argument("--runs", type=int, default=10,
+                        help="set number of measured startups")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="set maximum median startup time in seconds")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    print(json.dumps(results, indent=4))
+    if results["median"] > args.threshold:
+        print(f"median startup time exceeds threshold of "
+              f"{args.threshold}s", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""
+Helper script for starting a backend with socket activation: creates the
+listening socket, passes it to the backend with the LISTEN_FDS and LISTEN_PID
+environment variables and keeps it open while the backend is (re)started, so
+no client connection is refused. Example:
+
+    launcher.py --af unix --sockfile based.sock --lazy -- ./based.py --dir .
+"""
+
+import argparse
+import os
+import select
+import socket
+import sys
+import time
+
+# file descriptor of the first passed socket in socket activation
+LISTEN_FDS_START = 3
+
+# maximum delay before restarting the backend in seconds, the delay is doubled
+# every time the backend exits before running this long
+RESTART_DELAY_MAX = 60.0
+
+
+def create_socket(args: argparse.Namespace) -> socket.socket:
+    """
+    Create the listening socket
+    """
+
+    if args.af == "unix":
+        try:
+            os.unlink(args.sockfile)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(args.sockfile)
+        os.chmod(args.sockfile, 0o600)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((args.address, args.port))
+    sock.listen()
+    return sock
+
+
+def run_backend(sock: socket.socket, command: list) -> int:
+    """
+    Run the backend command with the listening socket and return its exit
+    status
+    """
+
+    pid = os.fork()
+    if pid == 0:
+        # child: move socket to first socket activation file descriptor
+        if sock.fileno() != LISTEN_FDS_START:
+            os.dup2(sock.fileno(), LISTEN_FDS_START)
+        else:
+            os.set_inheritable(LISTEN_FDS_START, True)
+        os.environ["LISTEN_PID"] = str(os.getpid())
+        os.environ["LISTEN_FDS"] = "1"
+        try:
+            os.execvp(command[0], command)
+        finally:
+            os._exit(127)   # pylint: disable=protected-access
+
+    _pid, status = os.waitpid(pid, 0)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return 1
+
+
+def main() -> int:
+    """
+    Main entry point
+    """
+
+    parser = argparse.ArgumentParser(description="Start nuqql backend with "
+                                     "socket activation.")
+    parser.add_argument("--af", choices=["inet", "unix"], default="inet",
+                        help="set socket address family")
+    parser.add_argument("--address", default="localhost",
+                        help="set AF_INET listen address")
+    parser.add_argument("--port", type=int, default=32000,
+                        help="set AF_INET listen port")
+    parser.add_argument("--sockfile", default="based.sock",
+                        help="set AF_UNIX socket file")
+    parser.add_argument("--lazy", action="store_true",
+                        help="start backend on first client connection")
+    parser.add_argument("--restart", action="store_true",
+                        help="restart backend when it exits")
+    parser.add_argument("--restart-delay", type=float, default=1.0,
+                        help="set initial delay before restarting backend")
+    parser.add_argument("--restart-limit", type=int, default=0,
+                        help="set maximum number of restarts (0: no limit)")
+    parser.add_argument("command", nargs="+", help="backend command")
+    args = parser.parse_args()
+
+    sock = create_socket(args)
+    if args.lazy:
+        select.select([sock], [], [])
+
+    restarts = 0
+    delay = args.restart_delay
+    while True:
+        start = time.monotonic()
+        exit_code = run_backend(sock, args.command)
+        if not args.restart or 0 < args.restart_limit <= restarts:
+            return exit_code
+
+        # wait before restarting, increase delay if backend keeps crashing
+        if time.monotonic() - start > RESTART_DELAY_MAX:
+            delay = args.restart_delay
+        print(f"backend exited with status {exit_code}, restarting in "
+              f"{delay}s", file=sys.stderr)
+        time.sleep(delay)
+        delay = min(delay * 2, RESTART_DELAY_MAX)
+        restarts += 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
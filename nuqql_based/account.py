@@ -2,22 +2,31 @@
 Nuqql-based accounts
 """
 
-import configparser
+import collections
+import contextlib
 import logging
 import asyncio
+import fcntl
 import stat
 import os
 
-from typing import TYPE_CHECKING, List, Dict
+from typing import TYPE_CHECKING, Deque, Dict, Iterable, Iterator, List, \
+    Optional, Union
 
+from nuqql_based import record
 from nuqql_based.callback import Callback
+from nuqql_based.chat import ChatStore
+from nuqql_based.event import Event, EventBatch, TextEvent
+from nuqql_based.executor import in_loop
 from nuqql_based.message import Message
+from nuqql_based.roster import Roster
 
 if TYPE_CHECKING:   # imports for typing
     # pylint: disable=cyclic-import
     from logging import Logger  # noqa
     from nuqql_based.callback import Callbacks  # noqa
     from nuqql_based.config import Config  # noqa
+    from nuqql_based.worker import WorkerPool  # noqa
 
 
 # pylint: disable=too-many-instance-attributes
@@ -34,10 +43,15 @@ class Account:
         self.user = "dummy@dummy.com"
         self.password = "dummy_password"
         self.status = "online"
-        self._history: List[str] = []
+        # message history, the oldest messages are dropped if it is full
+        history_size = config.get_history_size() if config else 0
+        self._history: Deque[Event] = collections.deque(
+            maxlen=history_size or None)
         self.config = config
         self.callbacks = callbacks
         self.queue = queue
+        self.roster = Roster(self)
+        self.chats = ChatStore(self)
 
     async def send_msg(self, user: str, msg: str) -> None:
         """
@@ -49,30 +63,72 @@ class Account:
             await self.callbacks.call(Callback.SEND_MESSAGE, self, (user, msg))
 
         # log message
-        log_msg = f"message: to {user}: {msg}"
-        logging.info(log_msg)
+        logging.info("message: to %s: %s", user, msg)
 
-    def receive_msg(self, msg: str) -> None:
+    @in_loop
+    def receive_msg(self, msg: Union[Event, str]) -> None:
         """
-        Receive a message from other users or the backend
+        Receive a message from other users or the backend. The message is
+        either an event or, for compatibility, an already formatted string.
         """
 
+        if isinstance(msg, str):
+            msg = TextEvent(msg)
+
+        record.add_result(msg)
         self.queue.put_nowait(msg)
 
-        if Message.is_message(msg) and self.config.get_history():
+        if msg.is_message and self.config.get_history():
             # TODO: add timestamp?
             self._history.append(msg)
 
+    @in_loop
+    def invalidate_cache(self, name: Optional[Callback] = None) -> None:
+        """
+        Remove cached results of callback name or, if name is None, of all
+        callbacks of this account, e.g., after a presence change
+        """
+
+        self.callbacks.cache.invalidate(name, self)
+
+    @in_loop
+    def receive_msgs(self, msgs: Iterable[Union[Event, str]]) -> None:
+        """
+        Receive multiple messages from other users or the backend, e.g., when
+        catching up after a reconnect. The messages are put on the message
+        queue as a single batch.
+        """
+
+        events = [TextEvent(msg) if isinstance(msg, str) else msg
+                  for msg in msgs]
+        if not events:
+            return
+
+        batch = EventBatch(events)
+        record.add_result(batch)
+        self.queue.put_nowait(batch)
+
+        if self.config.get_history():
+            self._history.extend([event for event in events
+                                  if event.is_message])
+
     def get_history(self) -> List[str]:
         """
         Get the message history
         """
 
         # TODO: add timestamp parameter?
-        history = self._history[:]
+        history = [event.serialize() for event in self._history]
 
         return history
 
+    def get_history_length(self) -> int:
+        """
+        Get the number of messages in the history
+        """
+
+        return len(self._history)
+
 
 class AccountList:
     """
@@ -80,40 +136,94 @@ class AccountList:
     """
 
     def __init__(self, config: "Config", callbacks: "Callbacks",
-                 queue: asyncio.Queue) -> None:
+                 queue: asyncio.Queue, persist: bool = True,
+                 shard: int = 0, num_shards: int = 1) -> None:
         self.config = config
         self.callbacks = callbacks
         self.queue = queue
+        self.persist = persist
         self.accounts: Dict[int, Account] = {}
 
+        # shard of the accounts in this process, if the accounts are sharded
+        # across multiple processes by their account ID
+        self.shard = shard
+        self.num_shards = num_shards
+
+        # worker processes that handle the accounts in worker mode
+        self.workers: Optional["WorkerPool"] = None
+
+        # is the accounts file locked by this process?
+        self._locked = False
+
+    def owns(self, acc_id: int) -> bool:
+        """
+        Check if the account ID belongs to the shard of this process
+        """
+
+        return acc_id % self.num_shards == self.shard
+
+    @contextlib.contextmanager
+    def _lock(self) -> Iterator[None]:
+        """
+        Lock the accounts file while it is accessed, if the accounts are
+        sharded across multiple processes. The lock can be nested.
+        """
+
+        if self.num_shards <= 1 or self._locked:
+            yield
+            return
+
+        lock_file = self.config.get_dir() / "accounts.lock"
+        with open(lock_file, "w", encoding='UTF-8') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._locked = True
+            try:
+                yield
+            finally:
+                self._locked = False
+
     def store(self) -> None:
         """
         Store accounts in a file.
         """
 
+        # accounts of worker processes are stored by the front process
+        if not self.persist:
+            return
+
         # set accounts file and init configparser
+        import configparser     # pylint: disable=import-outside-toplevel
         accounts_file = self.config.get_dir() / "accounts.ini"
         accconf = configparser.ConfigParser()
         accconf.optionxform = lambda option: option     # type: ignore
 
-        # construct accounts config that will be written to the accounts file
-        for acc in self.accounts.values():
-            section = f"account {acc.aid}"
-            accconf[section] = {}
-            accconf[section]["id"] = str(acc.aid)
-            accconf[section]["type"] = acc.type
-            accconf[section]["user"] = acc.user
-            accconf[section]["password"] = acc.password
-
         try:
-            with open(accounts_file, "w", encoding='UTF-8') as acc_file:
-                # make sure only user can read/write file before storing
-                # anything
-                os.chmod(accounts_file, stat.S_IRUSR | stat.S_IWUSR)
-
-                # write accounts to file
-                accconf.write(acc_file)
-        except (OSError, configparser.Error) as error:
+            with self._lock():
+                # keep accounts of other shards in the accounts file
+                if self.num_shards > 1:
+                    accconf.read(accounts_file)
+                    for section in accconf.sections():
+                        if self.owns(int(accconf[section]["id"])):
+                            accconf.remove_section(section)
+
+                # construct accounts config that will be written to the
+                # accounts file
+                for acc in self.accounts.values():
+                    section = f"account {acc.aid}"
+                    accconf[section] = {}
+                    accconf[section]["id"] = str(acc.aid)
+                    accconf[section]["type"] = acc.type
+                    accconf[section]["user"] = acc.user
+                    accconf[section]["password"] = acc.password
+
+                with open(accounts_file, "w", encoding='UTF-8') as acc_file:
+                    # make sure only user can read/write file before storing
+                    # anything
+                    os.chmod(accounts_file, stat.S_IRUSR | stat.S_IWUSR)
+
+                    # write accounts to file
+                    accconf.write(acc_file)
+        except (OSError, KeyError, ValueError, configparser.Error) as error:
             error_msg = f"Error storing accounts file: {error}"
             logging.error(error_msg)
 
@@ -133,9 +243,11 @@ class AccountList:
         os.chmod(accounts_file, stat.S_IRUSR | stat.S_IWUSR)
 
         # read config file
+        import configparser     # pylint: disable=import-outside-toplevel
         try:
             accconf = configparser.ConfigParser()
-            accconf.read(accounts_file)
+            with self._lock():
+                accconf.read(accounts_file)
         except configparser.Error as error:
             error_msg = f"Error loading accounts file: {error}"
             logging.error(error_msg)
@@ -152,6 +264,10 @@ class AccountList:
                 logging.error(error_msg)
                 continue
 
+            # only load accounts of this process' shard
+            if not self.owns(acc_id):
+                continue
+
             # add account
             await self.add(acc_type, acc_user, acc_pass, acc_id=acc_id)
 
@@ -164,11 +280,47 @@ class AccountList:
 
         return self.accounts
 
+    def _is_stored_by_other_shard(self, acc_type: str, acc_user: str) -> bool:
+        """
+        Check if another shard stored an account with type and user in the
+        accounts file, the accounts file must be locked
+        """
+
+        if self.num_shards <= 1:
+            return False
+
+        import configparser     # pylint: disable=import-outside-toplevel
+        accconf = configparser.ConfigParser()
+        try:
+            accconf.read(self.config.get_dir() / "accounts.ini")
+        except configparser.Error as error:
+            error_msg = f"Error loading accounts file: {error}"
+            logging.error(error_msg)
+            return False
+
+        for section in accconf.sections():
+            try:
+                acc_id = int(accconf[section]["id"])
+                if not self.owns(acc_id) and \
+                        accconf[section]["type"] == acc_type and \
+                        accconf[section]["user"] == acc_user:
+                    return True
+            except (KeyError, ValueError):
+                continue
+        return False
+
     def _get_free_account_id(self) -> int:
         """
         Get next free account id
         """
 
+        # account IDs of other shards cannot be used
+        if self.num_shards > 1:
+            acc_id = self.shard
+            while acc_id in self.accounts:
+                acc_id += self.num_shards
+            return acc_id
+
         if not self.accounts:
             return 0
 
@@ -187,33 +339,42 @@ class AccountList:
         Add a new account
         """
 
-        # make sure the account does not exist
-        for acc in self.accounts.values():
-            if acc.type == acc_type and acc.user == acc_user:
+        # the accounts file stays locked until the new account is stored, so
+        # other shards cannot add the same account meanwhile
+        with self._lock():
+            # make sure the account does not exist, also in other shards
+            for acc in self.accounts.values():
+                if acc.type == acc_type and acc.user == acc_user:
+                    return Message.info("account already exists.")
+            if self._is_stored_by_other_shard(acc_type, acc_user):
                 return Message.info("account already exists.")
 
-        # get a free account id if none is given
-        if acc_id is None:
-            acc_id = self._get_free_account_id()
+            # get a free account id if none is given
+            if acc_id is None:
+                acc_id = self._get_free_account_id()
 
-        # create account and add it to list
-        new_acc = Account(config=self.config, callbacks=self.callbacks,
-                          queue=self.queue, aid=acc_id)
-        new_acc.type = acc_type
-        new_acc.user = acc_user
-        new_acc.password = acc_pass
-        self.accounts[new_acc.aid] = new_acc
+            # create account and add it to list
+            new_acc = Account(config=self.config, callbacks=self.callbacks,
+                              queue=self.queue, aid=acc_id)
+            new_acc.type = acc_type
+            new_acc.user = acc_user
+            new_acc.password = acc_pass
+            self.accounts[new_acc.aid] = new_acc
 
-        # store updated accounts in file
-        self.store()
+            # store updated accounts in file
+            self.store()
 
         # log event
         log_msg = (f"account new: id {new_acc.aid} type {new_acc.type} "
                    f"user {new_acc.user}")
         logging.info(log_msg)
 
-        # notify callback (if present) about new account
-        await self.callbacks.call(Callback.ADD_ACCOUNT, new_acc, ())
+        # notify callback (if present) about new account, in worker mode add
+        # the account to its worker process
+        if self.workers:
+            await self.workers.add_account(new_acc)
+        else:
+            await self.callbacks.call(Callback.ADD_ACCOUNT, new_acc, ())
 
         # return result
         result = Message.info(f"added account {new_acc.aid}.")
@@ -226,9 +387,13 @@ class AccountList:
         Delete an account
         """
 
-        # notify callback (if present) about deleted account
+        # notify callback (if present) about deleted account, in worker mode
+        # delete the account from its worker process
         acc = self.accounts[acc_id]
-        await self.callbacks.call(Callback.DEL_ACCOUNT, acc, ())
+        if self.workers:
+            await self.workers.delete_account(acc_id)
+        else:
+            await self.callbacks.call(Callback.DEL_ACCOUNT, acc, ())
 
         # remove account and update accounts file
         del self.accounts[acc_id]
@@ -3,21 +3,23 @@ Basic nuqql backend
 """
 
 import asyncio
+import signal
 
-from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import nuqql_based.logger
 
 from nuqql_based.account import AccountList
-from nuqql_based.callback import Callbacks, Callback
+from nuqql_based.callback import Callbacks, Callback, CallbackFunc
 from nuqql_based.config import Config
 from nuqql_based.server import Server
 
 if TYPE_CHECKING:   # imports for typing
     # pylint: disable=cyclic-import
-    from nuqql_based.account import Account  # noqa
+    from nuqql_based.host import Host  # noqa
+    from nuqql_based.shard import ShardPool  # noqa
+    from nuqql_based.worker import WorkerPool  # noqa
 
-CallbackFunc = Callable[[Optional["Account"], Callback, Tuple], Awaitable[str]]
 CallbackTuple = Tuple[Callback, CallbackFunc]
 CallbackList = List[CallbackTuple]
 
@@ -37,6 +39,7 @@ class Based:
         # create a message queue for message exchange between accounts and the
         # based server
         queue: asyncio.Queue = asyncio.Queue()
+        self.queue = queue
 
         # account list
         self.accounts = AccountList(self.config, self.callbacks, queue)
@@ -44,6 +47,15 @@ class Based:
         # server
         self.server = Server(self.config, self.callbacks, self.accounts, queue)
 
+        # worker processes in worker mode
+        self.workers: Optional["WorkerPool"] = None
+
+        # shard processes in sharding mode
+        self.shards: Optional["ShardPool"] = None
+
+        # host of the backend if multiple backends run in one process
+        self.host: Optional["Host"] = None
+
     def set_callbacks(self, callbacks: CallbackList) -> None:
         """
         Set callbacks of the backend to the (callback, function) tuple values
@@ -54,25 +66,190 @@ class Based:
         for cback, func in callbacks:
             self.callbacks.add(cback, func)
 
-    async def start(self) -> None:
+    def _set_callback_timeouts(self) -> None:
         """
-        Start based
+        Set callback timeouts from the config
         """
 
-        # load config from command line arguments and config file
-        self.config.init()
-        await self.callbacks.call(Callback.BASED_CONFIG, None, (self.config, ))
+        self.callbacks.set_default_timeout(self.config.get_callback_timeout())
+        for name, timeout in self.config.get_callback_timeouts().items():
+            try:
+                self.callbacks.set_timeout(Callback[name], timeout)
+            except KeyError:
+                print(f"Unknown callback in timeouts config: {name}")
 
-        # logging
-        nuqql_based.logger.init(self.config)
+    def _set_callback_cache(self) -> None:
+        """
+        Enable caching of callback results from the config
+        """
+
+        for name, ttl in self.config.get_callback_cache().items():
+            try:
+                self.callbacks.cache.enable(Callback[name], ttl)
+            except KeyError:
+                print(f"Unknown callback in cache config: {name}")
+            except ValueError as error:
+                print(f"Error in cache config: {error}")
+
+    def _start_shards(self) -> None:
+        """
+        Start shard processes in sharding mode, this process handles shard 0
+        """
+
+        num = self.config.get_shards()
+        if num <= 1:
+            return
+        if self.host:
+            print("Sharding is not supported for hosted backends, "
+                  "sharding disabled.")
+            return
+        listen = self.config.get_listen()
+        if any(endpoint.startswith("unix:") for endpoint in listen) or \
+                (not listen and self.config.get_fd() is None and
+                 self.config.get_af() != "inet"):
+            print("Sharding requires AF_INET or an inherited socket, "
+                  "sharding disabled.")
+            return
+        if self.config.get_daemonize():
+            print("Sharding is not supported in daemon mode, "
+                  "sharding disabled.")
+            return
+
+        # pylint: disable=import-outside-toplevel
+        from nuqql_based.shard import ShardPool
+        self.shards = ShardPool(self, num)
+        self.shards.start()
+
+    def _add_signal_handlers(self) -> None:
+        """
+        Add signal handlers for on-demand profiling: SIGUSR1 starts profiling
+        for the configured profile time, SIGUSR2 dumps all running tasks
+        """
+
+        loop = asyncio.get_running_loop()
+        profiler = self.server.profiler
+        loop.add_signal_handler(signal.SIGUSR1, profiler.start)
+        loop.add_signal_handler(signal.SIGUSR2, profiler.dump_tasks)
+
+    def _remove_signal_handlers(self) -> None:
+        """
+        Remove signal handlers for on-demand profiling
+        """
+
+        loop = asyncio.get_running_loop()
+        loop.remove_signal_handler(signal.SIGUSR1)
+        loop.remove_signal_handler(signal.SIGUSR2)
+
+    async def run(self) -> None:
+        """
+        Run based with loaded config: start worker processes in worker mode,
+        load accounts and run the server until it quits
+        """
+
+        # start worker processes in worker mode
+        if self.config.get_workers() > 0:
+            # multiprocessing is only loaded in worker mode
+            # pylint: disable=import-outside-toplevel
+            from nuqql_based.worker import WorkerPool
+            self.workers = WorkerPool(self.config, self.callbacks, self.queue,
+                                      self.config.get_workers())
+            await self.workers.start()
+            self.accounts.workers = self.workers
 
         # load account list
         await self.accounts.load()
 
+        # monitor the event loop, hosted backends use the monitor of the host
+        threshold = self.config.get_stall_threshold()
+        if not self.host and threshold > 0:
+            # pylint: disable=import-outside-toplevel
+            from nuqql_based.monitor import LoopMonitor
+            self.server.monitor = LoopMonitor(threshold, [self.server])
+            self.server.monitor.start()
+
         # start server
         try:
             await self.server.run()
         except asyncio.CancelledError:
             await self.callbacks.call(Callback.BASED_INTERRUPT, None, ())
         finally:
+            if self.server.monitor:
+                await self.server.monitor.stop()
+            if self.workers:
+                await self.workers.stop()
+            self.server.profiler.stop()
             await self.callbacks.call(Callback.BASED_QUIT, None, ())
+
+            # the thread pool of hosted backends belongs to the host
+            if not self.host:
+                self.callbacks.executor.shutdown()
+
+    def _load_config(self, argv: Optional[List[str]]) -> None:
+        """
+        Load config from command line arguments or argv and config file, and
+        apply callback settings from the config
+        """
+
+        self.config.init(argv)
+        self._set_callback_timeouts()
+        self._set_callback_cache()
+
+    async def setup(self, argv: Optional[List[str]] = None) -> None:
+        """
+        Set up based without starting the server, e.g., to connect clients
+        in the same process with nuqql_based.memory: load config, call the
+        BASED_CONFIG callback and load accounts. Logging, worker processes
+        and sharding are not started; call shutdown() when done.
+        """
+
+        self._load_config(argv)
+        if not self.host:
+            self.callbacks.executor.set_size(
+                self.config.get_callback_threads())
+        await self.callbacks.call(Callback.BASED_CONFIG, None, (self.config, ))
+        await self.accounts.load()
+
+    async def shutdown(self) -> None:
+        """
+        Shut down based after setup()
+        """
+
+        await self.callbacks.call(Callback.BASED_QUIT, None, ())
+        if not self.host:
+            self.callbacks.executor.shutdown()
+
+    async def start(self, argv: Optional[List[str]] = None) -> None:
+        """
+        Start based; if argv is set, it is used instead of the command line
+        arguments
+        """
+
+        # load config from command line arguments and config file
+        self._load_config(argv)
+
+        if self.host and self.config.get_daemonize():
+            print("Daemon mode is not supported for hosted backends.")
+            return
+
+        # hosted backends share the thread pool and logging of the host
+        if not self.host:
+            self.callbacks.executor.set_size(
+                self.config.get_callback_threads())
+        await self.callbacks.call(Callback.BASED_CONFIG, None, (self.config, ))
+        if self.host:
+            await self.run()
+            return
+
+        # logging
+        nuqql_based.logger.init(self.config)
+
+        # start shard processes in sharding mode and run based
+        self._start_shards()
+        self._add_signal_handlers()
+        try:
+            await self.run()
+        finally:
+            self._remove_signal_handlers()
+            if self.shards:
+                await self.shards.stop()
+            nuqql_based.logger.stop()
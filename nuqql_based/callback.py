@@ -2,9 +2,19 @@
 Nuqql-based callbacks
 """
 
-from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import collections
+import heapq
+import logging
+import time
+
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Dict, \
+    List, Optional, Set, Tuple, Union, cast
 from enum import Enum
 
+from nuqql_based.executor import CallbackExecutor
+from nuqql_based.message import Message
+
 if TYPE_CHECKING:   # imports for typing
     # pylint: disable=cyclic-import
     from nuqql_based.account import Account  # noqa
@@ -44,7 +54,249 @@ class Callback(Enum):
     VERSION = "VERSION"
 
 
-CallbackFunc = Callable[[Optional["Account"], Callback, Tuple], Awaitable[str]]
+AsyncCallbackFunc = Callable[[Optional["Account"], Callback, Tuple],
+                             Awaitable[str]]
+SyncCallbackFunc = Callable[[Optional["Account"], Callback, Tuple], str]
+CallbackFunc = Union[AsyncCallbackFunc, SyncCallbackFunc]
+
+# key of cached callback results: callback, account id and parameters
+CacheKey = Tuple[Callback, Optional[int], Tuple]
+
+# based events are not limited by the default callback timeout
+LIFECYCLE_CALLBACKS = (
+    Callback.BASED_CONFIG,
+    Callback.BASED_INTERRUPT,
+    Callback.BASED_QUIT,
+)
+
+
+class _CallbackTimeout(Exception):
+    """
+    Callback did not finish within its timeout
+    """
+
+
+class CallbackTiming:
+    """
+    Timing of a single callback invocation
+    """
+
+    __slots__ = ("duration", "name", "aid", "params")
+
+    def __init__(self, duration: float, name: Callback, aid: Optional[int],
+                 params: Tuple) -> None:
+        self.duration = duration
+        self.name = name
+        self.aid = aid
+        self.params = params
+
+    def __str__(self) -> str:
+        aid = "-" if self.aid is None else self.aid
+        params = repr(self.params)
+        if len(params) > 64:
+            params = params[:61] + "..."
+        return f"{self.name.name} {self.duration:.6f}s account {aid} " \
+            f"params {params}"
+
+
+class CallbackStats:
+    """
+    Timing statistics of callbacks
+    """
+
+    def __init__(self, size: int = 128) -> None:
+        # number of calls, total and maximum duration, timeouts per callback
+        self.calls: Dict[Callback, int] = {}
+        self.total: Dict[Callback, float] = {}
+        self.max: Dict[Callback, float] = {}
+        self.timeouts: Dict[Callback, int] = {}
+
+        # most recent invocations
+        self.recent: Deque[CallbackTiming] = collections.deque(maxlen=size)
+
+    def add(self, name: Callback, account: Optional["Account"],
+            params: Tuple, duration: float) -> None:
+        """
+        Add timing of a callback invocation
+        """
+
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.total[name] = self.total.get(name, 0.0) + duration
+        if duration > self.max.get(name, 0.0):
+            self.max[name] = duration
+        aid = account.aid if account else None
+        self.recent.append(CallbackTiming(duration, name, aid, params))
+
+    def add_timeout(self, name: Callback) -> None:
+        """
+        Count a timed out callback invocation
+        """
+
+        self.timeouts[name] = self.timeouts.get(name, 0) + 1
+
+    def slowest(self, num: int = 10) -> List[CallbackTiming]:
+        """
+        Get the slowest of the recent callback invocations
+        """
+
+        return heapq.nlargest(num, self.recent,
+                              key=lambda timing: timing.duration)
+
+    def get_lines(self) -> List[str]:
+        """
+        Get statistics as list of text lines
+        """
+
+        lines = []
+        for name, calls in self.calls.items():
+            avg = self.total[name] / calls
+            lines.append(f"callback {name.name} calls {calls} "
+                         f"avg {avg:.6f}s max {self.max[name]:.6f}s "
+                         f"timeouts {self.timeouts.get(name, 0)}")
+        for timing in self.slowest():
+            lines.append(f"slow callback {timing}")
+        return lines
+
+
+# callbacks whose results can be cached
+READ_ONLY_CALLBACKS = (
+    Callback.GET_BUDDIES,
+    Callback.GET_STATUS,
+    Callback.CHAT_LIST,
+    Callback.CHAT_USERS,
+)
+
+# cached callback results that are invalidated by other callbacks on the same
+# account
+INVALIDATED_BY = {
+    Callback.SET_STATUS: (Callback.GET_STATUS, ),
+    Callback.CHAT_JOIN: (Callback.CHAT_LIST, Callback.CHAT_USERS),
+    Callback.CHAT_PART: (Callback.CHAT_LIST, Callback.CHAT_USERS),
+    Callback.CHAT_INVITE: (Callback.CHAT_USERS, ),
+    Callback.DEL_ACCOUNT: READ_ONLY_CALLBACKS,
+}
+
+
+class CallbackCache:
+    """
+    Cache of callback results with a time to live and a maximum size
+    """
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self.ttls: Dict[Callback, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self._entries: "collections.OrderedDict[CacheKey, Tuple[float, Any]]" \
+            = collections.OrderedDict()
+
+    def enable(self, name: Callback, ttl: float) -> None:
+        """
+        Enable caching of the results of a read-only callback for ttl seconds
+        """
+
+        if name not in READ_ONLY_CALLBACKS:
+            raise ValueError(f"callback {name.name} cannot be cached")
+        self.ttls[name] = ttl
+
+    def disable(self, name: Callback) -> None:
+        """
+        Disable caching of the results of a callback
+        """
+
+        if name in self.ttls:
+            del self.ttls[name]
+        self.invalidate(name)
+
+    @staticmethod
+    def _get_key(name: Callback, account: Optional["Account"],
+                 params: Tuple) -> Optional[CacheKey]:
+        """
+        Get the key of a callback invocation, None if it is not hashable
+        """
+
+        key = (name, account.aid if account else None, params)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, name: Callback, account: Optional["Account"],
+            params: Tuple) -> Optional[Any]:
+        """
+        Get cached result of a callback invocation, None if there is no valid
+        cache entry
+        """
+
+        key = self._get_key(name, account, params)
+        entry = None if key is None else self._entries.get(key)
+        if key is None or entry is None:
+            self.misses += 1
+            return None
+
+        expires, result = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, name: Callback, account: Optional["Account"],
+            params: Tuple, result: Any) -> None:
+        """
+        Add result of a callback invocation to the cache
+        """
+
+        key = self._get_key(name, account, params)
+        if key is None:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttls[name], result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, name: Optional[Callback] = None,
+                   account: Optional["Account"] = None) -> None:
+        """
+        Remove cached results of callback name and/or account; if both are
+        None, remove all cached results
+        """
+
+        if name is None and account is None:
+            self._entries.clear()
+            return
+
+        aid = account.aid if account else None
+        remove = [key for key in self._entries
+                  if (name is None or key[0] == name) and
+                  (account is None or key[1] == aid)]
+        for key in remove:
+            del self._entries[key]
+
+    def invalidate_by(self, name: Callback,
+                      account: Optional["Account"]) -> None:
+        """
+        Remove cached results invalidated by calling callback name
+        """
+
+        for cached in INVALIDATED_BY.get(name, ()):
+            if cached in self.ttls:
+                self.invalidate(cached, account)
+
+    def get_lines(self) -> List[str]:
+        """
+        Get statistics as list of text lines
+        """
+
+        if not self.ttls:
+            return []
+        return [f"cache entries {len(self._entries)} hits {self.hits} "
+                f"misses {self.misses}"]
 
 
 class Callbacks:
@@ -52,14 +304,43 @@ class Callbacks:
     Callbacks class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, executor: Optional[CallbackExecutor] = None) -> None:
         self.callbacks: Dict[Callback, CallbackFunc] = {}
+        self.sync_callbacks: Set[Callback] = set()
+        self.executor = executor or CallbackExecutor()
+        self.timeouts: Dict[Callback, float] = {}
+        self.default_timeout = 0.0
+        self.stats = CallbackStats()
+        self.cache = CallbackCache()
+
+        # callback and account of the tasks that run callbacks, e.g., for
+        # attributing stalls of the event loop to them; callbacks with a
+        # timeout run in their own tasks, others in the task of the caller
+        self.running: Dict["asyncio.Future", Tuple[Callback,
+                                                   Optional["Account"]]] = {}
 
-    def add(self, name: Callback, func: CallbackFunc) -> None:
+    def add(self, name: Callback, func: CallbackFunc,
+            timeout: Optional[float] = None) -> None:
         """
-        Register a callback
+        Register a callback, optionally with a timeout in seconds. The
+        callback is either a coroutine function or a synchronous function
+        that is run in the thread pool of the executor.
         """
+
         self.callbacks[name] = func
+        if asyncio.iscoroutinefunction(func):
+            self.sync_callbacks.discard(name)
+        else:
+            self.sync_callbacks.add(name)
+        if timeout is not None:
+            self.set_timeout(name, timeout)
+
+    def is_registered(self, name: Callback) -> bool:
+        """
+        Check if a callback is registered
+        """
+
+        return name in self.callbacks
 
     def delete(self, name: Callback) -> None:
         """
@@ -68,14 +349,123 @@ class Callbacks:
 
         if name in self.callbacks:
             del self.callbacks[name]
+            self.sync_callbacks.discard(name)
+
+    def set_timeout(self, name: Callback, timeout: float) -> None:
+        """
+        Set the timeout of a callback in seconds, 0 disables the timeout
+        """
+
+        self.timeouts[name] = timeout
+
+    def set_default_timeout(self, timeout: float) -> None:
+        """
+        Set the timeout in seconds of all callbacks without their own timeout
+        except the based events, 0 disables the timeout
+        """
+
+        self.default_timeout = timeout
+
+    def get_timeout(self, name: Callback) -> float:
+        """
+        Get the timeout of a callback in seconds, 0 means no timeout
+        """
+
+        if name in self.timeouts:
+            return self.timeouts[name]
+        if name in LIFECYCLE_CALLBACKS:
+            return 0.0
+        return self.default_timeout
+
+    async def _call_in_task(self, name: Callback,
+                            account: Optional["Account"],
+                            coro: Awaitable[Any]) -> Any:
+        """
+        Run the coroutine of callback name in the current task and mark the
+        task as running the callback until it is done
+        """
+
+        task = asyncio.current_task()
+        if task is None:
+            return await coro
+        caller = self.running.get(task)
+        self.running[task] = (name, account)
+        try:
+            return await coro
+        finally:
+            if caller:
+                # callback was called by another callback
+                self.running[task] = caller
+            else:
+                del self.running[task]
+
+    async def _call_timed(self, name: Callback,
+                          account: Optional["Account"], params: Tuple) -> Any:
+        """
+        Call callback with its timeout and add its timing to the statistics
+        """
+
+        func = self.callbacks[name]
+        coro: Awaitable[Any]
+        if name in self.sync_callbacks:
+            coro = self.executor.run(func, account, name, params)
+        else:
+            coro = cast(Awaitable[str], func(account, name, params))
+        timeout = self.get_timeout(name)
+        start = time.perf_counter()
+        try:
+            if timeout > 0:
+                task = asyncio.ensure_future(coro)
+                self.running[task] = (name, account)
+                try:
+                    return await asyncio.wait_for(task, timeout)
+                except asyncio.TimeoutError as error:
+                    if not task.cancelled():
+                        # raised by the callback, not a timeout
+                        raise
+                    raise _CallbackTimeout() from error
+                finally:
+                    del self.running[task]
+            return await self._call_in_task(name, account, coro)
+        finally:
+            self.stats.add(name, account, params,
+                           time.perf_counter() - start)
 
     async def call(self, name: Callback, account: Optional["Account"],
                    params: Tuple) -> str:
         """
-        Call callback if it is registered
+        Call callback if it is registered. If the callback does not finish
+        within its timeout, it is cancelled and an error message is returned.
+        If caching is enabled for the callback, a valid cached result is
+        returned without calling the callback.
         """
 
-        if name in self.callbacks:
-            return await self.callbacks[name](account, name, params)
+        if name not in self.callbacks:
+            self.cache.invalidate_by(name, account)
+            return ""
+
+        cached = name in self.cache.ttls
+        if cached:
+            result = self.cache.get(name, account, params)
+            if result is not None:
+                return result
+
+        try:
+            result = await self._call_timed(name, account, params)
+        except _CallbackTimeout:
+            self.stats.add_timeout(name)
+            timeout = self.get_timeout(name)
+            aid = account.aid if account else None
+            error_msg = f"callback {name.name} timed out after {timeout}s " \
+                f"(account: {aid}, params: {params})"
+            logging.error(error_msg)
+            return Message.error(f"callback {name.name} timed out")
 
-        return ""
+        if cached:
+            # empty results are not cached, the callback may send its reply
+            # with receive_msg() and must be called again to send it
+            if result:
+                self.cache.put(name, account, params, result)
+        else:
+            self.cache.invalidate_by(name, account)
+        return result
@@ -0,0 +1,214 @@
+"""
+Nuqql-based chat and chat membership store
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from nuqql_based.event import ChatListEvent, ChatUserEvent
+from nuqql_based.executor import in_loop
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    from nuqql_based.account import Account  # noqa
+
+# chat user status of users that left a chat
+PART_STATUS = "part"
+
+
+class ChatUser:
+    """
+    User in a chat
+    """
+
+    __slots__ = ("user_id", "name", "status")
+
+    def __init__(self, user_id: str, name: str, status: str) -> None:
+        self.user_id = user_id
+        self.name = name
+        self.status = status
+
+
+class Chat:
+    """
+    Chat with its members
+    """
+
+    __slots__ = ("chat_id", "name", "user", "users")
+
+    def __init__(self, chat_id: str, name: str, user: str) -> None:
+        self.chat_id = chat_id
+        self.name = name
+        self.user = user
+        self.users: Dict[str, ChatUser] = {}
+
+
+class ChatStore:
+    """
+    Chats and chat members of an account. Backends update the store with
+    join, part and rename events, and the server answers chat list and chat
+    users requests from it if the backend does not have CHAT_LIST or
+    CHAT_USERS callbacks.
+    """
+
+    def __init__(self, account: "Account") -> None:
+        self.account = account
+        self.chats: Dict[str, Chat] = {}
+
+    def __len__(self) -> int:
+        return len(self.chats)
+
+    def _push(self, events: List) -> None:
+        """
+        Send events to the client if pushing chat changes is enabled
+        """
+
+        if not events or not self.account.config.get_push_chats():
+            return
+        if len(events) == 1:
+            self.account.receive_msg(events[0])
+        else:
+            self.account.receive_msgs(events)
+
+    def _list_event(self, chat: Chat) -> ChatListEvent:
+        return ChatListEvent(self.account.aid, chat.chat_id, chat.name,
+                             chat.user)
+
+    def _user_event(self, chat: Chat, user: ChatUser) -> ChatUserEvent:
+        return ChatUserEvent(self.account.aid, chat.chat_id, user.user_id,
+                             user.name, user.status)
+
+    def get(self, chat_id: str) -> Optional[Chat]:
+        """
+        Get a chat by its ID
+        """
+
+        return self.chats.get(chat_id)
+
+    @in_loop
+    def join(self, chat_id: str, name: str = "", user: str = "") -> None:
+        """
+        Add a chat the account joined; user is the name of the account's user
+        in the chat and defaults to the account's user
+        """
+
+        if chat_id in self.chats:
+            return
+        chat = Chat(chat_id, name or chat_id, user or self.account.user)
+        self.chats[chat_id] = chat
+        self._push([self._list_event(chat)])
+
+    @in_loop
+    def part(self, chat_id: str) -> None:
+        """
+        Remove a chat the account left, the client is told that the
+        account's user left the chat
+        """
+
+        chat = self.chats.pop(chat_id, None)
+        if chat is None:
+            return
+        user = ChatUser(chat.user, chat.user, PART_STATUS)
+        self._push([self._user_event(chat, user)])
+
+    @in_loop
+    def rename(self, chat_id: str, name: str) -> None:
+        """
+        Rename a chat
+        """
+
+        chat = self.chats.get(chat_id)
+        if chat is None or chat.name == name:
+            return
+        chat.name = name
+        self._push([self._list_event(chat)])
+
+    def _user_update(self, chat: Chat, user_id: str, name: Optional[str],
+                     status: Optional[str]) -> Optional[ChatUserEvent]:
+        """
+        Add or update a chat user, return chat user event if something
+        changed
+        """
+
+        user = chat.users.get(user_id)
+        if user is None:
+            user = ChatUser(user_id, name or user_id, status or "join")
+            chat.users[user_id] = user
+            return self._user_event(chat, user)
+
+        changed = False
+        if name is not None and name != user.name:
+            user.name = name
+            changed = True
+        if status is not None and status != user.status:
+            user.status = status
+            changed = True
+        if not changed:
+            return None
+        return self._user_event(chat, user)
+
+    @in_loop
+    def user_update(self, chat_id: str, user_id: str,
+                    name: Optional[str] = None,
+                    status: Optional[str] = None) -> None:
+        """
+        Add a user to a chat, e.g., when the user joined, or update name
+        and/or status of the user
+        """
+
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return
+        event = self._user_update(chat, user_id, name, status)
+        if event:
+            self._push([event])
+
+    @in_loop
+    def user_update_many(self, chat_id: str,
+                         users: Iterable[Tuple[str, Optional[str],
+                                               Optional[str]]]) -> None:
+        """
+        Add or update multiple users of a chat given as (user_id, name,
+        status) tuples, e.g., after retrieving the member list of the chat
+        """
+
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return
+        events = []
+        for user_id, name, status in users:
+            event = self._user_update(chat, user_id, name, status)
+            if event:
+                events.append(event)
+        self._push(events)
+
+    @in_loop
+    def user_part(self, chat_id: str, user_id: str) -> None:
+        """
+        Remove a user from a chat, e.g., when the user left the chat
+        """
+
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return
+        user = chat.users.pop(user_id, None)
+        if user is None:
+            return
+        user.status = PART_STATUS
+        self._push([self._user_event(chat, user)])
+
+    def get_list_events(self) -> List[ChatListEvent]:
+        """
+        Get chat list events of all chats
+        """
+
+        return [self._list_event(chat) for chat in self.chats.values()]
+
+    def get_user_events(self, chat_id: str) -> List[ChatUserEvent]:
+        """
+        Get chat user events of all users in a chat
+        """
+
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return []
+        return [self._user_event(chat, user) for user in chat.users.values()]
@@ -2,13 +2,13 @@
 Nuqql-based configuration
 """
 
-import configparser
-import argparse
 import logging
 import pathlib
 import stat
 import os
 
+from typing import Any, Dict, List, Optional
+
 
 # pylint: disable=too-many-instance-attributes
 class Config:
@@ -35,24 +35,87 @@ class Config:
         self._address = "localhost"
         self._port = 32000
         self._sockfile = pathlib.Path(f"{backend_name}.sock")
+        self._fd: Optional[int] = None
+        self._listen: List[str] = []
         self._dir = pathlib.Path.home() / f".config/nuqql-{backend_name}"
         self._daemonize = False
         self._loglevel = self._LOGLEVEL_MAP[self._DEFAULT_LOGLEVEL]
+        self._log_max_bytes = 10 * 1024 * 1024
+        self._log_backups = 3
         self._history = True
+        self._history_size = 0
         self._push_accounts = False
+        self._push_buddies = False
+        self._push_chats = False
         self._filter_own = False
-
-    def get_from_args(self) -> None:
+        self._callback_timeout = 0.0
+        self._callback_threads = 4
+        self._workers = 0
+        self._shards = 0
+        self._record: Optional[pathlib.Path] = None
+        self._profile_time = 10.0
+        self._stall_threshold = 0.0
+        self._metrics: Optional[str] = None
+        self._tcp_nodelay = True
+        self._socket_rcvbuf = 0
+        self._socket_sndbuf = 0
+        self._write_buffer_high = 0
+        self._write_buffer_low = 0
+        self._slow_consumer_timeout = 0.0
+        self._slow_consumer_buffer = 0
+        self._slow_consumer_policy = "disconnect"
+        self._slow_consumer_spill = 64 * 1024 * 1024
+        self._callback_timeouts: Dict[str, float] = {}
+        self._callback_cache: Dict[str, float] = {}
+
+        # backend specific options and their help texts
+        self._options: Dict[str, Any] = {}
+        self._option_help: Dict[str, str] = {}
+
+        # parsed command line arguments
+        self._args: Any = None
+
+    def _parse_args(self, argv: Optional[List[str]] = None) -> Any:
         """
-        Parse the command line and return command line arguments:
+        Parse the command line or the arguments in argv and return command
+        line arguments:
             af:         address family
             address:    AF_INET listen address
             port:       AF_INET listen port
             sockfile:   AF_UNIX listen socket file within working directory
+            fd:         inherited listening socket file descriptor
+            listen:     list of listen endpoints
             dir:        working directory
             daemonize:  daemonize process?
+            log_max_bytes: maximum size of log file before it is rotated
+            log_backups: number of rotated log files that are kept
+            callback_timeout: default timeout of callbacks in seconds
+            callback_threads: number of threads for synchronous callbacks
+            workers:    number of worker processes for accounts
+            history_size: maximum number of messages in history
+            shards:     number of processes listening on the same port
+            record:     file client sessions are recorded to
+            profile_time: duration of on-demand profiling in seconds
+            stall_threshold: event loop lag reported as stall in seconds
+            metrics:    metrics listen endpoint
+            socket_rcvbuf: receive buffer size of client sockets
+            socket_sndbuf: send buffer size of client sockets
+            write_buffer_high: high watermark of the client write buffer
+            write_buffer_low: low watermark of the client write buffer
+            slow_consumer_timeout: time a client may block sending in seconds
+            slow_consumer_buffer: bytes a client may leave in the write buffer
+            slow_consumer_policy: handling of slow clients
+            slow_consumer_spill: maximum size of the spill file of a client
+        The command line is only parsed once, later calls return the result
+        of the first call.
         """
 
+        if self._args is not None:
+            return self._args
+
+        # argparse is only needed once during startup, load it on demand
+        import argparse     # pylint: disable=import-outside-toplevel
+
         # init command line argument parser
         parser = argparse.ArgumentParser(description=f"Run nuqql backend \
                                          {self._backend_name}.",
@@ -61,28 +124,134 @@ class Config:
         parser.add_argument("--af", choices=["inet", "unix"],
                             help="set socket address family: \"inet\" for \
                             AF_INET, \"unix\" for AF_UNIX")
+        parser.add_argument("--callback-threads", type=int,
+                            help="set number of threads for running \
+                            synchronous callbacks")
+        parser.add_argument("--callback-timeout", type=float,
+                            help="set default timeout of callbacks in \
+                            seconds, 0 disables timeouts")
         parser.add_argument("-d", "--daemonize", action="store_true",
                             help="daemonize process")
         parser.add_argument("--dir", help="set working directory")
         parser.add_argument("--disable-history", action="store_true",
                             help="disable message history")
+        parser.add_argument("--disable-tcp-nodelay", action="store_true",
+                            help="disable TCP_NODELAY on AF_INET client \
+                            sockets")
+        parser.add_argument("--fd", type=int,
+                            help="use inherited listening socket with file \
+                            descriptor FD instead of creating a socket")
         parser.add_argument("--filter-own", action="store_true",
                             help="enable filtering of own messages")
         parser.add_argument("-h", "--help", action="help",
                             help="show this help message and exit")
+        parser.add_argument("--history-size", type=int,
+                            help="set maximum number of messages kept in the \
+                            history of each account, 0 keeps all messages")
+        parser.add_argument("--listen", action="append", metavar="ENDPOINT",
+                            help="listen on ENDPOINT, can be used multiple \
+                            times: \"inet:ADDRESS:PORT\" for AF_INET, \
+                            \"unix:SOCKFILE\" for AF_UNIX with SOCKFILE in \
+                            DIR; overrides af, address, port and sockfile")
+        parser.add_argument("--log-backups", type=int,
+                            help="set number of rotated log files to keep")
+        parser.add_argument("--log-max-bytes", type=int,
+                            help="set maximum size of log file in bytes \
+                            before it is rotated, 0 disables rotation")
         parser.add_argument("--loglevel", choices=["debug", "info", "warn",
                                                    "error"],
                             help="set logging level")
+        parser.add_argument("--metrics", metavar="ENDPOINT",
+                            help="serve metrics in Prometheus text format on \
+                            ENDPOINT: \"inet:ADDRESS:PORT\" for AF_INET, \
+                            \"unix:SOCKFILE\" for AF_UNIX with SOCKFILE in \
+                            DIR")
         parser.add_argument("--port", type=int, help="set AF_INET listen port")
+        parser.add_argument("--profile-time", type=float,
+                            help="set duration of profiling triggered by \
+                            SIGUSR1 or the profile command in seconds")
         parser.add_argument("--push-accounts", action="store_true",
                             help="enable pushing accounts to client")
+        parser.add_argument("--push-buddies", action="store_true",
+                            help="enable pushing buddy changes to client")
+        parser.add_argument("--push-chats", action="store_true",
+                            help="enable pushing chat and chat user changes \
+                            to client")
+        parser.add_argument("--record", metavar="FILE",
+                            help="record client sessions to FILE in DIR for \
+                            replaying them later")
+        parser.add_argument("--shards", type=int,
+                            help="set number of processes that listen on the \
+                            same AF_INET port with SO_REUSEPORT, each process \
+                            handles a shard of the accounts, 0 disables \
+                            sharding")
+        parser.add_argument("--slow-consumer-buffer", type=int,
+                            metavar="BYTES",
+                            help="set number of bytes in the write buffer \
+                            after which a client is a slow consumer, 0 \
+                            disables the check")
+        parser.add_argument("--slow-consumer-policy",
+                            choices=["disconnect", "spill", "drop"],
+                            help="set handling of slow consumers: \
+                            \"disconnect\" drops the client, \"spill\" \
+                            writes events to a file in DIR until the client \
+                            caught up, \"drop\" drops low priority events \
+                            like presence updates")
+        parser.add_argument("--slow-consumer-spill", type=int,
+                            metavar="BYTES",
+                            help="set maximum size of the spill file of a \
+                            slow consumer after which the client is dropped, \
+                            0 disables the limit")
+        parser.add_argument("--slow-consumer-timeout", type=float,
+                            metavar="SECONDS",
+                            help="set time waiting for a client to read its \
+                            data after which it is a slow consumer, 0 \
+                            disables the check")
         parser.add_argument("--sockfile", help="set AF_UNIX socket file in \
                             DIR")
+        parser.add_argument("--socket-rcvbuf", type=int, metavar="BYTES",
+                            help="set receive buffer size of client sockets, \
+                            0 uses the system default")
+        parser.add_argument("--socket-sndbuf", type=int, metavar="BYTES",
+                            help="set send buffer size of client sockets, 0 \
+                            uses the system default")
+        parser.add_argument("--stall-threshold", type=float,
+                            help="set event loop lag in seconds that is \
+                            reported as stall and enable the loop monitor, 0 \
+                            disables it (default)")
         parser.add_argument("--version", action="version",
                             version=self._backend_version)
+        parser.add_argument("--workers", type=int,
+                            help="set number of worker processes the \
+                            accounts are distributed to, 0 disables workers")
+        parser.add_argument("--write-buffer-high", type=int, metavar="BYTES",
+                            help="set high watermark of the client write \
+                            buffer, writing waits until the buffer is below \
+                            the low watermark, 0 uses the asyncio default")
+        parser.add_argument("--write-buffer-low", type=int, metavar="BYTES",
+                            help="set low watermark of the client write \
+                            buffer, 0 uses the asyncio default")
+
+        # backend specific options
+        for name, default in self._options.items():
+            if isinstance(default, bool):
+                parser.add_argument(f"--{name}", action="store_true",
+                                    default=None,
+                                    help=self._option_help[name])
+            else:
+                parser.add_argument(f"--{name}", type=type(default),
+                                    help=self._option_help[name])
 
         # parse command line arguments
-        args = parser.parse_args()
+        self._args = parser.parse_args(argv)
+        return self._args
+
+    def get_from_args(self, argv: Optional[List[str]] = None) -> None:
+        """
+        Load command line arguments or the arguments in argv into config
+        """
+
+        args = self._parse_args(argv)
 
         # store args in config dictionary
         if args.af:
@@ -93,18 +262,70 @@ class Config:
             self._port = args.port
         if args.sockfile:
             self._sockfile = pathlib.Path(args.sockfile)
+        if args.fd is not None:
+            self._fd = args.fd
+        if args.listen:
+            self._listen = args.listen
         if args.dir:
             self._dir = pathlib.Path(args.dir)
         if args.daemonize:
             self._daemonize = args.daemonize
         if args.loglevel:
             self._loglevel = self._LOGLEVEL_MAP[args.loglevel]
+        if args.log_max_bytes is not None:
+            self._log_max_bytes = args.log_max_bytes
+        if args.log_backups is not None:
+            self._log_backups = args.log_backups
         if args.disable_history:
             self._history = False
+        if args.history_size is not None:
+            self._history_size = args.history_size
         if args.push_accounts:
             self._push_accounts = True
+        if args.push_buddies:
+            self._push_buddies = True
+        if args.push_chats:
+            self._push_chats = True
         if args.filter_own:
             self._filter_own = True
+        if args.callback_timeout is not None:
+            self._callback_timeout = args.callback_timeout
+        if args.callback_threads:
+            self._callback_threads = args.callback_threads
+        if args.workers is not None:
+            self._workers = args.workers
+        if args.shards is not None:
+            self._shards = args.shards
+        if args.record:
+            self._record = pathlib.Path(args.record)
+        if args.profile_time is not None:
+            self._profile_time = args.profile_time
+        if args.stall_threshold is not None:
+            self._stall_threshold = args.stall_threshold
+        if args.metrics:
+            self._metrics = args.metrics
+        if args.disable_tcp_nodelay:
+            self._tcp_nodelay = False
+        if args.socket_rcvbuf is not None:
+            self._socket_rcvbuf = args.socket_rcvbuf
+        if args.socket_sndbuf is not None:
+            self._socket_sndbuf = args.socket_sndbuf
+        if args.write_buffer_high is not None:
+            self._write_buffer_high = args.write_buffer_high
+        if args.write_buffer_low is not None:
+            self._write_buffer_low = args.write_buffer_low
+        if args.slow_consumer_timeout is not None:
+            self._slow_consumer_timeout = args.slow_consumer_timeout
+        if args.slow_consumer_buffer is not None:
+            self._slow_consumer_buffer = args.slow_consumer_buffer
+        if args.slow_consumer_policy:
+            self._slow_consumer_policy = args.slow_consumer_policy
+        if args.slow_consumer_spill is not None:
+            self._slow_consumer_spill = args.slow_consumer_spill
+        for name in self._options:
+            value = getattr(args, name.replace("-", "_"))
+            if value is not None:
+                self._options[name] = value
 
     def read_from_file(self) -> None:
         """
@@ -122,6 +343,7 @@ class Config:
         os.chmod(config_file, stat.S_IRUSR | stat.S_IWUSR)
 
         # read config file
+        import configparser     # pylint: disable=import-outside-toplevel
         try:
             config = configparser.ConfigParser()
             config.read(config_file)
@@ -140,6 +362,8 @@ class Config:
                         "port", fallback=self._port)
                     self._sockfile = pathlib.Path(config[section].get(
                         "sockfile", fallback=str(self._sockfile)))
+                    self._listen = config[section].get(
+                        "listen", fallback=" ".join(self._listen)).split()
                     self._dir = pathlib.Path(config[section].get(
                         "dir", fallback=str(self._dir)))
                     self._daemonize = config[section].getboolean(
@@ -148,31 +372,161 @@ class Config:
                         config[section].get(
                             "loglevel", fallback=self._DEFAULT_LOGLEVEL),
                         self._LOGLEVEL_MAP[self._DEFAULT_LOGLEVEL])
+                    self._log_max_bytes = config[section].getint(
+                        "log-max-bytes", fallback=self._log_max_bytes)
+                    self._log_backups = config[section].getint(
+                        "log-backups", fallback=self._log_backups)
                     self._history = config[section].getboolean(
                         "history", fallback=self._history)
+                    self._history_size = config[section].getint(
+                        "history-size", fallback=self._history_size)
                     self._push_accounts = config[section].getboolean(
                         "push-accounts", fallback=self._push_accounts)
+                    self._push_buddies = config[section].getboolean(
+                        "push-buddies", fallback=self._push_buddies)
+                    self._push_chats = config[section].getboolean(
+                        "push-chats", fallback=self._push_chats)
                     self._filter_own = config[section].getboolean(
                         "filter-own", fallback=self._filter_own)
+                    self._callback_timeout = config[section].getfloat(
+                        "callback-timeout", fallback=self._callback_timeout)
+                    self._callback_threads = config[section].getint(
+                        "callback-threads", fallback=self._callback_threads)
+                    self._workers = config[section].getint(
+                        "workers", fallback=self._workers)
+                    self._shards = config[section].getint(
+                        "shards", fallback=self._shards)
+                    self._profile_time = config[section].getfloat(
+                        "profile-time", fallback=self._profile_time)
+                    self._stall_threshold = config[section].getfloat(
+                        "stall-threshold", fallback=self._stall_threshold)
+                    record = config[section].get("record")
+                    if record:
+                        self._record = pathlib.Path(record)
+                    self._metrics = config[section].get(
+                        "metrics", fallback=self._metrics)
+                    self._tcp_nodelay = config[section].getboolean(
+                        "tcp-nodelay", fallback=self._tcp_nodelay)
+                    self._socket_rcvbuf = config[section].getint(
+                        "socket-rcvbuf", fallback=self._socket_rcvbuf)
+                    self._socket_sndbuf = config[section].getint(
+                        "socket-sndbuf", fallback=self._socket_sndbuf)
+                    self._write_buffer_high = config[section].getint(
+                        "write-buffer-high", fallback=self._write_buffer_high)
+                    self._write_buffer_low = config[section].getint(
+                        "write-buffer-low", fallback=self._write_buffer_low)
+                    self._slow_consumer_timeout = config[section].getfloat(
+                        "slow-consumer-timeout",
+                        fallback=self._slow_consumer_timeout)
+                    self._slow_consumer_buffer = config[section].getint(
+                        "slow-consumer-buffer",
+                        fallback=self._slow_consumer_buffer)
+                    self._slow_consumer_spill = config[section].getint(
+                        "slow-consumer-spill",
+                        fallback=self._slow_consumer_spill)
+                    policy = config[section].get(
+                        "slow-consumer-policy",
+                        fallback=self._slow_consumer_policy)
+                    if policy not in ("disconnect", "spill", "drop"):
+                        raise ValueError(f"invalid slow consumer policy "
+                                         f"{policy}")
+                    self._slow_consumer_policy = policy
                 except ValueError as error:
                     error_msg = f"Error parsing config file: {error}"
                     print(error_msg)
 
-    def init(self) -> None:
+            # try to read backend specific options from config file
+            if section == "backend":
+                self._read_options(config[section])
+
+            # try to read timeouts of individual callbacks from config file
+            if section == "timeouts":
+                for name in config[section]:
+                    try:
+                        self._callback_timeouts[name.upper()] = \
+                            config[section].getfloat(name, fallback=0.0)
+                    except ValueError as error:
+                        error_msg = f"Error parsing config file: {error}"
+                        print(error_msg)
+
+            # try to read cache ttls of individual callbacks from config file
+            if section == "cache":
+                for name in config[section]:
+                    try:
+                        self._callback_cache[name.upper()] = \
+                            config[section].getfloat(name, fallback=0.0)
+                    except ValueError as error:
+                        error_msg = f"Error parsing config file: {error}"
+                        print(error_msg)
+
+    def _read_options(self, section: Any) -> None:
+        """
+        Read backend specific options from the config file section
+        """
+
+        for name, default in self._options.items():
+            try:
+                if isinstance(default, bool):
+                    value = section.getboolean(name, fallback=default)
+                elif isinstance(default, int):
+                    value = section.getint(name, fallback=default)
+                elif isinstance(default, float):
+                    value = section.getfloat(name, fallback=default)
+                else:
+                    value = section.get(name, fallback=default)
+            except ValueError as error:
+                error_msg = f"Error parsing config file: {error}"
+                print(error_msg)
+                continue
+            self._options[name] = value
+
+    def init(self, argv: Optional[List[str]] = None) -> None:
         """
         Initialize backend configuration from config file and
-        command line parameters
+        command line parameters; if argv is set, it is used instead of the
+        command line, e.g., for multiple backends in one process
         """
 
         # read command line arguments
-        self.get_from_args()
+        self.get_from_args(argv)
 
         # read config file and load it into config
         self.read_from_file()
 
-        # overwrite config with command line arguments
+        # overwrite config with command line arguments, reuses the already
+        # parsed command line
         self.get_from_args()
 
+        # use listening socket passed via socket activation, if no file
+        # descriptor is given on the command line
+        if self._fd is None:
+            self._fd = self._get_listen_fd()
+
+    @staticmethod
+    def _get_listen_fd() -> Optional[int]:
+        """
+        Get the file descriptor of the listening socket passed to this
+        process with the LISTEN_FDS and LISTEN_PID environment variables
+        (systemd socket activation). Only the first passed socket is used.
+        """
+
+        if os.environ.get("LISTEN_PID") != str(os.getpid()):
+            return None
+        try:
+            num_fds = int(os.environ.get("LISTEN_FDS", "0"))
+        except ValueError:
+            num_fds = 0
+
+        # do not pass the variables to child processes
+        for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+            os.environ.pop(name, None)
+
+        if num_fds < 1:
+            return None
+
+        # passed file descriptors start at 3
+        return 3
+
     def get_af(self) -> str:
         """
         Get the af entry from the config
@@ -201,6 +555,22 @@ class Config:
 
         return self._sockfile
 
+    def get_fd(self) -> Optional[int]:
+        """
+        Get the file descriptor of the inherited listening socket from the
+        config, None if the server creates its own socket
+        """
+
+        return self._fd
+
+    def get_listen(self) -> List[str]:
+        """
+        Get the listen endpoints from the config, if empty the server listens
+        on the endpoint given by af, address, port and sockfile
+        """
+
+        return self._listen
+
     def get_dir(self) -> pathlib.Path:
         """
         Get the dir entry from the config
@@ -222,6 +592,20 @@ class Config:
 
         return self._loglevel
 
+    def get_log_max_bytes(self) -> int:
+        """
+        Get the maximum size of the log file from the config
+        """
+
+        return self._log_max_bytes
+
+    def get_log_backups(self) -> int:
+        """
+        Get the number of rotated log files to keep from the config
+        """
+
+        return self._log_backups
+
     def get_history(self) -> bool:
         """
         Get history entry from config: history enabled or disabled
@@ -229,6 +613,14 @@ class Config:
 
         return self._history
 
+    def get_history_size(self) -> int:
+        """
+        Get history size entry from config: maximum number of messages in the
+        history of each account, 0 means unlimited
+        """
+
+        return self._history_size
+
     def get_push_accounts(self) -> bool:
         """
         Get push accounts entry from config: pushing accounts to clients
@@ -237,6 +629,22 @@ class Config:
 
         return self._push_accounts
 
+    def get_push_buddies(self) -> bool:
+        """
+        Get push buddies entry from config: pushing buddy changes of the
+        roster to clients enabled or disabled
+        """
+
+        return self._push_buddies
+
+    def get_push_chats(self) -> bool:
+        """
+        Get push chats entry from config: pushing changes of chats and chat
+        users to clients enabled or disabled
+        """
+
+        return self._push_chats
+
     def get_filter_own(self) -> bool:
         """
         Get filter own entry from config: filtering of own messages
@@ -245,6 +653,172 @@ class Config:
 
         return self._filter_own
 
+    def get_callback_timeout(self) -> float:
+        """
+        Get the default callback timeout entry from the config
+        """
+
+        return self._callback_timeout
+
+    def get_callback_threads(self) -> int:
+        """
+        Get the number of threads for synchronous callbacks from the config
+        """
+
+        return self._callback_threads
+
+    def get_workers(self) -> int:
+        """
+        Get the number of worker processes from the config
+        """
+
+        return self._workers
+
+    def get_shards(self) -> int:
+        """
+        Get the number of processes listening on the same port from the
+        config
+        """
+
+        return self._shards
+
+    def get_record(self) -> Optional[pathlib.Path]:
+        """
+        Get the file client sessions are recorded to from the config, it is
+        relative to the working directory
+        """
+
+        return self._record
+
+    def get_profile_time(self) -> float:
+        """
+        Get the duration of on-demand profiling in seconds from the config
+        """
+
+        return self._profile_time
+
+    def get_stall_threshold(self) -> float:
+        """
+        Get the event loop lag in seconds that is reported as stall from the
+        config, 0 means the loop monitor is disabled
+        """
+
+        return self._stall_threshold
+
+    def get_metrics(self) -> Optional[str]:
+        """
+        Get the listen endpoint of the metrics server from the config, None
+        means metrics are not served
+        """
+
+        return self._metrics
+
+    def get_tcp_nodelay(self) -> bool:
+        """
+        Get the TCP_NODELAY setting of AF_INET client sockets from the config
+        """
+
+        return self._tcp_nodelay
+
+    def get_socket_rcvbuf(self) -> int:
+        """
+        Get the receive buffer size of client sockets from the config, 0
+        means the system default is used
+        """
+
+        return self._socket_rcvbuf
+
+    def get_socket_sndbuf(self) -> int:
+        """
+        Get the send buffer size of client sockets from the config, 0 means
+        the system default is used
+        """
+
+        return self._socket_sndbuf
+
+    def get_write_buffer_high(self) -> int:
+        """
+        Get the high watermark of the client write buffer from the config, 0
+        means the asyncio default is used
+        """
+
+        return self._write_buffer_high
+
+    def get_write_buffer_low(self) -> int:
+        """
+        Get the low watermark of the client write buffer from the config, 0
+        means the asyncio default is used
+        """
+
+        return self._write_buffer_low
+
+    def get_slow_consumer_timeout(self) -> float:
+        """
+        Get the time in seconds a client may take to read its data before it
+        is a slow consumer from the config, 0 disables the check
+        """
+
+        return self._slow_consumer_timeout
+
+    def get_slow_consumer_buffer(self) -> int:
+        """
+        Get the number of bytes in the write buffer after which a client is
+        a slow consumer from the config, 0 disables the check
+        """
+
+        return self._slow_consumer_buffer
+
+    def get_slow_consumer_policy(self) -> str:
+        """
+        Get the handling of slow consumers from the config: "disconnect",
+        "spill" or "drop"
+        """
+
+        return self._slow_consumer_policy
+
+    def get_slow_consumer_spill(self) -> int:
+        """
+        Get the maximum size of the spill file of a slow consumer after which
+        the client is dropped from the config, 0 disables the limit
+        """
+
+        return self._slow_consumer_spill
+
+    def get_callback_timeouts(self) -> Dict[str, float]:
+        """
+        Get the timeouts of individual callbacks from the config: callback
+        name mapped to timeout in seconds
+        """
+
+        return self._callback_timeouts
+
+    def get_callback_cache(self) -> Dict[str, float]:
+        """
+        Get the cache ttls of individual callbacks from the config: callback
+        name mapped to ttl in seconds
+        """
+
+        return self._callback_cache
+
+    def add_option(self, name: str, default: Any, help_text: str) -> None:
+        """
+        Add a backend specific option, e.g., "my-option"; it must be added
+        before the config is initialized. The option can be set with the
+        command line argument --my-option or the my-option entry in the
+        [backend] section of the config file, its type is the type of the
+        default value.
+        """
+
+        self._options[name] = default
+        self._option_help[name] = help_text
+
+    def get_option(self, name: str) -> Any:
+        """
+        Get the value of a backend specific option from the config
+        """
+
+        return self._options[name]
+
     def get_name(self) -> str:
         """
         Get the name of the backend
@@ -0,0 +1,283 @@
+"""
+Nuqql-based events
+"""
+
+import abc
+
+from typing import Any, List, Tuple
+
+from nuqql_based.message import Message
+
+# priorities of data sent to the client, lower values are more important:
+# replies to client commands and own messages, messages and other events,
+# presence updates
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class Event(abc.ABC):
+    """
+    Base class of all typed nuqql events
+    """
+
+    # sequence number of the event if it is the result of a recorded
+    # command, it is not a field of the event
+    __slots__: Tuple[str, ...] = ("result_seq", )
+    result_seq: int
+
+    # is this a "message" or "chat message" event?
+    is_message = False
+
+    # priority of the event when it is sent to the client
+    priority = PRIORITY_NORMAL
+
+    @abc.abstractmethod
+    def serialize(self) -> str:
+        """
+        Format the event as nuqql message
+        """
+
+    def __eq__(self, other: Any) -> bool:
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot)
+                   for slot in self.__slots__)
+
+    # events are compared by their fields, which can be changed, so they are
+    # not hashable
+    __hash__ = None     # type: ignore
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}"
+                           for slot in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class TextEvent(Event):
+    """
+    Event with already formatted text, e.g., passed as string to
+    Account.receive_msg() by backends. The text is sent unmodified.
+    """
+
+    __slots__ = ("text", "is_message", "priority")
+
+    def __init__(self, text: str, priority: int = PRIORITY_NORMAL) -> None:
+        self.text = text
+        self.is_message = Message.is_message(text)
+        self.priority = priority
+
+    def serialize(self) -> str:
+        return self.text
+
+
+class RawEvent(Event):
+    """
+    Event with an unknown or unparsed line
+    """
+
+    __slots__ = ("line", )
+
+    def __init__(self, line: str) -> None:
+        self.line = line
+
+    def serialize(self) -> str:
+        return self.line + Message.EOM
+
+
+class InfoEvent(Event):
+    """
+    "info" event
+    """
+
+    __slots__ = ("text", )
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def serialize(self) -> str:
+        return Message.info(self.text)
+
+
+class ErrorEvent(Event):
+    """
+    "error" event
+    """
+
+    __slots__ = ("text", )
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def serialize(self) -> str:
+        return Message.error(self.text)
+
+
+class AccountEvent(Event):
+    """
+    "account" event
+    """
+
+    __slots__ = ("aid", "name", "type", "user", "status")
+
+    priority = PRIORITY_LOW
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, aid: int, name: str, acc_type: str, user: str,
+                 status: str) -> None:
+        self.aid = aid
+        self.name = name
+        self.type = acc_type
+        self.user = user
+        self.status = status
+
+    def serialize(self) -> str:
+        return str(Message.ACCOUNT).format(self.aid, self.name, self.type,
+                                           self.user, self.status)
+
+
+class BuddyEvent(Event):
+    """
+    "buddy" event
+    """
+
+    __slots__ = ("aid", "status", "name", "alias")
+
+    priority = PRIORITY_LOW
+
+    def __init__(self, aid: int, status: str, name: str, alias: str) -> None:
+        self.aid = aid
+        self.status = status
+        self.name = name
+        self.alias = alias
+
+    def serialize(self) -> str:
+        return str(Message.BUDDY).format(self.aid, self.status, self.name,
+                                         self.alias)
+
+
+class StatusEvent(Event):
+    """
+    "status" event
+    """
+
+    __slots__ = ("aid", "status")
+
+    # status of the user's own account, e.g., reply to the status command
+    priority = PRIORITY_HIGH
+
+    def __init__(self, aid: int, status: str) -> None:
+        self.aid = aid
+        self.status = status
+
+    def serialize(self) -> str:
+        return str(Message.STATUS).format(self.aid, self.status)
+
+
+class MessageEvent(Event):
+    """
+    "message" event, msg contains the unescaped message text
+    """
+
+    __slots__ = ("aid", "destination", "tstamp", "sender", "msg")
+
+    is_message = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, aid: int, destination: str, tstamp: str, sender: str,
+                 msg: str) -> None:
+        self.aid = aid
+        self.destination = destination
+        self.tstamp = tstamp
+        self.sender = sender
+        self.msg = msg
+
+    def serialize(self) -> str:
+        return str(Message.MESSAGE).format(self.aid, self.destination,
+                                           self.tstamp, self.sender,
+                                           Message.escape(self.msg))
+
+
+class ChatUserEvent(Event):
+    """
+    "chat user" event
+    """
+
+    __slots__ = ("aid", "chat", "user_id", "user_name", "status")
+
+    priority = PRIORITY_LOW
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, aid: int, chat: str, user_id: str, user_name: str,
+                 status: str) -> None:
+        self.aid = aid
+        self.chat = chat
+        self.user_id = user_id
+        self.user_name = user_name
+        self.status = status
+
+    def serialize(self) -> str:
+        return str(Message.CHAT_USER).format(self.aid, self.chat,
+                                             self.user_id, self.user_name,
+                                             self.status)
+
+
+class ChatListEvent(Event):
+    """
+    "chat list" event
+    """
+
+    __slots__ = ("aid", "chat_id", "chat_name", "user")
+
+    priority = PRIORITY_LOW
+
+    def __init__(self, aid: int, chat_id: str, chat_name: str,
+                 user: str) -> None:
+        self.aid = aid
+        self.chat_id = chat_id
+        self.chat_name = chat_name
+        self.user = user
+
+    def serialize(self) -> str:
+        return str(Message.CHAT_LIST).format(self.aid, self.chat_id,
+                                             self.chat_name, self.user)
+
+
+class ChatMsgEvent(Event):
+    """
+    "chat msg" event, msg contains the unescaped message text
+    """
+
+    __slots__ = ("aid", "chat", "tstamp", "sender", "msg")
+
+    is_message = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, aid: int, chat: str, tstamp: str, sender: str,
+                 msg: str) -> None:
+        self.aid = aid
+        self.chat = chat
+        self.tstamp = tstamp
+        self.sender = sender
+        self.msg = msg
+
+    def serialize(self) -> str:
+        return str(Message.CHAT_MSG).format(self.aid, self.chat, self.tstamp,
+                                            self.sender,
+                                            Message.escape(self.msg))
+
+
+class EventBatch(Event):
+    """
+    Batch of events that is put on the message queue as a single item
+    """
+
+    __slots__ = ("events", "priority")
+
+    def __init__(self, events: List[Event]) -> None:
+        self.events = events
+        self.priority = min([event.priority for event in events],
+                            default=PRIORITY_NORMAL)
+
+    def serialize(self) -> str:
+        return "".join([event.serialize() for event in self.events])
@@ -0,0 +1,154 @@
+"""
+Nuqql-based thread pool for synchronous callbacks
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import threading
+import time
+
+from typing import Any, Callable, List, Optional, TypeVar, cast
+
+Method = TypeVar("Method", bound=Callable[..., None])
+
+# event loop of the callback running in the current thread of the pool
+_THREAD = threading.local()
+
+
+def in_loop(method: Method) -> Method:
+    """
+    Decorator for methods backends call from their callbacks, e.g., to
+    receive messages: if a synchronous callback calls the method in a thread
+    of the pool, the call is passed to the event loop and the method runs in
+    the event loop thread
+    """
+
+    @functools.wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> None:
+        loop = getattr(_THREAD, "loop", None)
+        if loop is None:
+            method(*args, **kwargs)
+            return
+        loop.call_soon_threadsafe(functools.partial(method, *args, **kwargs))
+
+    return cast(Method, wrapper)
+
+
+# pylint: disable=too-many-instance-attributes
+class CallbackExecutor:
+    """
+    Thread pool for running synchronous (blocking) callbacks outside of the
+    event loop
+    """
+
+    def __init__(self, size: int = 4) -> None:
+        self.size = size
+        self._pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # metrics
+        self.active = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def set_size(self, size: int) -> None:
+        """
+        Set the number of threads in the pool. Running callbacks finish in
+        the old pool.
+        """
+
+        if size == self.size:
+            return
+        self.size = size
+        if self._pool:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _get_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        """
+        Get the thread pool, create it if necessary
+        """
+
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.size, thread_name_prefix="nuqql-based")
+        return self._pool
+
+    def _run(self, loop: asyncio.AbstractEventLoop, submitted: float,
+             func: Callable, *args: Any) -> Any:
+        """
+        Run func in a thread of the pool and update metrics, calls of
+        in_loop() methods are passed to loop
+        """
+
+        wait = time.perf_counter() - submitted
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+        _THREAD.loop = loop
+        try:
+            return func(*args)
+        finally:
+            _THREAD.loop = None
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """
+        Run func with args in the thread pool and wait for its result. If the
+        waiting task is cancelled, e.g., by a timeout, a func that is already
+        running cannot be stopped and finishes in the background.
+        """
+
+        with self._lock:
+            self.queued += 1
+            if self.queued > self.max_queued:
+                self.max_queued = self.queued
+        # func runs in a copy of the context, e.g., the recorded command
+        context = contextvars.copy_context()
+        future = self._get_pool().submit(context.run, self._run,
+                                         asyncio.get_running_loop(),
+                                         time.perf_counter(), func, *args)
+        future.add_done_callback(self._cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _cancelled(self, future: concurrent.futures.Future) -> None:
+        """
+        Update metrics if func was cancelled before it was started
+        """
+
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def shutdown(self) -> None:
+        """
+        Shut down the thread pool without waiting for running callbacks
+        """
+
+        if self._pool:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def get_lines(self) -> List[str]:
+        """
+        Get statistics as list of text lines
+        """
+
+        if not self.completed and not self.active and not self.queued:
+            return []
+        started = self.completed + self.active
+        wait_avg = self.wait_total / started if started else 0.0
+        return [f"executor threads {self.size} active {self.active} "
+                f"queued {self.queued} max queued {self.max_queued} "
+                f"completed {self.completed} wait avg {wait_avg:.6f}s "
+                f"max {self.wait_max:.6f}s"]
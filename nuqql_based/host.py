@@ -0,0 +1,96 @@
+"""
+Nuqql-based host for multiple backends in one process
+"""
+
+import asyncio
+
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import nuqql_based.logger
+
+from nuqql_based.based import Based
+from nuqql_based.config import Config
+from nuqql_based.executor import CallbackExecutor
+
+if TYPE_CHECKING:   # imports for typing
+    from nuqql_based.monitor import LoopMonitor  # noqa
+
+
+class Host:
+    """
+    Host that runs multiple backends in one process and event loop. Every
+    backend has its own config, accounts and listeners, but all backends
+    share the thread pool for synchronous callbacks, the log file and the
+    runtime statistics of the host.
+    """
+
+    def __init__(self, name: str = "host", version: str = "") -> None:
+        # config of the host: working directory, logging and thread pool
+        self.config = Config(name, version)
+
+        # thread pool shared by all backends
+        self.executor = CallbackExecutor()
+
+        # hosted backends and their command line arguments
+        self.backends: List[Tuple[Based, List[str]]] = []
+
+        # event loop monitor shared by all backends
+        self.monitor: Optional["LoopMonitor"] = None
+
+    def add(self, based: Based, argv: List[str]) -> None:
+        """
+        Add a backend with its command line arguments, e.g., its working
+        directory and listen endpoints
+        """
+
+        based.host = self
+        based.callbacks.executor = self.executor
+        based.server.host = self
+        self.backends.append((based, argv))
+
+    async def get_stats(self) -> List[str]:
+        """
+        Get the statistics of all backends as list of text lines
+        """
+
+        lines = []
+        for based, _argv in self.backends:
+            name = based.config.get_name()
+            lines += [f"backend {name} {line}"
+                      for line in await based.server.get_all_stats(
+                          executor=False)]
+        lines += self.executor.get_lines()
+        if self.monitor:
+            lines += self.monitor.get_lines()
+        return lines
+
+    async def start(self, argv: Optional[List[str]] = None) -> None:
+        """
+        Start the host and run all backends until they quit; if argv is set,
+        it is used instead of the command line arguments of the host
+        """
+
+        # load config from command line arguments and config file
+        self.config.init(argv)
+        self.executor.set_size(self.config.get_callback_threads())
+
+        # logging
+        nuqql_based.logger.init(self.config)
+
+        # monitor the event loop
+        threshold = self.config.get_stall_threshold()
+        if threshold > 0:
+            # pylint: disable=import-outside-toplevel
+            from nuqql_based.monitor import LoopMonitor
+            self.monitor = LoopMonitor(threshold, [
+                based.server for based, _argv in self.backends])
+            self.monitor.start()
+
+        try:
+            await asyncio.gather(*[based.start(based_argv)
+                                   for based, based_argv in self.backends])
+        finally:
+            if self.monitor:
+                await self.monitor.stop()
+            self.executor.shutdown()
+            nuqql_based.logger.stop()
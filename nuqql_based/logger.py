@@ -3,45 +3,89 @@ Nuqql-based logging
 """
 
 import logging
+import logging.handlers
+import queue
 import stat
 import os
-import sys
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Optional
 if TYPE_CHECKING:   # imports for typing
     # pylint: disable=cyclic-import
     from nuqql_based.config import Config  # noqa
 
+# background thread that writes log records to the log file and the process
+# it belongs to
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+_LISTENER_PID = 0
 
-def init(config: "Config") -> None:
+
+class _RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating file handler that restricts access to its log files
+    """
+
+    def _open(self) -> Any:
+        stream = super()._open()
+        os.chmod(self.baseFilename, stat.S_IRUSR | stat.S_IWUSR)
+        return stream
+
+
+def init(config: "Config", suffix: str = "") -> None:
     """
-    Initialize logger
+    Initialize logger. Log records are passed to a background thread over a
+    queue and written to the log file by this thread, so logging does not
+    block the event loop. The log file is rotated when it reaches the
+    configured maximum size. The optional suffix is appended to the name of
+    the log file.
     """
 
+    # global is used to keep the background thread of the process
+    global _LISTENER, _LISTENER_PID  # pylint: disable=global-statement
+
+    # stop previous logging thread
+    stop()
+
     # make sure logs directory exists
     logs_dir = config.get_dir()
     logs_dir.mkdir(parents=True, exist_ok=True)
     os.chmod(logs_dir, stat.S_IRWXU)
 
-    # configure logging
+    # configure log file
     name = config.get_name()
-    file_name = logs_dir / f"{name}.log"
+    file_name = logs_dir / f"{name}{suffix}.log"
     fmt = "%(asctime)s %(levelname)-5.5s %(message)s"
     date_fmt = "%s"
     loglevel = config.get_loglevel()
+    file_handler = _RotatingFileHandler(
+        file_name, maxBytes=config.get_log_max_bytes(),
+        backupCount=config.get_log_backups(), encoding="UTF-8")
+    file_handler.setFormatter(logging.Formatter(fmt, date_fmt))
+
+    # replace handlers of root logger with a queue handler
+    log_queue: Any = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(loglevel)
+
+    # start writing log records in background thread
+    _LISTENER = logging.handlers.QueueListener(log_queue, file_handler)
+    _LISTENER_PID = os.getpid()
+    _LISTENER.start()
+
+
+def stop() -> None:
+    """
+    Stop logger, write remaining log records to the log file
+    """
+
+    global _LISTENER    # pylint: disable=global-statement
 
-    if sys.version_info >= (3, 8):
-        logging.basicConfig(filename=file_name, format=fmt, datefmt=date_fmt,
-                            level=loglevel, force=True)
-    else:
-        # logging.basicConfig() does not have the "force" parameter before 3.8
-        # so remove handlers if necessary and call it without force
-        root_logger = logging.getLogger()
-        if root_logger.handlers:
-            for handler in root_logger.handlers:
-                root_logger.removeHandler(handler)
-        logging.basicConfig(filename=file_name, format=fmt, datefmt=date_fmt,
-                            level=loglevel)
-
-    # restrict log file access
-    os.chmod(file_name, stat.S_IRUSR | stat.S_IWUSR)
+    # the background thread does not exist in forked processes
+    if _LISTENER and _LISTENER_PID == os.getpid():
+        _LISTENER.stop()
+        for handler in _LISTENER.handlers:
+            handler.close()
+    _LISTENER = None
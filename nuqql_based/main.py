@@ -5,23 +5,26 @@ Basic nuqql backend main entry point
 """
 
 import asyncio
+import random
 import time
 
-from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 from nuqql_based.based import Based
-from nuqql_based.callback import Callback
-from nuqql_based.message import Message
+from nuqql_based.callback import Callback, CallbackFunc
+from nuqql_based.event import ChatMsgEvent, Event, MessageEvent, StatusEvent
 
 if TYPE_CHECKING:   # imports for typing
     from nuqql_based.account import Account     # noqa
-
-CallbackFunc = Callable[[Optional["Account"], Callback, Tuple], Awaitable[str]]
+    from nuqql_based.config import Config       # noqa
 
 VERSION = "0.3.0"
 
-# buddy list for testing only; only supports one account
-TEST_BUDDIES: List[str] = []
+# buddy status values of simulated presence changes
+SIM_STATUS = ("online", "away", "offline")
+
+# interval of simulation steps in seconds
+SIM_INTERVAL = 0.01
 
 
 async def set_status(acc: Optional["Account"], _cmd: Callback,
@@ -33,7 +36,7 @@ async def set_status(acc: Optional["Account"], _cmd: Callback,
     assert acc
     status = params[0]
     acc.status = status
-    acc.receive_msg(Message.status(acc, status))
+    acc.receive_msg(StatusEvent(acc.aid, status))
     return ""
 
 
@@ -44,23 +47,10 @@ async def get_status(acc: Optional["Account"], _cmd: Callback,
     """
 
     assert acc
-    acc.receive_msg(Message.status(acc, acc.status))
+    acc.receive_msg(StatusEvent(acc.aid, acc.status))
     return ""
 
 
-def _add_buddy(name: str) -> None:
-    """
-    Add a buddy to the testing buddy list
-    """
-
-    for buddy in TEST_BUDDIES:
-        if buddy == name:
-            return
-
-    # new buddy
-    TEST_BUDDIES.append(name)
-
-
 async def send_message(acc: Optional["Account"], _cmd: Callback,
                        params: Tuple) -> str:
     """
@@ -71,53 +61,201 @@ async def send_message(acc: Optional["Account"], _cmd: Callback,
     assert acc
     dest, msg = params
 
-    # add destination as buddy in the testing buddy list
-    _add_buddy(dest)
+    # add destination as buddy to the roster of the account
+    acc.roster.update(dest)
 
-    acc.receive_msg(Message.message(acc, str(int(time.time())), dest, acc.user,
-                                    msg.upper()))
+    acc.receive_msg(MessageEvent(acc.aid, acc.user, str(int(time.time())),
+                                 dest, msg.upper()))
     return ""
 
 
-async def _get_buddies(acc: Optional["Account"], _cmd: Callback,
-                       params: Tuple) -> str:
+async def chat_send(acc: Optional["Account"], _cmd: Callback,
+                    params: Tuple) -> str:
     """
-    Get buddy list. For testing, this simply returns a single buddy list for
-    all accounts.
+    Send a message to a chat. For testing, this simply modifies the message
+    and returns it to the sender as a chat message.
     """
 
-    # filter online users?
-    online = False
-    if params:
-        online = params[0]
+    assert acc
+    chat, msg = params
+    acc.receive_msg(ChatMsgEvent(acc.aid, chat, str(int(time.time())),
+                                 acc.user, msg.upper()))
+    return ""
+
 
-    # no test buddies are online, return empty list if only online wanted
-    if online:
+class Simulation:
+    """
+    Synthetic traffic generator: simulates buddies, chats, incoming messages
+    and presence changes for every account inside the backend
+    """
+
+    def __init__(self) -> None:
+        self.config: Optional["Config"] = None
+        self.tasks: Dict[int, asyncio.Task] = {}
+
+    @staticmethod
+    def add_options(config: "Config") -> None:
+        """
+        Add simulation options to the config
+        """
+
+        config.add_option("sim-rate", 0.0, "set number of simulated incoming "
+                          "messages per second and account")
+        config.add_option("sim-buddies", 0, "set number of simulated buddies "
+                          "per account")
+        config.add_option("sim-chats", 0, "set number of simulated chats per "
+                          "account, members are simulated buddies")
+        config.add_option("sim-churn", 0.0, "set number of simulated buddy "
+                          "presence changes per second and account")
+
+    def is_enabled(self) -> bool:
+        """
+        Check if simulation is enabled in the config
+        """
+
+        assert self.config
+        return any(self.config.get_option(name) for name in
+                   ("sim-rate", "sim-buddies", "sim-chats", "sim-churn"))
+
+    async def based_config(self, _acc: Optional["Account"], _cmd: Callback,
+                           params: Tuple) -> str:
+        """
+        Get the config when based is started
+        """
+
+        self.config = params[0]
         return ""
 
-    # construct buddy messages
-    result = ""
-    assert acc
-    for buddy in TEST_BUDDIES:
-        result += Message.buddy(acc, buddy, "", "")
+    async def add_account(self, acc: Optional["Account"], _cmd: Callback,
+                          _params: Tuple) -> str:
+        """
+        Start simulation of a new account
+        """
 
-    return result
+        assert acc
+        if self.is_enabled() and acc.aid not in self.tasks:
+            self.tasks[acc.aid] = asyncio.create_task(self._run(acc))
+        return ""
 
+    async def del_account(self, acc: Optional["Account"], _cmd: Callback,
+                          _params: Tuple) -> str:
+        """
+        Stop simulation of a deleted account
+        """
 
-async def _main() -> None:
+        assert acc
+        task = self.tasks.pop(acc.aid, None)
+        if task:
+            task.cancel()
+        return ""
+
+    async def based_quit(self, _acc: Optional["Account"], _cmd: Callback,
+                         _params: Tuple) -> str:
+        """
+        Stop simulation of all accounts
+        """
+
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        return ""
+
+    def _setup(self, acc: "Account", rand: random.Random) -> List[str]:
+        """
+        Create roster and chats of the account, return buddy names
+        """
+
+        assert self.config
+        buddies = [f"buddy{i}@simulation"
+                   for i in range(self.config.get_option("sim-buddies"))]
+        acc.roster.update_many([(name, name.split("@")[0],
+                                 rand.choice(SIM_STATUS))
+                                for name in buddies])
+        for i in range(self.config.get_option("sim-chats")):
+            chat = f"chat{i}@simulation"
+            acc.chats.join(chat, f"chat{i}")
+            members = rand.sample(buddies, min(len(buddies), 10))
+            acc.chats.user_update_many(chat, [(name, name.split("@")[0],
+                                               "join") for name in members])
+        return buddies
+
+    async def _run(self, acc: "Account") -> None:
+        """
+        Generate incoming messages and presence changes of the account
+        """
+
+        assert self.config
+        rand = random.Random(acc.aid)
+        buddies = self._setup(acc, rand) or ["buddy@simulation"]
+        chats = list(acc.chats.chats)
+        rate = self.config.get_option("sim-rate")
+        churn = self.config.get_option("sim-churn")
+
+        # number of messages and presence changes that are due, the
+        # fractional parts are carried over to the next step
+        num_msgs = 0.0
+        num_changes = 0.0
+        msg_id = 0
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(SIM_INTERVAL)
+            now = time.monotonic()
+            num_msgs += rate * (now - last)
+            num_changes += churn * (now - last)
+            last = now
+
+            # presence changes, pushed to the client if enabled
+            while num_changes >= 1:
+                num_changes -= 1
+                acc.roster.update(rand.choice(buddies),
+                                  status=rand.choice(SIM_STATUS))
+
+            # incoming direct and chat messages, sent as one batch
+            events: List[Event] = []
+            tstamp = str(int(time.time()))
+            while num_msgs >= 1:
+                num_msgs -= 1
+                msg_id += 1
+                sender = rand.choice(buddies)
+                msg = f"simulated message {msg_id}"
+                if chats and msg_id % 2:
+                    events.append(ChatMsgEvent(acc.aid, rand.choice(chats),
+                                               tstamp, sender, msg))
+                else:
+                    events.append(MessageEvent(acc.aid, acc.user, tstamp,
+                                               sender, msg))
+            if events:
+                acc.receive_msgs(events)
+
+
+def create_based() -> Based:
     """
-    Main function
+    Create the dummy backend
     """
 
     based = Based("based", VERSION)
+    simulation = Simulation()
+    simulation.add_options(based.config)
     callbacks: List[Tuple[Callback, CallbackFunc]] = [
+        (Callback.BASED_CONFIG, simulation.based_config),
+        (Callback.BASED_QUIT, simulation.based_quit),
+        (Callback.ADD_ACCOUNT, simulation.add_account),
+        (Callback.DEL_ACCOUNT, simulation.del_account),
         (Callback.SET_STATUS, set_status),
         (Callback.GET_STATUS, get_status),
         (Callback.SEND_MESSAGE, send_message),
-        (Callback.GET_BUDDIES, _get_buddies),
+        (Callback.CHAT_SEND, chat_send),
     ]
     based.set_callbacks(callbacks)
-    await based.start()
+    return based
+
+
+async def _main() -> None:
+    """
+    Main function
+    """
+
+    await create_based().start()
 
 
 def main() -> None:
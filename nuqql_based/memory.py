@@ -0,0 +1,210 @@
+"""
+Nuqql-based in-memory transport
+
+Clients in the same process and event loop can connect to a based server
+through an in-memory stream pair instead of an AF_INET or AF_UNIX socket.
+This allows benchmarks and tests to exercise the message handling, the
+writer and the message queue without sockets, subprocesses or listeners:
+
+    based = Based("based", "0.1")
+    await based.setup(["--dir", "/tmp/based"])
+    reader, writer = await nuqql_based.memory.open_connection(based.server)
+    writer.write(b"version\\r\\n")
+    reply = await reader.readline()
+"""
+
+import asyncio
+
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set, Tuple
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    from nuqql_based.server import Server  # noqa
+
+# default buffer limit of the stream readers, same as asyncio's default
+DEFAULT_LIMIT = 2 ** 16
+
+
+# pylint: disable=too-many-instance-attributes
+class MemoryTransport(asyncio.Transport):
+    """
+    Transport that passes written data directly to the protocol of its peer
+    transport. If the peer pauses reading, writing on this transport is
+    paused, so StreamWriter.drain() waits until the peer consumed the data.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 protocol: asyncio.BaseProtocol,
+                 extra: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__(extra)
+        self._loop = loop
+        self._protocol = protocol
+        self.peer: Optional["MemoryTransport"] = None
+        self._closing = False
+        self._eof = False
+        self._reading_paused = False
+        self._writing_paused = False
+
+        # running tasks of the connection, keep references until done or
+        # until the transport is closed
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add_task(self, task: asyncio.Task) -> None:
+        """
+        Keep a reference to a task of the connection, e.g., the client
+        handler task of the server
+        """
+
+        if self._closing:
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        return self._protocol
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol) -> None:
+        self._protocol = protocol
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def is_reading(self) -> bool:
+        return not self._closing and not self._reading_paused
+
+    def pause_reading(self) -> None:
+        if self._reading_paused:
+            return
+        self._reading_paused = True
+        if self.peer:
+            self.peer.pause_writing()
+
+    def resume_reading(self) -> None:
+        if not self._reading_paused:
+            return
+        self._reading_paused = False
+        if self.peer:
+            self.peer.resume_writing()
+
+    def pause_writing(self) -> None:
+        """
+        Pause writing of the protocol, called by the peer transport
+        """
+
+        if self._closing or self._writing_paused:
+            return
+        self._writing_paused = True
+        self._protocol.pause_writing()
+
+    def resume_writing(self) -> None:
+        """
+        Resume writing of the protocol, called by the peer transport
+        """
+
+        if not self._writing_paused:
+            return
+        self._writing_paused = False
+        if not self._closing:
+            self._protocol.resume_writing()
+
+    def get_write_buffer_size(self) -> int:
+        # data is passed to the peer immediately, there is no write buffer
+        return 0
+
+    def get_write_buffer_limits(self) -> Tuple[int, int]:
+        # there is no write buffer, so there are no watermarks
+        return (0, 0)
+
+    def set_write_buffer_limits(self, high: Optional[int] = None,
+                                low: Optional[int] = None) -> None:
+        return
+
+    def write(self, data: Any) -> None:
+        if not data or self._closing or self._eof:
+            return
+        peer = self.peer
+        if peer is None or peer.is_closing():
+            return
+        peer.get_protocol().data_received(bytes(data))   # type: ignore
+
+    def can_write_eof(self) -> bool:
+        return True
+
+    def write_eof(self) -> None:
+        if self._closing or self._eof:
+            return
+        self._eof = True
+        if self.peer:
+            self._loop.call_soon(self.peer.receive_eof)
+
+    def receive_eof(self) -> None:
+        """
+        Handle end of file from the peer transport, close the transport
+        unless the protocol wants to keep it open
+        """
+
+        if self._closing:
+            return
+        if not self._protocol.eof_received():   # type: ignore
+            self.close()
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        if self.peer and not self._eof:
+            self._eof = True
+            self._loop.call_soon(self.peer.receive_eof)
+        if self._reading_paused and self.peer:
+            self.peer.resume_writing()
+        self._tasks.clear()
+        self._loop.call_soon(self._protocol.connection_lost, None)
+
+    def abort(self) -> None:
+        self.close()
+
+
+def _create_stream(loop: asyncio.AbstractEventLoop, limit: int,
+                   name: str) -> Tuple[asyncio.StreamReader,
+                                       asyncio.StreamReaderProtocol,
+                                       MemoryTransport]:
+    """
+    Create a stream reader with its protocol and transport
+    """
+
+    reader = asyncio.StreamReader(limit=limit, loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport = MemoryTransport(loop, protocol, {"peername": name,
+                                                 "sockname": name})
+    return reader, protocol, transport
+
+
+async def open_connection(server: "Server", limit: int = DEFAULT_LIMIT) \
+        -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Connect a client to the server through an in-memory stream pair and
+    return the reader and writer of the client like asyncio.open_connection.
+    The server handles the client like a client connected to one of its
+    listeners, e.g., only one client can be connected at a time.
+    """
+
+    loop = asyncio.get_running_loop()
+    server_reader, server_protocol, server_transport = _create_stream(
+        loop, limit, "memory:server")
+    client_reader, client_protocol, client_transport = _create_stream(
+        loop, limit, "memory:client")
+    server_transport.peer = client_transport
+    client_transport.peer = server_transport
+    server_protocol.connection_made(server_transport)
+    client_protocol.connection_made(client_transport)
+    server_writer = asyncio.StreamWriter(server_transport, server_protocol,
+                                         server_reader, loop)
+    client_writer = asyncio.StreamWriter(client_transport, client_protocol,
+                                         client_reader, loop)
+
+    # handle the client in a task like asyncio servers do
+    # pylint: disable=protected-access
+    task = loop.create_task(server._handle_client(server_reader,
+                                                  server_writer))
+    server_transport.add_task(task)
+    return client_reader, client_writer
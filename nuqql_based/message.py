@@ -2,7 +2,6 @@
 Nuqql message formats
 """
 
-import html
 from enum import Enum
 
 from typing import TYPE_CHECKING
@@ -66,6 +65,15 @@ account <id> chat invite <chat> <user>
     account id <id>.
 version
     get version of the backend
+stats
+    show runtime statistics of the backend, e.g., callback timings
+profile [seconds]
+    profile the backend for <seconds> or the configured profile time and write
+    the stats to the working directory.
+profile stop
+    stop profiling and write the stats.
+profile tasks
+    write all running tasks with their stacks to the working directory.
 bye
     disconnect from backend
 quit
@@ -76,6 +84,17 @@ help
     def __str__(self) -> str:
         return str(self.value)
 
+    @staticmethod
+    def escape(msg: str) -> str:
+        """
+        Helper for escaping the text of "message" and "chat msg" messages;
+        same escaping as html.escape() without loading the html module
+        """
+
+        msg_body = msg.replace("&", "&amp;").replace("<", "&lt;").replace(
+            ">", "&gt;").replace('"', "&quot;").replace("'", "&#x27;")
+        return "<br/>".join(msg_body.split("\n"))
+
     @staticmethod
     def info(info_text: str) -> str:
         """
@@ -123,8 +142,7 @@ help
         Helper for formatting "message" messages
         """
 
-        msg_body = html.escape(msg)
-        msg_body = "<br/>".join(msg_body.split("\n"))
+        msg_body = Message.escape(msg)
         return str(Message.MESSAGE).format(account.aid, destination, tstamp,
                                            sender, msg_body)
 
@@ -155,8 +173,7 @@ help
         Helper for formatting "chat msg" messages
         """
 
-        msg_body = html.escape(msg)
-        msg_body = "<br/>".join(msg_body.split("\n"))
+        msg_body = Message.escape(msg)
         return str(Message.CHAT_MSG).format(account.aid, destination, tstamp,
                                             sender, msg_body)
 
@@ -0,0 +1,286 @@
+"""
+Nuqql-based metrics server
+
+The metrics server listens on its own endpoint, separate from the nuqql
+client endpoints, and serves the runtime statistics of the backend in the
+Prometheus text format over HTTP. The statistics are counters the backend
+maintains anyway, the metrics text is only built when the metrics are
+scraped.
+"""
+
+import asyncio
+import logging
+
+from typing import TYPE_CHECKING, List, Optional, Union
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    from nuqql_based.monitor import LoopMonitor  # noqa
+    from nuqql_based.server import Server  # noqa
+
+PREFIX = "nuqql_based_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# time a scraper has to send its request in seconds
+REQUEST_TIMEOUT = 5.0
+
+
+def escape(value: str) -> str:
+    """
+    Escape a label value
+    """
+
+    return value.replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+
+class MetricsWriter:
+    """
+    Writer of metrics in the Prometheus text format
+    """
+
+    def __init__(self, labels: str) -> None:
+        self.labels = labels
+        self.lines: List[str] = []
+
+    def header(self, name: str, kind: str, text: str) -> None:
+        """
+        Add help text and type of the metric name
+        """
+
+        self.lines.append(f"# HELP {PREFIX}{name} {text}")
+        self.lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    def sample(self, name: str, value: Union[int, float],
+               labels: str = "") -> None:
+        """
+        Add a sample of the metric name with additional labels
+        """
+
+        all_labels = f"{self.labels},{labels}" if labels else self.labels
+        self.lines.append(f"{PREFIX}{name}{{{all_labels}}} {value}")
+
+    def metric(self, name: str, kind: str, text: str,
+               value: Union[int, float]) -> None:
+        """
+        Add a metric with a single sample
+        """
+
+        self.header(name, kind, text)
+        self.sample(name, value)
+
+    def get_text(self) -> str:
+        """
+        Get the metrics text
+        """
+
+        return "\n".join(self.lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Server of the metrics of a backend
+    """
+
+    def __init__(self, server: "Server") -> None:
+        self.server = server
+
+    def _get_monitor(self) -> Optional["LoopMonitor"]:
+        """
+        Get the event loop monitor of the backend or its host
+        """
+
+        if self.server.host:
+            return self.server.host.monitor
+        return self.server.monitor
+
+    def _add_server(self, out: MetricsWriter) -> None:
+        """
+        Add metrics of the client connection and the event queue
+        """
+
+        server = self.server
+        out.metric("clients_connected", "gauge",
+                   "Number of connected nuqql clients.",
+                   int(server.connected))
+        out.metric("connections_total", "counter",
+                   "Number of accepted nuqql client connections.",
+                   server.connections)
+        out.metric("connections_rejected_total", "counter",
+                   "Number of rejected nuqql client connections.",
+                   server.rejected)
+        out.metric("received_bytes_total", "counter",
+                   "Bytes received from nuqql clients.", server.bytes_in)
+        out.metric("sent_bytes_total", "counter",
+                   "Bytes sent to nuqql clients.", server.output.bytes_out)
+        out.metric("slow_consumers_total", "counter",
+                   "Number of detected slow nuqql clients.",
+                   server.output.slow_consumers)
+        out.metric("slow_consumers_disconnected_total", "counter",
+                   "Number of disconnected slow nuqql clients.",
+                   server.output.disconnected)
+        out.metric("dropped_events_total", "counter",
+                   "Number of low priority events dropped for slow "
+                   "clients.", server.output.dropped)
+        out.metric("spilled_events_total", "counter",
+                   "Number of events spilled to disk for slow clients.",
+                   server.output.spilled)
+        out.metric("queue_depth", "gauge",
+                   "Number of events queued for the client.",
+                   server.queue.qsize())
+
+    def _add_commands(self, out: MetricsWriter) -> None:
+        """
+        Add metrics of the commands received from clients
+        """
+
+        stats = self.server.commands
+        out.header("commands_total", "counter",
+                   "Number of handled commands.")
+        for name, calls in stats.calls.items():
+            out.sample("commands_total", calls, f'command="{name}"')
+        out.header("command_duration_seconds", "summary",
+                   "Duration of handling commands.")
+        for name, calls in stats.calls.items():
+            label = f'command="{name}"'
+            out.sample("command_duration_seconds_sum", stats.total[name],
+                       label)
+            out.sample("command_duration_seconds_count", calls, label)
+        out.header("command_duration_max_seconds", "gauge",
+                   "Maximum duration of handling commands.")
+        for name, duration in stats.max.items():
+            out.sample("command_duration_max_seconds", duration,
+                       f'command="{name}"')
+
+    def _add_callbacks(self, out: MetricsWriter) -> None:
+        """
+        Add metrics of the callbacks
+        """
+
+        stats = self.server.callbacks.stats
+        out.header("callback_duration_seconds", "summary",
+                   "Duration of callbacks.")
+        for name, calls in stats.calls.items():
+            label = f'callback="{name.name}"'
+            out.sample("callback_duration_seconds_sum", stats.total[name],
+                       label)
+            out.sample("callback_duration_seconds_count", calls, label)
+        out.header("callback_duration_max_seconds", "gauge",
+                   "Maximum duration of callbacks.")
+        for name, duration in stats.max.items():
+            out.sample("callback_duration_max_seconds", duration,
+                       f'callback="{name.name}"')
+        out.header("callback_timeouts_total", "counter",
+                   "Number of timed out callbacks.")
+        for name, timeouts in stats.timeouts.items():
+            out.sample("callback_timeouts_total", timeouts,
+                       f'callback="{name.name}"')
+
+    async def _add_accounts(self, out: MetricsWriter) -> None:
+        """
+        Add metrics of the accounts, in worker mode the histories of the
+        accounts are in the worker processes
+        """
+
+        account_list = self.server.account_list
+        accounts = account_list.get()
+        out.metric("accounts", "gauge", "Number of accounts.", len(accounts))
+        if account_list.workers:
+            history = await account_list.workers.get_history()
+        else:
+            history = {acc_id: acc.get_history_length()
+                       for acc_id, acc in accounts.items()}
+        out.header("history_messages", "gauge",
+                   "Number of messages in the history of accounts.")
+        for acc_id, length in history.items():
+            out.sample("history_messages", length, f'account="{acc_id}"')
+
+    def _add_runtime(self, out: MetricsWriter) -> None:
+        """
+        Add metrics of the thread pool and the event loop
+        """
+
+        executor = self.server.callbacks.executor
+        out.metric("executor_threads", "gauge",
+                   "Number of threads for synchronous callbacks.",
+                   executor.size)
+        out.metric("executor_active", "gauge",
+                   "Number of running synchronous callbacks.",
+                   executor.active)
+        out.metric("executor_queued", "gauge",
+                   "Number of queued synchronous callbacks.", executor.queued)
+        out.metric("executor_completed_total", "counter",
+                   "Number of completed synchronous callbacks.",
+                   executor.completed)
+
+        monitor = self._get_monitor()
+        if not monitor:
+            return
+        out.metric("loop_lag_max_seconds", "gauge",
+                   "Maximum event loop lag.", monitor.max)
+        out.header("loop_lag_seconds", "summary", "Event loop lag.")
+        out.sample("loop_lag_seconds_sum", monitor.total)
+        out.sample("loop_lag_seconds_count", monitor.samples)
+        out.metric("loop_stalls_total", "counter",
+                   "Number of event loop stalls.",
+                   sum(monitor.stalls.values()))
+
+    async def get_metrics(self) -> str:
+        """
+        Get the metrics of the backend in the Prometheus text format
+        """
+
+        out = MetricsWriter(
+            f'backend="{escape(self.server.config.get_name())}"')
+        self._add_server(out)
+        self._add_commands(out)
+        self._add_callbacks(out)
+        await self._add_accounts(out)
+        self._add_runtime(out)
+        return out.get_text()
+
+    async def _get_response(self, request: bytes) -> bytes:
+        """
+        Get the HTTP response to the request
+        """
+
+        method, _sep, rest = request.decode(errors="replace").partition(" ")
+        path = rest.split(" ", 1)[0].split("?", 1)[0]
+        if method not in ("GET", "HEAD"):
+            status, body, content_type = "405 Method Not Allowed", "", \
+                "text/plain"
+        elif path not in ("/", "/metrics"):
+            status, body, content_type = "404 Not Found", "", "text/plain"
+        else:
+            status, body, content_type = "200 OK", \
+                await self.get_metrics(), CONTENT_TYPE
+        data = body.encode()
+        header = (f"HTTP/1.0 {status}\r\n"
+                  f"Content-Type: {content_type}\r\n"
+                  f"Content-Length: {len(data)}\r\n"
+                  "Connection: close\r\n\r\n").encode()
+        if method == "HEAD":
+            return header
+        return header + data
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """
+        Handle a scraper connection: answer a single HTTP request and close
+        the connection
+        """
+
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"),
+                                             REQUEST_TIMEOUT)
+            writer.write(await self._get_response(request))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError, ConnectionError) as error:
+            logging.debug("metrics request failed: %r", error)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
@@ -0,0 +1,222 @@
+"""
+Nuqql-based event loop monitor
+
+The monitor task sleeps for short intervals and measures how late the event
+loop wakes it up. If the lag exceeds the stall threshold, the loop was
+blocked, e.g., by a callback doing blocking work. While the loop is blocked,
+the monitor task cannot run, so a watchdog thread checks if the heartbeat of
+the monitor task is overdue and then samples the stack of the event loop
+thread to find the callback, command or function that blocks the loop. The
+watchdog thread only reads the code locations of the stack; callbacks and
+commands are looked up by the current task of the event loop.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from types import FrameType
+from typing import Any, Dict, List, Optional, Tuple
+
+from nuqql_based.account import Account, AccountList
+from nuqql_based.callback import Callback, Callbacks
+from nuqql_based.server import Server, cancel_task
+
+
+def _get_function(func: Any) -> Tuple[str, str]:
+    """
+    Get file name and name of a function like in stack summaries
+    """
+
+    return func.__code__.co_filename, func.__code__.co_name
+
+
+# functions stalls are attributed to
+# pylint: disable=protected-access
+_CALLBACK_FUNC = _get_function(Callbacks._call_in_task)
+_COMMAND_FUNC = _get_function(Server.handle_msg)
+_STORE_FUNC = _get_function(AccountList.store)
+
+
+def _get_callback(name: Callback, account: Optional[Account]) -> str:
+    """
+    Get callback and account as activity
+    """
+
+    aid = "-" if account is None else account.aid
+    return f"callback {name.name} account {aid}"
+
+
+def get_activity(frame: Optional[FrameType],
+                 running: Optional[Tuple[Callback, Optional[Account]]] = None,
+                 command: Optional[str] = None) -> str:
+    """
+    Get the callback, command or function running in the stack of frame.
+    Only the code locations of the stack are used, running is the callback
+    and account and command is the command of the current task, if any.
+    Callbacks with a timeout run in their own task, so their stack does not
+    show them as callbacks.
+    """
+
+    stack = traceback.extract_stack(frame) if frame else []
+    for summary in reversed(stack):
+        function = (summary.filename, summary.name)
+        if function == _CALLBACK_FUNC and running:
+            return _get_callback(*running)
+        if function == _STORE_FUNC:
+            return "account store"
+        if function == _COMMAND_FUNC and command:
+            return f"command {command}"
+    if running:
+        return _get_callback(*running)
+    if stack:
+        file_name = os.path.basename(stack[-1].filename)
+        return f"function {stack[-1].name} {file_name}:{stack[-1].lineno}"
+    return "unknown"
+
+
+# pylint: disable=too-many-instance-attributes
+class LoopMonitor:
+    """
+    Monitor of the event loop lag and stalls
+    """
+
+    def __init__(self, threshold: float,
+                 servers: Optional[List[Server]] = None) -> None:
+        self.threshold = threshold
+        self.interval = threshold / 2
+
+        # servers of the monitored backends with their running commands and
+        # callbacks
+        self.servers = servers or []
+
+        # lag statistics
+        self.samples = 0
+        self.total = 0.0
+        self.max = 0.0
+
+        # stalls per activity: number of stalls and maximum duration
+        self.stalls: Dict[str, int] = {}
+        self.stalls_max: Dict[str, float] = {}
+
+        # heartbeat of the monitor task and activity sampled during a stall
+        self._heartbeat = 0.0
+        self._sampled = 0.0
+        self._activity = ""
+
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_id = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop = threading.Event()
+
+    def _add_stall(self, lag: float, activity: str) -> None:
+        """
+        Count and log a stall of the event loop
+        """
+
+        self.stalls[activity] = self.stalls.get(activity, 0) + 1
+        if lag > self.stalls_max.get(activity, 0.0):
+            self.stalls_max[activity] = lag
+        logging.warning("event loop stalled for %.3fs in %s", lag, activity)
+
+    async def _run(self) -> None:
+        """
+        Monitor task: measure the lag of the event loop
+        """
+
+        while True:
+            beat = time.perf_counter()
+            self._heartbeat = beat
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - beat - self.interval, 0.0)
+            self.samples += 1
+            self.total += lag
+            self.max = max(self.max, lag)
+            if lag > self.threshold:
+                activity = "unknown"
+                if self._sampled == beat:
+                    activity = self._activity
+                self._add_stall(lag, activity)
+
+    def _watch(self) -> None:
+        """
+        Watchdog thread: sample the activity of the event loop thread when
+        the heartbeat of the monitor task is overdue
+        """
+
+        while not self._stop.wait(self.interval / 2):
+            beat = self._heartbeat
+            overdue = beat + self.interval + self.threshold / 2
+            if beat == self._sampled or time.perf_counter() < overdue:
+                continue
+            # pylint: disable=protected-access
+            frame = sys._current_frames().get(self._thread_id)
+            running, command = self._get_running()
+            self._activity = get_activity(frame, running, command)
+            self._sampled = beat
+
+    def _get_running(self) -> Tuple[Optional[Tuple[Callback,
+                                                   Optional[Account]]],
+                                    Optional[str]]:
+        """
+        Get callback and account and the command the current task of the
+        event loop runs, if any
+        """
+
+        task = asyncio.current_task(self._loop) if self._loop else None
+        running = None
+        command = None
+        if task is None:
+            return running, command
+        for server in self.servers:
+            running = running or server.callbacks.running.get(task)
+            command = command or server.running.get(task)
+        return running, command
+
+    def start(self) -> None:
+        """
+        Start monitoring the running event loop
+        """
+
+        self._thread_id = threading.get_ident()
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._thread = threading.Thread(target=self._watch,
+                                        name="nuqql-based monitor",
+                                        daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """
+        Stop monitoring
+        """
+
+        if self._task:
+            await cancel_task(self._task)
+            self._task = None
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def get_lines(self) -> List[str]:
+        """
+        Get statistics as list of text lines
+        """
+
+        avg = self.total / self.samples if self.samples else 0.0
+        lines = [f"loop lag samples {self.samples} avg {avg:.6f}s "
+                 f"max {self.max:.6f}s stalls {sum(self.stalls.values())} "
+                 f"threshold {self.threshold}s"]
+        for activity, count in sorted(self.stalls.items(),
+                                      key=lambda item: item[1],
+                                      reverse=True)[:10]:
+            lines.append(f"loop stalls {count} max "
+                         f"{self.stalls_max[activity]:.6f}s in {activity}")
+        return lines
@@ -0,0 +1,213 @@
+"""
+Nuqql message parser
+"""
+
+import html
+
+from typing import Callable, Dict, List
+
+from nuqql_based.event import Event, RawEvent, InfoEvent, ErrorEvent, \
+    AccountEvent, BuddyEvent, StatusEvent, MessageEvent, ChatUserEvent, \
+    ChatListEvent, ChatMsgEvent
+from nuqql_based.message import Message
+
+EOM = Message.EOM.value
+EOM_BYTES = EOM.encode()
+
+
+def _unescape(msg_body: str) -> str:
+    """
+    Helper for reverting the escaping of message bodies
+    """
+
+    return html.unescape(msg_body.replace("<br/>", "\n"))
+
+
+def _parse_info(_line: str, rest: str) -> Event:
+    """
+    Parse "info: <text>"
+    """
+
+    return InfoEvent(rest)
+
+
+def _parse_error(_line: str, rest: str) -> Event:
+    """
+    Parse "error: <text>"
+    """
+
+    return ErrorEvent(rest)
+
+
+def _parse_account(line: str, rest: str) -> Event:
+    """
+    Parse "account: <id> (<name>) <type> <user> [<status>]"
+    """
+
+    aid, _, rest = rest.partition(" (")
+    name, _, rest = rest.rpartition(") ")
+    rest, _, status = rest.rpartition(" [")
+    acc_type, _, user = rest.partition(" ")
+    if not status.endswith("]") or not aid.isdigit():
+        return RawEvent(line)
+    return AccountEvent(int(aid), name, acc_type, user, status[:-1])
+
+
+def _parse_buddy(line: str, rest: str) -> Event:
+    """
+    Parse "buddy: <id> status: <status> name: <name> alias: <alias>"
+    """
+
+    aid, sep1, rest = rest.partition(" status: ")
+    status, sep2, rest = rest.partition(" name: ")
+    name, sep3, alias = rest.rpartition(" alias: ")
+    if not (sep1 and sep2 and sep3) or not aid.isdigit():
+        return RawEvent(line)
+    return BuddyEvent(int(aid), status, name, alias)
+
+
+def _parse_status(line: str, rest: str) -> Event:
+    """
+    Parse "status: account <id> status: <status>"
+    """
+
+    if not rest.startswith("account "):
+        return RawEvent(line)
+    aid, sep, status = rest[len("account "):].partition(" status: ")
+    if not sep or not aid.isdigit():
+        return RawEvent(line)
+    return StatusEvent(int(aid), status)
+
+
+def _parse_message(line: str, rest: str) -> Event:
+    """
+    Parse "message: <id> <destination> <timestamp> <sender> <msg>"
+    """
+
+    parts = rest.split(" ", 4)
+    if len(parts) != 5 or not parts[0].isdigit():
+        return RawEvent(line)
+    aid, dest, tstamp, sender, msg = parts
+    return MessageEvent(int(aid), dest, tstamp, sender, _unescape(msg))
+
+
+def _parse_chat_user(line: str, rest: str) -> Event:
+    """
+    Parse "chat: user: <id> <chat> <user_id> <user_name> <status>"
+    """
+
+    parts = rest.split(" ", 3)
+    if len(parts) != 4 or not parts[0].isdigit():
+        return RawEvent(line)
+    aid, chat, user_id, rest = parts
+    user_name, _, status = rest.rpartition(" ")
+    return ChatUserEvent(int(aid), chat, user_id, user_name, status)
+
+
+def _parse_chat_list(line: str, rest: str) -> Event:
+    """
+    Parse "chat: list: <id> <chat_id> <chat_name> <user>"
+    """
+
+    parts = rest.split(" ", 2)
+    if len(parts) != 3 or not parts[0].isdigit():
+        return RawEvent(line)
+    aid, chat_id, rest = parts
+    chat_name, _, user = rest.rpartition(" ")
+    return ChatListEvent(int(aid), chat_id, chat_name, user)
+
+
+def _parse_chat_msg(line: str, rest: str) -> Event:
+    """
+    Parse "chat: msg: <id> <chat> <timestamp> <sender> <msg>"
+    """
+
+    parts = rest.split(" ", 4)
+    if len(parts) != 5 or not parts[0].isdigit():
+        return RawEvent(line)
+    aid, chat, tstamp, sender, msg = parts
+    return ChatMsgEvent(int(aid), chat, tstamp, sender, _unescape(msg))
+
+
+_CHAT_PARSERS: Dict[str, Callable[[str, str], Event]] = {
+    "user": _parse_chat_user,
+    "list": _parse_chat_list,
+    "msg": _parse_chat_msg,
+}
+
+
+def _parse_chat(line: str, rest: str) -> Event:
+    """
+    Parse "chat: <type>: ..." messages
+    """
+
+    chat_type, _, rest = rest.partition(": ")
+    parse = _CHAT_PARSERS.get(chat_type)
+    if parse is None:
+        return RawEvent(line)
+    return parse(line, rest)
+
+
+_PARSERS: Dict[str, Callable[[str, str], Event]] = {
+    "info": _parse_info,
+    "error": _parse_error,
+    "account": _parse_account,
+    "buddy": _parse_buddy,
+    "status": _parse_status,
+    "message": _parse_message,
+    "chat": _parse_chat,
+}
+
+
+def parse_line(line: str) -> Event:
+    """
+    Parse a single line without end of message marker into an event
+    """
+
+    prefix, _, rest = line.partition(": ")
+    parse = _PARSERS.get(prefix)
+    if parse is None:
+        return RawEvent(line)
+    return parse(line, rest)
+
+
+def parse_lines(text: str) -> List[Event]:
+    """
+    Parse text consisting of complete lines into a list of events, empty
+    lines are skipped
+    """
+
+    return [parse_line(line) for line in text.split(EOM) if line]
+
+
+class Parser:
+    """
+    Incremental parser that turns a byte stream into events
+    """
+
+    def __init__(self) -> None:
+        self._buf = b""
+
+    def feed(self, data: bytes) -> List[Event]:
+        """
+        Add data to the parser and return all events of complete lines. Data
+        of an incomplete line is kept until the rest of the line is fed,
+        empty lines are skipped.
+        """
+
+        buf = self._buf + data if self._buf else data
+        end = buf.rfind(EOM_BYTES)
+        if end == -1:
+            self._buf = buf
+            return []
+
+        self._buf = buf[end + len(EOM_BYTES):]
+        text = buf[:end].decode(errors="replace")
+        return [parse_line(line) for line in text.split(EOM) if line]
+
+    def pending(self) -> bytes:
+        """
+        Get buffered data of an incomplete line
+        """
+
+        return self._buf
@@ -0,0 +1,121 @@
+"""
+Nuqql-based on-demand profiling
+
+The profiler runs cProfile on the event loop thread for a fixed time window
+and writes the stats to the working directory: a binary stats file that can
+be loaded with pstats or other profile viewers and a text summary sorted by
+cumulative time. It can also dump all running asyncio tasks with their
+stacks. Profiling is triggered with the SIGUSR1 signal or the "profile"
+command, dumping tasks with the SIGUSR2 signal or the "profile tasks"
+command.
+"""
+
+import asyncio
+import logging
+import os
+import pathlib
+import time
+
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    from nuqql_based.config import Config  # noqa
+
+
+class Profiler:
+    """
+    On-demand profiler of the event loop
+    """
+
+    def __init__(self, config: "Config") -> None:
+        self.config = config
+        self._profile: Any = None
+        self._stop_handle: Optional[asyncio.TimerHandle] = None
+        self.path: Optional[pathlib.Path] = None
+
+    def _get_path(self, kind: str, suffix: str) -> pathlib.Path:
+        """
+        Get path of a new output file in the working directory
+        """
+
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = self.config.get_name()
+        return self.config.get_dir() / \
+            f"{name}-{kind}-{os.getpid()}-{stamp}.{suffix}"
+
+    def is_running(self) -> bool:
+        """
+        Check if profiling is running
+        """
+
+        return self._profile is not None
+
+    def start(self, duration: Optional[float] = None) -> pathlib.Path:
+        """
+        Start profiling for duration seconds, or the profile time in the
+        config, and return the path of the stats file
+        """
+
+        if self._profile:
+            assert self.path
+            return self.path
+
+        # cProfile is only needed when profiling, load it on demand
+        import cProfile     # pylint: disable=import-outside-toplevel
+
+        if duration is None:
+            duration = self.config.get_profile_time()
+        self.path = self._get_path("profile", "prof")
+        self._profile = cProfile.Profile()
+        self._stop_handle = asyncio.get_running_loop().call_later(duration,
+                                                                  self.stop)
+        logging.info("profiling for %s seconds, stats file: %s", duration,
+                     self.path)
+        self._profile.enable()
+        return self.path
+
+    def stop(self) -> Optional[pathlib.Path]:
+        """
+        Stop profiling and write the stats, return the path of the stats
+        file or None if profiling was not running
+        """
+
+        if not self._profile:
+            return None
+        self._profile.disable()
+        if self._stop_handle:
+            self._stop_handle.cancel()
+            self._stop_handle = None
+
+        # pylint: disable=import-outside-toplevel
+        import pstats
+
+        assert self.path
+        self.config.get_dir().mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(self.path)
+        with open(self.path.with_suffix(".txt"), "w",
+                  encoding="UTF-8") as text_file:
+            stats = pstats.Stats(self._profile, stream=text_file)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+        self._profile = None
+        logging.info("wrote profiling stats to %s", self.path)
+        return self.path
+
+    def dump_tasks(self) -> pathlib.Path:
+        """
+        Write all running asyncio tasks with their stacks to a file and
+        return its path
+        """
+
+        path = self._get_path("tasks", "txt")
+        self.config.get_dir().mkdir(parents=True, exist_ok=True)
+        tasks = asyncio.all_tasks()
+        with open(path, "w", encoding="UTF-8") as tasks_file:
+            tasks_file.write(f"{len(tasks)} tasks\n\n")
+            for task in tasks:
+                tasks_file.write(f"{task!r}\n")
+                task.print_stack(file=tasks_file)
+                tasks_file.write("\n")
+        logging.info("dumped %d tasks to %s", len(tasks), path)
+        return path
@@ -0,0 +1,230 @@
+"""
+Nuqql-based session recording
+
+A recording contains client sessions with the commands received from the
+client, the events injected by the backend and their timing. Every line is a
+record with the time in seconds since the start of the session, the record
+type and its text:
+
+    0.000000 S <unix time> <backend name> <backend version>
+    0.000012 A <account id> <account type> <account user>
+    0.731244 C account 0 send user@example.com hello
+    0.731580 R message: 0 me@example.com 1600000000 user@example.com hello
+    2.104512 E message: 0 me@example.com 1600000002 user@example.com hi
+
+S starts a new session, A lists the accounts that existed at its start, C is
+a command, R is an event the backend received while it handled a command,
+e.g., the echo of a sent message, and E is any other event. Replaying the
+commands causes the R events again, so only E events are injected on replay.
+Newlines and backslashes in texts are escaped. Recordings are appended to the
+file; if its name ends with ".gz", it is compressed with gzip. The file is
+written in a background thread, so recording does not block the event loop.
+"""
+
+import contextvars
+import itertools
+import os
+import pathlib
+import queue
+import re
+import stat
+import threading
+import time
+
+from typing import TYPE_CHECKING, Iterable, List, Optional, Set, TextIO, \
+    Tuple, cast
+
+from nuqql_based.message import Message
+
+if TYPE_CHECKING:   # imports for typing
+    from nuqql_based.account import Account  # noqa
+    from nuqql_based.event import Event  # noqa
+
+# record types
+SESSION = "S"
+ACCOUNT = "A"
+COMMAND = "C"
+RESULT = "R"
+EVENT = "E"
+
+# a record: time since start of session, record type and text
+Record = Tuple[float, str, str]
+
+_UNESCAPE_RE = re.compile(r"\\(.)")
+_UNESCAPE_MAP = {"n": "\n", "r": "\r"}
+
+# recorder of the command that is currently handled
+_COMMAND: "contextvars.ContextVar[Optional[Recorder]]" = \
+    contextvars.ContextVar("command", default=None)
+
+# sequence numbers of events that are results of commands
+_RESULT_SEQ = itertools.count(1)
+
+
+def _escape(text: str) -> str:
+    """
+    Helper for escaping newlines and backslashes in record texts
+    """
+
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace("\r",
+                                                                   "\\r")
+
+
+def _unescape(text: str) -> str:
+    """
+    Helper for reverting the escaping of record texts
+    """
+
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPE_MAP.get(m[1], m[1]), text)
+
+
+def _open(path: pathlib.Path, mode: str) -> TextIO:
+    """
+    Open recording file in text mode, gzip compressed if the name ends with
+    ".gz"
+    """
+
+    if path.suffix == ".gz":
+        # gzip is only needed for compressed recordings, load it on demand
+        import gzip     # pylint: disable=import-outside-toplevel
+        return gzip.open(path, f"{mode}t", encoding="UTF-8")  # type: ignore
+    return cast(TextIO, open(path, mode, encoding="UTF-8"))
+
+
+def add_result(event: "Event") -> None:
+    """
+    Mark an event the backend received as result of the command that is
+    currently handled, if it is recorded. The command is also known in the
+    threads of synchronous callbacks, which run in a copy of its context.
+    """
+
+    recorder = _COMMAND.get()
+    if recorder:
+        event.result_seq = next(_RESULT_SEQ)
+        recorder.results.add(event.result_seq)
+
+
+class Recorder:
+    """
+    Recorder of a client session
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._file: Optional[TextIO] = None
+        self._start = 0.0
+
+        # sequence numbers of queued events that are results of commands
+        self.results: Set[int] = set()
+
+        # background thread writing the records and its queue
+        self._thread: Optional[threading.Thread] = None
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._token: Optional[contextvars.Token] = None
+
+    def _write(self, kind: str, text: str) -> None:
+        offset = time.perf_counter() - self._start
+        self._queue.put(f"{offset:.6f} {kind} {_escape(text)}\n")
+
+    def _run(self) -> None:
+        """
+        Background thread: write records from the queue to the file
+        """
+
+        assert self._file
+        line = self._queue.get()
+        while line is not None:
+            self._file.write(line)
+            line = self._queue.get()
+
+    def start(self, name: str, version: str,
+              accounts: Iterable["Account"]) -> None:
+        """
+        Start recording a session of backend name and version with accounts
+        """
+
+        # recordings contain messages, make sure only user can read them
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+        os.chmod(self.path, stat.S_IRUSR | stat.S_IWUSR)
+
+        self._file = _open(self.path, "a")
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run,
+                                        name="nuqql-based recorder",
+                                        daemon=True)
+        self._thread.start()
+        self._write(SESSION, f"{int(time.time())} {name} {version}")
+        for acc in accounts:
+            self._write(ACCOUNT, f"{acc.aid} {acc.type} {acc.user}")
+
+    def command(self, msg: str) -> None:
+        """
+        Record a command received from the client, events the backend
+        receives until command_done() is called are results of the command
+        """
+
+        if self._file:
+            self._write(COMMAND, msg)
+            self._token = _COMMAND.set(self)
+
+    def command_done(self) -> None:
+        """
+        Stop marking events as results of the last command
+        """
+
+        if self._token:
+            _COMMAND.reset(self._token)
+            self._token = None
+
+    def event(self, event: "Event", text: str) -> None:
+        """
+        Record the serialized text of an event sent to the client
+        """
+
+        if not self._file:
+            return
+        kind = EVENT
+        result_seq = getattr(event, "result_seq", None)
+        if result_seq in self.results:
+            self.results.discard(result_seq)
+            kind = RESULT
+        for line in text.split(Message.EOM):
+            if line:
+                self._write(kind, line)
+
+    def stop(self) -> None:
+        """
+        Stop recording the session, write the remaining records to the file
+        """
+
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._file:
+            self._file.close()
+            self._file = None
+        self.results.clear()
+
+
+def load(path: pathlib.Path) -> List[List[Record]]:
+    """
+    Load all sessions from a recording file
+    """
+
+    sessions: List[List[Record]] = []
+    with _open(path, "r") as record_file:
+        for num, line in enumerate(record_file, 1):
+            offset, _sep, rest = line.rstrip("\n").partition(" ")
+            kind, _sep, text = rest.partition(" ")
+            try:
+                record = (float(offset), kind, _unescape(text))
+            except ValueError as error:
+                raise ValueError(f"invalid record in line {num}") from error
+            if kind == SESSION:
+                sessions.append([])
+            if not sessions:
+                raise ValueError(f"record outside of session in line {num}")
+            sessions[-1].append(record)
+    return sessions
@@ -0,0 +1,179 @@
+"""
+Nuqql-based buddy roster
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from nuqql_based.event import BuddyEvent
+from nuqql_based.executor import in_loop
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    from nuqql_based.account import Account  # noqa
+
+# buddy status values that are treated as offline
+OFFLINE_STATUS = ("", "offline")
+
+
+class Buddy:
+    """
+    Buddy in the roster
+    """
+
+    __slots__ = ("name", "alias", "status")
+
+    def __init__(self, name: str, alias: str, status: str) -> None:
+        self.name = name
+        self.alias = alias
+        self.status = status
+
+    def is_online(self) -> bool:
+        """
+        Check if buddy is online
+        """
+
+        return self.status.lower() not in OFFLINE_STATUS
+
+
+class Roster:
+    """
+    Buddy roster of an account, indexed by buddy name and status. Backends
+    push presence changes into the roster, and the server answers buddy list
+    requests from it if the backend does not have a GET_BUDDIES callback.
+    """
+
+    def __init__(self, account: "Account") -> None:
+        self.account = account
+        self.buddies: Dict[str, Buddy] = {}
+        self._status_index: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.buddies)
+
+    def _index(self, buddy: Buddy) -> None:
+        """
+        Add buddy to status index
+        """
+
+        names = self._status_index.get(buddy.status)
+        if names is None:
+            names = self._status_index[buddy.status] = set()
+        names.add(buddy.name)
+
+    def _unindex(self, buddy: Buddy) -> None:
+        """
+        Remove buddy from status index
+        """
+
+        names = self._status_index[buddy.status]
+        names.discard(buddy.name)
+        if not names:
+            del self._status_index[buddy.status]
+
+    def _update(self, name: str, alias: Optional[str],
+                status: Optional[str]) -> Optional[BuddyEvent]:
+        """
+        Add or update a buddy, return buddy event if something changed
+        """
+
+        buddy = self.buddies.get(name)
+        if buddy is None:
+            buddy = Buddy(name, alias or "", status or "")
+            self.buddies[name] = buddy
+            self._index(buddy)
+            return BuddyEvent(self.account.aid, buddy.status, name,
+                              buddy.alias)
+
+        changed = False
+        if alias is not None and alias != buddy.alias:
+            buddy.alias = alias
+            changed = True
+        if status is not None and status != buddy.status:
+            self._unindex(buddy)
+            buddy.status = status
+            self._index(buddy)
+            changed = True
+        if not changed:
+            return None
+        return BuddyEvent(self.account.aid, buddy.status, name, buddy.alias)
+
+    @in_loop
+    def update(self, name: str, alias: Optional[str] = None,
+               status: Optional[str] = None) -> None:
+        """
+        Add a buddy or update alias and/or status of a buddy
+        """
+
+        event = self._update(name, alias, status)
+        if event and self.account.config.get_push_buddies():
+            self.account.receive_msg(event)
+
+    @in_loop
+    def update_many(self, buddies: Iterable[Tuple[str, Optional[str],
+                                                  Optional[str]]]) -> None:
+        """
+        Add or update multiple buddies given as (name, alias, status) tuples,
+        e.g., after retrieving the buddy list from the server
+        """
+
+        events = []
+        for name, alias, status in buddies:
+            event = self._update(name, alias, status)
+            if event:
+                events.append(event)
+        if events and self.account.config.get_push_buddies():
+            self.account.receive_msgs(events)
+
+    @in_loop
+    def remove(self, name: str) -> None:
+        """
+        Remove a buddy
+        """
+
+        buddy = self.buddies.pop(name, None)
+        if buddy is None:
+            return
+        self._unindex(buddy)
+        if self.account.config.get_push_buddies():
+            self.account.receive_msg(BuddyEvent(self.account.aid, "offline",
+                                                name, buddy.alias))
+
+    @in_loop
+    def clear(self) -> None:
+        """
+        Remove all buddies
+        """
+
+        self.buddies.clear()
+        self._status_index.clear()
+
+    def get(self, name: str) -> Optional[Buddy]:
+        """
+        Get a buddy by name
+        """
+
+        return self.buddies.get(name)
+
+    def get_buddies(self, online: bool = False) -> List[Buddy]:
+        """
+        Get all buddies or only online buddies
+        """
+
+        if not online:
+            return list(self.buddies.values())
+
+        buddies = []
+        for status, names in self._status_index.items():
+            if status.lower() in OFFLINE_STATUS:
+                continue
+            buddies += [self.buddies[name] for name in names]
+        return buddies
+
+    def get_events(self, online: bool = False) -> List[BuddyEvent]:
+        """
+        Get buddy events of all buddies or only online buddies
+        """
+
+        aid = self.account.aid
+        return [BuddyEvent(aid, buddy.status, buddy.name, buddy.alias)
+                for buddy in self.get_buddies(online)]
@@ -4,23 +4,108 @@ nuqql-based socket server
 
 import asyncio
 import logging
+import socket
 import stat
 import os
-try:
-    import daemon   # type: ignore
-except ImportError:
-    daemon = None
+import time
 
-from typing import TYPE_CHECKING, List, Tuple, Optional
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, \
+    Tuple
+
+import nuqql_based.logger
 
 from nuqql_based.callback import Callback
+from nuqql_based.event import PRIORITY_HIGH, ChatMsgEvent, Event, \
+    MessageEvent
 from nuqql_based.message import Message
+from nuqql_based.profiler import Profiler
+from nuqql_based.writer import PRIORITY_BULK, ClientWriter, WriterStats
 
 if TYPE_CHECKING:   # imports for typing
     # pylint: disable=cyclic-import
     from nuqql_based.config import Config  # noqa
     from nuqql_based.callback import Callbacks  # noqa
     from nuqql_based.account import Account, AccountList  # noqa
+    from nuqql_based.host import Host  # noqa
+    from nuqql_based.monitor import LoopMonitor  # noqa
+    from nuqql_based.record import Recorder  # noqa
+
+ClientHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter],
+                         Awaitable[None]]
+
+# commands counted in the command statistics, others are counted as unknown
+COMMANDS = ("account", "bye", "quit", "help", "version", "stats", "profile")
+ACCOUNT_COMMANDS = ("list", "add", "delete", "buddies", "collect", "send",
+                    "status", "chat")
+
+# commands with bulk replies, they are sent after interactive replies
+BULK_COMMANDS = ("account buddies", "account collect")
+
+
+def get_command_name(msg: str) -> str:
+    """
+    Get name of the command in a message for the command statistics, e.g.,
+    "account send" for "account 0 send user@example.com hello"
+    """
+
+    parts = msg.split(" ", 3)
+    if parts[0] not in COMMANDS:
+        return "unknown"
+    if parts[0] != "account":
+        return parts[0]
+    if len(parts) >= 2 and parts[1] in ("list", "add"):
+        return f"account {parts[1]}"
+    if len(parts) >= 3 and parts[2] in ACCOUNT_COMMANDS:
+        return f"account {parts[2]}"
+    return "account unknown"
+
+
+async def cancel_task(task: asyncio.Task) -> None:
+    """
+    Cancel task and wait until it is done
+    """
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        # task was cancelled, maybe before it started
+        pass
+
+
+class CommandStats:
+    """
+    Statistics of commands received from clients
+    """
+
+    def __init__(self) -> None:
+        # number of calls, total and maximum duration per command
+        self.calls: Dict[str, int] = {}
+        self.total: Dict[str, float] = {}
+        self.max: Dict[str, float] = {}
+
+    def add(self, msg: str, duration: float) -> None:
+        """
+        Add duration of handling the command in message msg
+        """
+
+        name = get_command_name(msg)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.total[name] = self.total.get(name, 0.0) + duration
+        if duration > self.max.get(name, 0.0):
+            self.max[name] = duration
+
+    def get_lines(self) -> List[str]:
+        """
+        Get statistics as list of text lines
+        """
+
+        lines = []
+        for name, calls in self.calls.items():
+            avg = self.total[name] / calls
+            lines.append(f"command {name} calls {calls} avg {avg:.6f}s "
+                         f"max {self.max[name]:.6f}s")
+        return lines
 
 
 class Server:
@@ -30,30 +115,90 @@ class Server:
 
     def __init__(self, config: "Config", callbacks: "Callbacks",
                  account_list: "AccountList", queue: asyncio.Queue) -> None:
-        self.server: Optional[asyncio.AbstractServer] = None
+        self.servers: List[asyncio.AbstractServer] = []
         self.config = config
         self.callbacks = callbacks
         self.account_list = account_list
         self.queue = queue
         self.connected = False
 
-    async def _handle_incoming(self, writer: asyncio.StreamWriter) -> None:
+        # connection and command statistics
+        self.connections = 0
+        self.rejected = 0
+        self.bytes_in = 0
+        self.commands = CommandStats()
+        self.output = WriterStats()
+
+        # commands that are handled by tasks, e.g., for attributing stalls
+        # of the event loop to them
+        self.running: Dict["asyncio.Future", str] = {}
+
+        # host of the backend if multiple backends run in one process
+        self.host: Optional["Host"] = None
+
+        # recorder of the current client session if recording is enabled
+        self.recorder: Optional["Recorder"] = None
+
+        # on-demand profiler
+        self.profiler = Profiler(config)
+
+        # event loop monitor, not set if the backend is hosted
+        self.monitor: Optional["LoopMonitor"] = None
+
+    def get_priority(self, event: Event) -> int:
+        """
+        Get the priority of an event sent to the client: messages sent by the
+        user have the priority of replies to commands
+        """
+
+        if isinstance(event, (MessageEvent, ChatMsgEvent)):
+            acc = self.account_list.get().get(event.aid)
+            if acc and event.sender == acc.user:
+                return PRIORITY_HIGH
+        return event.priority
+
+    def _requeue(self, events: List[Event]) -> None:
+        """
+        Put events that were not sent to the client back at the front of the
+        event queue for the next client
+        """
+
+        if not events:
+            return
+        logging.info("requeueing %d unsent events", len(events))
+        queued = []
+        while not self.queue.empty():
+            queued.append(self.queue.get_nowait())
+            self.queue.task_done()
+        for event in events + queued:
+            self.queue.put_nowait(event)
+
+    async def _handle_incoming(self, client: ClientWriter) -> None:
         """
         Handle messages coming from the backend connections
         """
 
         try:
-            # read messages from message queue
-            while True:
-                msg = await self.queue.get()
-                writer.write(msg.encode())
-                await writer.drain()
+            # read messages from message queue until a slow client is dropped
+            while not client.closed:
+                event = await self.queue.get()
                 self.queue.task_done()
+                if client.closed:
+                    # client was dropped while waiting for the event
+                    self._requeue(client.get_unsent() + [event])
+                    return
+                data = event.serialize()
+                if self.recorder:
+                    self.recorder.event(event, data)
+                await client.send(data, self.get_priority(event), event)
         except asyncio.CancelledError:
             return
 
-    async def _handle_messages(self, reader: asyncio.StreamReader, writer:
-                               asyncio.StreamWriter) -> str:
+        # client was dropped, keep the events it did not get
+        self._requeue(client.get_unsent())
+
+    async def _handle_messages(self, reader: asyncio.StreamReader,
+                               client: ClientWriter) -> str:
         """
         Try to find complete messages in buffer and handle each
         """
@@ -63,6 +208,7 @@ class Server:
             data = await reader.readuntil(Message.EOM.encode())
         except asyncio.IncompleteReadError:
             return "bye"
+        self.bytes_in += len(data)
 
         # start message handling
         try:
@@ -70,13 +216,28 @@ class Server:
         except UnicodeDecodeError:
             # invalid message format, drop client
             return "bye"
-        cmd, reply = await self.handle_msg(msg)
+        if self.recorder:
+            self.recorder.command(msg)
+        start = time.perf_counter()
+        task = asyncio.current_task()
+        if task:
+            self.running[task] = get_command_name(msg)
+        try:
+            cmd, reply = await self.handle_msg(msg)
+        finally:
+            if task:
+                del self.running[task]
+        self.commands.add(msg, time.perf_counter() - start)
+        if self.recorder:
+            self.recorder.command_done()
 
         if cmd == "msg" and reply != "":
             # there is a message for the user, construct reply and send it
             # back to the user
-            writer.write(reply.encode())
-            await writer.drain()
+            if get_command_name(msg) in BULK_COMMANDS:
+                await client.send(reply, PRIORITY_BULK)
+            else:
+                await client.send(reply)
 
         # return message/command
         return cmd
@@ -89,16 +250,29 @@ class Server:
 
         # only accept one client at a time
         if self.connected:
+            self.rejected += 1
             writer.close()
             await writer.wait_closed()
             return
         self.connected = True
+        self.connections += 1
+        client = ClientWriter(self.config, writer, self.output)
+        client.setup()
+
+        # record the client session if enabled
+        record = self.config.get_record()
+        if record:
+            # pylint: disable=import-outside-toplevel
+            from nuqql_based.record import Recorder
+            self.recorder = Recorder(self.config.get_dir() / record)
+            self.recorder.start(self.config.get_name(),
+                                self.config.get_version(),
+                                self.account_list.get().values())
 
         # if present, send welcome message to client
         welcome = await self.callbacks.call(Callback.HELP_WELCOME, None, ())
         if welcome:
-            writer.write(welcome.encode())
-            await writer.drain()
+            await client.send(welcome)
 
         # send accounts to new client if "push accounts" is enabled
         if self.config.get_push_accounts():
@@ -108,54 +282,60 @@ class Server:
                 accounts = await self.callbacks.call(Callback.HELP_ACCOUNT_ADD,
                                                      None, ())
             if accounts:
-                writer.write(accounts.encode())
-                await writer.drain()
+                await client.send(accounts)
 
         # start sending incoming messages to client
-        inc_task = asyncio.create_task(self._handle_incoming(writer))
+        inc_task = asyncio.create_task(self._handle_incoming(client))
 
         while True:
 
             # handle each complete message
-            cmd = await self._handle_messages(reader, writer)
+            cmd = await self._handle_messages(reader, client)
 
             # handle special return codes
             if cmd in ("bye", "quit"):
                 # some error occured handling the messages or
                 # user said bye/quit, drop the client
-                inc_task.cancel()
-                await inc_task
+                await cancel_task(inc_task)
+                await client.close()
+                self._requeue(client.get_unsent())
                 writer.close()
                 await writer.wait_closed()
+                if self.recorder:
+                    self.recorder.stop()
+                    self.recorder = None
                 self.connected = False
                 if cmd == "quit":
-                    # quit the server
-                    assert self.server
-                    self.server.close()
-                    await self.server.wait_closed()
+                    # quit the server, stop listening on all endpoints
+                    for server in self.servers:
+                        server.close()
+                    for server in self.servers:
+                        await server.wait_closed()
                 return
 
-    async def _run_inet(self) -> None:
+    async def _start_inet(self, address: str, port: int,
+                          handler: Optional[ClientHandler] = None
+                          ) -> asyncio.AbstractServer:
         """
-        Run an AF_INET server
+        Start an AF_INET server, clients are handled by handler or, if it is
+        not set, as nuqql clients
         """
 
-        server = await asyncio.start_server(
-            self._handle_client, self.config.get_address(),
-            self.config.get_port())
-
-        async with server:
-            self.server = server
-            await server.serve_forever()
+        # with multiple shards, all shard processes listen on the same port
+        return await asyncio.start_server(
+            handler or self._handle_client, address, port,
+            reuse_port=self.config.get_shards() > 1)
 
-    async def _run_unix(self) -> None:
+    async def _start_unix(self, sockfile: str,
+                          handler: Optional[ClientHandler] = None
+                          ) -> asyncio.AbstractServer:
         """
-        Run an AF_UNIX server
+        Start an AF_UNIX server, clients are handled by handler or, if it is
+        not set, as nuqql clients
         """
 
         # make sure paths exist
         self.config.get_dir().mkdir(parents=True, exist_ok=True)
-        sockfile = str(self.config.get_dir() / self.config.get_sockfile())
         try:
             # unlink sockfile of previous execution of the server
             os.unlink(sockfile)
@@ -164,37 +344,139 @@ class Server:
             pass
 
         server = await asyncio.start_unix_server(
-             self._handle_client, sockfile, start_serving=False)
+             handler or self._handle_client, sockfile, start_serving=False)
+        os.chmod(sockfile, stat.S_IRUSR | stat.S_IWUSR)
+        return server
+
+    async def _start_fd(self, fd: int) -> asyncio.AbstractServer:
+        """
+        Start an AF_INET or AF_UNIX server on an inherited listening socket,
+        e.g., passed by a service manager with socket activation
+        """
+
+        # the socket is already bound by the parent process, so the address
+        # and socket file in the config are not used
+        sock = socket.socket(fileno=fd)
+        if sock.family == socket.AF_UNIX:
+            return await asyncio.start_unix_server(self._handle_client,
+                                                   sock=sock)
+        return await asyncio.start_server(self._handle_client, sock=sock)
+
+    async def _start_endpoint(self, endpoint: str,
+                              handler: Optional[ClientHandler] = None
+                              ) -> asyncio.AbstractServer:
+        """
+        Start a server on a listen endpoint from the config:
+            inet:<address>:<port>
+            unix:<sockfile>, sockfile is relative to the working directory
+        """
+
+        kind, _sep, addr = endpoint.partition(":")
+        if kind == "inet":
+            address, _sep, port = addr.rpartition(":")
+            return await self._start_inet(address.strip("[]"), int(port),
+                                          handler)
+        if kind == "unix" and addr:
+            return await self._start_unix(str(self.config.get_dir() / addr),
+                                          handler)
+        raise ValueError(f"invalid listen endpoint {endpoint}")
+
+    async def _start_metrics(self) -> Optional[asyncio.AbstractServer]:
+        """
+        Start the metrics server on the metrics endpoint in the config
+        """
+
+        # with multiple shards, only the first shard serves metrics
+        endpoint = self.config.get_metrics()
+        if not endpoint or self.account_list.shard > 0:
+            return None
+
+        # metrics are optional, load the module on demand
+        # pylint: disable=import-outside-toplevel
+        from nuqql_based.metrics import MetricsServer
+
+        metrics = MetricsServer(self)
+        try:
+            return await self._start_endpoint(endpoint, metrics.handle_client)
+        except (ValueError, OSError) as error:
+            error_msg = f"Error starting metrics server: {error}"
+            print(error_msg)
+            logging.error(error_msg)
+        return None
+
+    async def _start(self) -> List[asyncio.AbstractServer]:
+        """
+        Start servers on an inherited socket and all listen endpoints in the
+        config or, if there are none, on an AF_INET or AF_UNIX socket
+        """
 
-        async with server:
-            os.chmod(sockfile, stat.S_IRUSR | stat.S_IWUSR)
-            self.server = server
-            await server.serve_forever()
+        servers = []
+        fd = self.config.get_fd()
+        if fd is not None:
+            servers.append(await self._start_fd(fd))
+        for endpoint in self.config.get_listen():
+            try:
+                servers.append(await self._start_endpoint(endpoint))
+            except ValueError as error:
+                error_msg = f"Error starting server: {error}"
+                print(error_msg)
+                logging.error(error_msg)
+        if servers:
+            return servers
+
+        if self.config.get_af() == "inet":
+            servers.append(await self._start_inet(self.config.get_address(),
+                                                  self.config.get_port()))
+        elif self.config.get_af() == "unix":
+            sockfile = self.config.get_dir() / self.config.get_sockfile()
+            servers.append(await self._start_unix(str(sockfile)))
+        return servers
+
+    async def _run(self) -> None:
+        """
+        Run the servers, all servers share the account list and the client
+        connection: only one client can be connected at a time
+        """
+
+        self.servers = await self._start()
+        metrics = await self._start_metrics()
+        if metrics:
+            self.servers.append(metrics)
+        try:
+            await asyncio.gather(*[server.serve_forever()
+                                   for server in self.servers])
+        finally:
+            for server in self.servers:
+                server.close()
+            for server in self.servers:
+                await server.wait_closed()
 
     async def run(self) -> None:
         """
-        Run the server; can be AF_INET or AF_UNIX.
+        Run the server; can be AF_INET, AF_UNIX or both.
         """
 
         if self.config.get_daemonize():
-            # exit if we cannot load the daemon module
-            if not daemon:
+            # exit if we cannot load the daemon module, it is only loaded
+            # if the server is daemonized
+            try:
+                # pylint: disable=import-outside-toplevel
+                import daemon   # type: ignore
+            except ImportError:
                 print("Could not load python module \"daemon\", "
                       "no daemonize support.")
                 return
 
-            # daemonize the server
-            with daemon.DaemonContext():
-                if self.config.get_af() == "inet":
-                    await self._run_inet()
-                elif self.config.get_af() == "unix":
-                    await self._run_unix()
+            # daemonize the server, restart logging in the daemon process,
+            # keep an inherited listening socket open
+            fd = self.config.get_fd()
+            files_preserve = [fd] if fd is not None else []
+            with daemon.DaemonContext(files_preserve=files_preserve):
+                nuqql_based.logger.init(self.config)
+                await self._run()
         else:
             # run in foreground
-            if self.config.get_af() == "inet":
-                await self._run_inet()
-            elif self.config.get_af() == "unix":
-                await self._run_unix()
+            await self._run()
 
     async def handle_account_list(self) -> str:
         """
@@ -203,8 +485,12 @@ class Server:
 
         replies = []
         accounts = self.account_list.get()
+        worker_accounts = {}
+        if self.account_list.workers:
+            # get current account state from worker processes
+            worker_accounts = await self.account_list.workers.get_accounts()
         for acc in accounts.values():
-            reply = Message.account(acc)
+            reply = worker_accounts.get(acc.aid) or Message.account(acc)
             replies.append(reply)
 
         # inform caller that all accounts have been received
@@ -216,8 +502,7 @@ class Server:
                                                      None, ()))
 
         # log event
-        log_msg = f"account list: {replies}"
-        logging.info(log_msg)
+        logging.info("account list: %s", replies)
 
         # return a single string
         return "".join(replies)
@@ -286,16 +571,20 @@ class Server:
         if len(params) >= 1 and params[0].lower() == "online":
             online = True
 
-        # update buddy list
-        result = await self.callbacks.call(Callback.GET_BUDDIES, acc,
-                                           (online,))
+        # update buddy list, use the roster of the account if the backend
+        # does not have a callback for it
+        if self.callbacks.is_registered(Callback.GET_BUDDIES):
+            result = await self.callbacks.call(Callback.GET_BUDDIES, acc,
+                                               (online,))
+        else:
+            result = "".join([event.serialize()
+                              for event in acc.roster.get_events(online)])
 
         # add info message that all buddies have been received
         info = Message.info(f"got buddies for account {acc_id}.")
 
         # log event
-        log_msg = f"account {acc_id} buddies: {result}"
-        logging.info(log_msg)
+        logging.info("account %d buddies: %s", acc_id, result)
 
         # return replies as single string
         return result + info
@@ -312,21 +601,24 @@ class Server:
         """
 
         # collect all messages since <time>?
-        time = 0   # TODO: change it to time of last collect?
+        since = 0   # TODO: change it to time of last collect?
         if len(params) >= 1:
-            time = int(params[0])
+            since = int(params[0])
 
         # log event
-        log_msg = f"account {acc_id} collect {time}"
-        logging.info(log_msg)
+        logging.info("account %d collect %d", acc_id, since)
 
         # collect messages
         accounts = self.account_list.get()
         acc = accounts[acc_id]
         history = acc.get_history()
         # TODO: this expects a list. change to string? document list req?
-        history += await self.callbacks.call(Callback.COLLECT_MESSAGES, acc,
-                                             ())
+        result = await self.callbacks.call(Callback.COLLECT_MESSAGES, acc, ())
+        if isinstance(result, str):
+            # error message, e.g., if the callback timed out
+            history.append(result)
+        else:
+            history += result
 
         # append info message to notify caller that everything was collected
         history += [Message.info(f"collected messages for account {acc_id}.")]
@@ -402,10 +694,14 @@ class Server:
         if cmd == "part":
             return await self.callbacks.call(Callback.CHAT_PART, acc, (chat, ))
 
-        # get users in chat
+        # get users in chat, use the chat store of the account if the backend
+        # does not have a callback for it
         if cmd == "users":
-            return await self.callbacks.call(Callback.CHAT_USERS, acc,
-                                             (chat, ))
+            if self.callbacks.is_registered(Callback.CHAT_USERS):
+                return await self.callbacks.call(Callback.CHAT_USERS, acc,
+                                                 (chat, ))
+            return "".join([event.serialize()
+                            for event in acc.chats.get_user_events(chat)])
 
         return ""
 
@@ -449,9 +745,13 @@ class Server:
         accounts = self.account_list.get()
         acc = accounts[acc_id]
 
-        # list active chats
+        # list active chats, use the chat store of the account if the backend
+        # does not have a callback for it
         if params[0] == "list":
-            return await self.callbacks.call(Callback.CHAT_LIST, acc, ())
+            if self.callbacks.is_registered(Callback.CHAT_LIST):
+                return await self.callbacks.call(Callback.CHAT_LIST, acc, ())
+            return "".join([event.serialize()
+                            for event in acc.chats.get_list_events()])
 
         if len(params) == 2:
             cmd = params[0]
@@ -485,6 +785,11 @@ class Server:
             "chat": self._handle_account_chat,
         }
         if command in command_map:
+            if self.account_list.workers:
+                # relay command to the worker process of the account
+                msg = " ".join(["account", str(acc_id), command] + params)
+                return await self.account_list.workers.handle_msg(acc_id,
+                                                                  msg)
             return await command_map[command](acc_id, params)
 
         return Message.error("unknown command")
@@ -514,6 +819,9 @@ class Server:
             params = parts[3:]
             # valid account?
             if acc_id not in self.account_list.get().keys():
+                if not self.account_list.owns(acc_id):
+                    # the client is connected to another shard process
+                    return Message.error("account belongs to another shard")
                 return Message.error("invalid account")
         else:
             # invalid command, ignore
@@ -533,6 +841,78 @@ class Server:
             msg = f"version: {name} v{version}"
         return ("msg", Message.info(msg))
 
+    def get_stats(self, executor: bool = True) -> List[str]:
+        """
+        Get runtime statistics as list of text lines, the statistics of the
+        thread pool are only included if executor is set
+        """
+
+        lines = self.commands.get_lines()
+        lines += self.callbacks.stats.get_lines()
+        lines += self.callbacks.cache.get_lines()
+        lines += self.output.get_lines()
+        if executor:
+            lines += self.callbacks.executor.get_lines()
+        if self.monitor:
+            lines += self.monitor.get_lines()
+        return lines
+
+    async def get_all_stats(self, executor: bool = True) -> List[str]:
+        """
+        Get runtime statistics including statistics of worker processes as
+        list of text lines
+        """
+
+        lines = self.get_stats(executor)
+        if self.account_list.workers:
+            lines += await self.account_list.workers.get_stats()
+        return lines
+
+    async def handle_stats(self) -> str:
+        """
+        Handle the stats command received from client: list runtime
+        statistics, or statistics of all backends of the host
+        """
+
+        if self.host:
+            lines = await self.host.get_stats()
+        else:
+            lines = await self.get_all_stats()
+        replies = [Message.info(f"stats: {line}") for line in lines]
+        replies.append(Message.info("listed stats."))
+        return "".join(replies)
+
+    def handle_profile(self, params: List[str]) -> str:
+        """
+        Handle the profile command received from client
+
+        Expected format:
+            profile [seconds]
+            profile stop
+            profile tasks
+        """
+
+        if params and params[0] == "tasks":
+            path = self.profiler.dump_tasks()
+            return Message.info(f"dumped tasks to {path}.")
+
+        if params and params[0] == "stop":
+            stats_path = self.profiler.stop()
+            if stats_path is None:
+                return Message.error("profiling is not running")
+            return Message.info(f"wrote profiling stats to {stats_path}.")
+
+        if self.profiler.is_running():
+            return Message.error("profiling is already running")
+        duration = None
+        if params:
+            try:
+                duration = float(params[0])
+            except ValueError:
+                return Message.error("invalid profiling duration")
+        path = self.profiler.start(duration)
+        return Message.info(f"started profiling, stats file: {path}.")
+
     async def handle_msg(self, msg: str) -> Tuple[str, str]:
         """
         Handle messages received from client
@@ -548,6 +928,9 @@ class Server:
         # handle "bye" and "quit" commands
         if parts[0] in ("bye", "quit"):
             # call disconnect or quit callback in every account
+            if self.account_list.workers:
+                await self.account_list.workers.broadcast_msg(parts[0])
+                return (parts[0], "Goodbye.")
             for acc in self.account_list.get().values():
                 if parts[0] == "bye":
                     await self.callbacks.call(Callback.DISCONNECT, acc, ())
@@ -562,6 +945,12 @@ class Server:
         if parts[0] == "version":
             return await self._handle_version()
 
+        if parts[0] == "stats":
+            return ("msg", await self.handle_stats())
+
+        if parts[0] == "profile":
+            return ("msg", self.handle_profile(parts[1:]))
+
         # others
         # TODO: who?
         # ignore rest for now...
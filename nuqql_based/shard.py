@@ -0,0 +1,116 @@
+"""
+Nuqql-based shard processes
+
+In sharding mode, multiple processes listen on the same AF_INET port with
+SO_REUSEPORT and the kernel distributes incoming client connections across
+them. Every process handles a disjoint shard of the accounts: accounts with
+account ID i belong to the process with shard number i % number of shards.
+The shard processes share the accounts file, which is locked while it is
+accessed. A client only sees the accounts of the shard process it is
+connected to, accounts of other shards are neither listed nor reachable over
+its connection. The main process handles shard 0 and forks the other shard
+processes after the BASED_CONFIG callback. Shard processes quit when the main
+process closes its end of their pipe or exits.
+"""
+
+import asyncio
+import os
+
+from typing import TYPE_CHECKING, List
+
+import nuqql_based.logger
+
+from nuqql_based.account import AccountList
+from nuqql_based.server import Server
+from nuqql_based.worker import init_process, start_process
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    import multiprocessing.process  # noqa
+    from nuqql_based.based import Based  # noqa
+
+
+class ShardPool:
+    """
+    Shard processes of the main process
+    """
+
+    def __init__(self, based: "Based", num: int) -> None:
+        self.based = based
+        self.num = num
+        self.processes: List["multiprocessing.process.BaseProcess"] = []
+        self.pipes: List[int] = []
+
+    def start(self) -> None:
+        """
+        Start the shard processes, the main process handles shard 0
+        """
+
+        self.based.accounts.shard = 0
+        self.based.accounts.num_shards = self.num
+        for index in range(1, self.num):
+            read_fd, write_fd = os.pipe()
+            process = start_process(f"nuqql-based shard {index}", _run_shard,
+                                    (self.based, index, self.num, read_fd,
+                                     self.pipes + [write_fd]))
+            os.close(read_fd)
+            self.processes.append(process)
+            self.pipes.append(write_fd)
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop the shard processes, they quit when their pipe is closed
+        """
+
+        for write_fd in self.pipes:
+            os.close(write_fd)
+        self.pipes = []
+        for _ in range(int(timeout / 0.05)):
+            if not any(process.is_alive() for process in self.processes):
+                break
+            await asyncio.sleep(0.05)
+        for process in self.processes:
+            if process.is_alive():
+                process.kill()
+            process.join()
+
+
+def _run_shard(based: "Based", index: int, num: int, read_fd: int,
+               close_fds: List[int]) -> None:
+    """
+    Entry point of a shard process
+    """
+
+    # close the main process ends of the pipes, so the shard process notices
+    # when the main process closes its pipe
+    for close_fd in close_fds:
+        os.close(close_fd)
+
+    init_process(based.config, based.callbacks, f"-shard{index}")
+    try:
+        asyncio.run(_shard_main(based, index, num, read_fd))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        return
+    finally:
+        nuqql_based.logger.stop()
+
+
+async def _shard_main(based: "Based", index: int, num: int,
+                      read_fd: int) -> None:
+    """
+    Main function of a shard process
+    """
+
+    # queue, accounts and server of the main process belong to its event
+    # loop, create new ones for the shard of this process
+    based.queue = asyncio.Queue()
+    based.accounts = AccountList(based.config, based.callbacks, based.queue,
+                                 shard=index, num_shards=num)
+    based.server = Server(based.config, based.callbacks, based.accounts,
+                          based.queue)
+
+    # stop the server when the main process closes the pipe
+    main_task = asyncio.current_task()
+    assert main_task
+    asyncio.get_running_loop().add_reader(read_fd, main_task.cancel)
+    await based.run()
@@ -0,0 +1,454 @@
+"""
+Nuqql-based worker processes
+
+In worker mode, the accounts are sharded across worker processes by their
+account ID. Every worker process runs its own event loop with the backend
+callbacks of its accounts. The front process runs the server for the client,
+relays account commands to the workers and forwards the events of the workers
+to the client. Workers and front process communicate over unix socket pairs
+with length-prefixed frames.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import socket
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, \
+    Set, Tuple
+
+import nuqql_based.logger
+
+from nuqql_based.account import AccountList
+from nuqql_based.callback import Callback
+from nuqql_based.event import EventBatch
+from nuqql_based.executor import CallbackExecutor
+from nuqql_based.message import Message
+from nuqql_based.server import Server, cancel_task
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    from nuqql_based.account import Account  # noqa
+    from nuqql_based.callback import Callbacks  # noqa
+    from nuqql_based.config import Config  # noqa
+
+# frame header: length of frame payload
+HEADER_SIZE = 4
+
+
+class WorkerError(Exception):
+    """
+    Error of a worker process while handling a request
+    """
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Any:
+    """
+    Read a frame from reader and return its payload
+    """
+
+    header = await reader.readexactly(HEADER_SIZE)
+    data = await reader.readexactly(int.from_bytes(header, "big"))
+    return pickle.loads(data)
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: Any) -> None:
+    """
+    Write a frame with payload to writer
+    """
+
+    data = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+    writer.write(len(data).to_bytes(HEADER_SIZE, "big") + data)
+
+
+def start_process(name: str, target: Callable, args: Tuple) -> \
+        multiprocessing.process.BaseProcess:
+    """
+    Fork a child process that runs target with args. The child process
+    inherits the state of the current process, e.g., config and callbacks.
+    """
+
+    ctx = multiprocessing.get_context("fork")
+    process = ctx.Process(target=target, daemon=True, name=name, args=args)
+    process.start()
+    return process
+
+
+def init_process(config: "Config", callbacks: "Callbacks",
+                 suffix: str) -> None:
+    """
+    Initialize a forked child process: threads of the thread pool and the
+    logger do not exist in the child process, every child process writes its
+    own log file with suffix
+    """
+
+    callbacks.executor = CallbackExecutor(callbacks.executor.size)
+    nuqql_based.logger.init(config, suffix)
+
+
+class Worker:
+    """
+    Front process side of a worker process
+    """
+
+    def __init__(self, index: int, queue: asyncio.Queue) -> None:
+        self.index = index
+        self.queue = queue
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+
+    async def start(self, config: "Config", callbacks: "Callbacks",
+                    close_fds: List[int]) -> None:
+        """
+        Start the worker process, close_fds contains file descriptors of the
+        front process the worker process should close
+        """
+
+        front_sock, worker_sock = socket.socketpair()
+        self.process = start_process(f"nuqql-based worker {self.index}",
+                                     _run_worker,
+                                     (self.index, worker_sock,
+                                      close_fds + [front_sock.fileno()],
+                                      config, callbacks))
+        worker_sock.close()
+
+        self.reader, self.writer = await asyncio.open_connection(
+            sock=front_sock)
+        self._task = asyncio.create_task(self._read_frames())
+
+    async def _read_frames(self) -> None:
+        """
+        Read replies and events from the worker process
+        """
+
+        assert self.reader
+        error_msg = f"worker {self.index} stopped"
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                if frame[0] == "E":
+                    # events of the worker's accounts
+                    self.queue.put_nowait(EventBatch(frame[1]))
+                    continue
+
+                # reply to a request or error while handling it
+                future = self._requests.pop(frame[1], None)
+                if not future or future.done():
+                    continue
+                if frame[0] == "X":
+                    future.set_exception(WorkerError(frame[2]))
+                else:
+                    future.set_result(frame[2])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            error_msg = f"worker {self.index} disconnected"
+            logging.error(error_msg)
+        finally:
+            for future in self._requests.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(error_msg))
+            self._requests.clear()
+
+    async def request(self, *request: Any) -> Any:
+        """
+        Send request to the worker process and return its reply, raises
+        WorkerError if the worker process failed to handle the request
+        """
+
+        if self.writer is None or self._task is None or self._task.done():
+            raise ConnectionError(f"worker {self.index} not running")
+
+        req_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._requests[req_id] = future
+        write_frame(self.writer, (req_id, request))
+        await self.writer.drain()
+        return await future
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop the worker process, it quits when its connection is closed
+        """
+
+        if self.writer:
+            self.writer.close()
+        if self._task:
+            await cancel_task(self._task)
+
+        if not self.process:
+            return
+        for _ in range(int(timeout / 0.05)):
+            if not self.process.is_alive():
+                break
+            await asyncio.sleep(0.05)
+        else:
+            self.process.terminate()
+        self.process.join()
+
+
+class WorkerPool:
+    """
+    Worker processes of the front process
+    """
+
+    def __init__(self, config: "Config", callbacks: "Callbacks",
+                 queue: asyncio.Queue, num: int) -> None:
+        self.config = config
+        self.callbacks = callbacks
+        self.workers = [Worker(index, queue) for index in range(num)]
+
+    async def start(self) -> None:
+        """
+        Start all worker processes
+        """
+
+        # worker processes do not need an inherited listening socket
+        fd = self.config.get_fd()
+        close_fds: List[int] = [fd] if fd is not None else []
+        for worker in self.workers:
+            await worker.start(self.config, self.callbacks, close_fds)
+            assert worker.writer
+            close_fds.append(worker.writer.get_extra_info("socket").fileno())
+
+    async def stop(self) -> None:
+        """
+        Stop all worker processes
+        """
+
+        for worker in self.workers:
+            await worker.stop()
+
+    def get_worker(self, acc_id: int) -> Worker:
+        """
+        Get the worker of the account with the account ID
+        """
+
+        return self.workers[acc_id % len(self.workers)]
+
+    async def add_account(self, acc: "Account") -> None:
+        """
+        Add account to its worker
+        """
+
+        try:
+            await self.get_worker(acc.aid).request(
+                "add", acc.aid, acc.type, acc.user, acc.password)
+        except (ConnectionError, WorkerError) as error:
+            error_msg = f"Error adding account {acc.aid}: {error}"
+            logging.error(error_msg)
+
+    async def delete_account(self, acc_id: int) -> None:
+        """
+        Delete account from its worker
+        """
+
+        try:
+            await self.get_worker(acc_id).request("delete", acc_id)
+        except (ConnectionError, WorkerError) as error:
+            error_msg = f"Error deleting account {acc_id}: {error}"
+            logging.error(error_msg)
+
+    async def handle_msg(self, acc_id: int, msg: str) -> str:
+        """
+        Handle message of an account in its worker and return the reply
+        """
+
+        try:
+            _cmd, reply = await self.get_worker(acc_id).request("msg", msg)
+        except (ConnectionError, WorkerError) as error:
+            return Message.error(str(error))
+        return reply
+
+    async def broadcast_msg(self, msg: str) -> None:
+        """
+        Handle message in all workers, e.g., bye or quit
+        """
+
+        for worker in self.workers:
+            try:
+                await worker.request("msg", msg)
+            except (ConnectionError, WorkerError):
+                continue
+
+    async def get_accounts(self) -> Dict[int, str]:
+        """
+        Get the account messages of all accounts from the workers
+        """
+
+        accounts: Dict[int, str] = {}
+        for worker in self.workers:
+            try:
+                accounts.update(await worker.request("accounts"))
+            except (ConnectionError, WorkerError):
+                continue
+        return accounts
+
+    async def get_history(self) -> Dict[int, int]:
+        """
+        Get the history lengths of all accounts from the workers
+        """
+
+        history: Dict[int, int] = {}
+        for worker in self.workers:
+            try:
+                history.update(await worker.request("history"))
+            except (ConnectionError, WorkerError):
+                continue
+        return history
+
+    async def get_stats(self) -> List[str]:
+        """
+        Get the statistics of all workers as list of text lines
+        """
+
+        lines = []
+        for worker in self.workers:
+            try:
+                worker_lines = await worker.request("stats")
+            except (ConnectionError, WorkerError):
+                worker_lines = ["not running"]
+            lines += [f"worker {worker.index} {line}"
+                      for line in worker_lines]
+        return lines
+
+
+def _run_worker(index: int, sock: socket.socket, close_fds: List[int],
+                config: "Config", callbacks: "Callbacks") -> None:
+    """
+    Entry point of a worker process
+    """
+
+    # close the front process ends of the worker connections, so workers
+    # notice when the front process closes them
+    for close_fd in close_fds:
+        os.close(close_fd)
+
+    init_process(config, callbacks, f"-worker{index}")
+
+    try:
+        asyncio.run(_worker_main(index, sock, config, callbacks))
+    except KeyboardInterrupt:
+        return
+    finally:
+        nuqql_based.logger.stop()
+
+
+async def _send_frame(writer: asyncio.StreamWriter, lock: asyncio.Lock,
+                      payload: Any) -> None:
+    """
+    Send a frame with payload to the front process, the lock makes sure only
+    one task at a time waits until the frame is sent
+    """
+
+    write_frame(writer, payload)
+    async with lock:
+        await writer.drain()
+
+
+async def _forward_events(queue: asyncio.Queue, writer: asyncio.StreamWriter,
+                          lock: asyncio.Lock) -> None:
+    """
+    Forward all events of the worker's accounts to the front process, events
+    that are available at the same time are sent in a single frame
+    """
+
+    while True:
+        events = [await queue.get()]
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        await _send_frame(writer, lock, ("E", events))
+
+
+async def _handle_request(server: Server, request: Tuple) -> Any:
+    """
+    Handle a request from the front process in a worker process
+    """
+
+    # pylint: disable=too-many-return-statements
+    if request[0] == "msg":
+        return await server.handle_msg(request[1])
+
+    if request[0] == "add":
+        acc_id, acc_type, acc_user, acc_pass = request[1:]
+        return await server.account_list.add(acc_type, acc_user, acc_pass,
+                                             acc_id=acc_id)
+
+    if request[0] == "delete":
+        return await server.account_list.delete(request[1])
+
+    if request[0] == "accounts":
+        return {acc.aid: Message.account(acc)
+                for acc in server.account_list.get().values()}
+
+    if request[0] == "history":
+        return {acc.aid: acc.get_history_length()
+                for acc in server.account_list.get().values()}
+
+    if request[0] == "stats":
+        return server.get_stats()
+
+    return None
+
+
+async def _reply(server: Server, writer: asyncio.StreamWriter,
+                 lock: asyncio.Lock, req_id: int, request: Tuple) -> None:
+    """
+    Handle a request from the front process and send the reply, or an error
+    frame if handling the request failed, so the front process does not wait
+    for the reply forever
+    """
+
+    try:
+        result = await _handle_request(server, request)
+    except Exception as error:  # pylint: disable=broad-except
+        error_msg = f"Error handling request {request!r}: {error!r}"
+        logging.error(error_msg)
+        await _send_frame(writer, lock, ("X", req_id, repr(error)))
+        return
+    await _send_frame(writer, lock, ("R", req_id, result))
+
+
+async def _worker_main(index: int, sock: socket.socket, config: "Config",
+                       callbacks: "Callbacks") -> None:
+    """
+    Main function of a worker process
+    """
+
+    # accounts of this worker, the front process stores the accounts file
+    queue: asyncio.Queue = asyncio.Queue()
+    accounts = AccountList(config, callbacks, queue, persist=False)
+    server = Server(config, callbacks, accounts, queue)
+
+    reader, writer = await asyncio.open_connection(sock=sock)
+    lock = asyncio.Lock()
+    events_task = asyncio.create_task(_forward_events(queue, writer, lock))
+    log_msg = f"worker {index} started"
+    logging.info(log_msg)
+
+    # every request is handled in its own task, so a slow callback of one
+    # account does not delay the requests of the other accounts; the front
+    # process matches the replies to its requests by request ID
+    tasks: Set[asyncio.Task] = set()
+    try:
+        while True:
+            try:
+                req_id, request = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            task = asyncio.create_task(_reply(server, writer, lock, req_id,
+                                              request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        for task in tasks:
+            task.cancel()
+        events_task.cancel()
+        await callbacks.call(Callback.BASED_QUIT, None, ())
+        callbacks.executor.shutdown()
+        writer.close()
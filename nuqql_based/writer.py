@@ -0,0 +1,515 @@
+"""
+Nuqql-based client writer
+
+The client writer sends replies and events to the connected client. Data is
+put into one of three output lanes by its priority:
+
+    interactive: replies to commands, own messages and own account status
+    messages:    incoming messages and other events
+    bulk:        presence updates, buddy lists and message history
+
+A single sender task writes the lanes to the connection with deficit round
+robin: every round, each lane may send its quantum of bytes, so replies
+overtake a presence flood or a large history, but lower lanes still get
+their share of every round and do not starve. Large data is split into
+chunks of complete lines, so a reply can be sent in between.
+
+The writer also detects slow consumers: clients that take longer than the
+slow consumer timeout to read their data or that leave more than the slow
+consumer buffer size in the write buffer. Slow consumers are handled with a
+policy:
+
+    disconnect: drop the client, events that were not sent yet are put back
+                on the event queue for the next client
+    spill:      write events with their priorities to a spill file in the
+                working directory and send them from the file when the
+                client caught up, drop the client if the file exceeds its
+                maximum size
+    drop:       drop low priority events like presence updates until the
+                client caught up, drop the client if it is still too slow
+
+Replies to commands are never dropped or spilled. If the client is gone,
+the events that are still in the output lanes or the spill file are put back
+on the event queue, too.
+"""
+
+import asyncio
+import collections
+import logging
+import pickle
+import socket
+import tempfile
+
+from typing import IO, TYPE_CHECKING, Deque, List, Optional, Tuple
+
+from nuqql_based.event import PRIORITY_HIGH, PRIORITY_LOW, \
+    PRIORITY_NORMAL, Event, TextEvent
+
+if TYPE_CHECKING:   # imports for typing
+    # pylint: disable=cyclic-import
+    from nuqql_based.config import Config  # noqa
+
+# priority of bulk replies like the message history, they are sent in the
+# lane of low priority events but are never dropped
+PRIORITY_BULK = PRIORITY_LOW + 1
+
+# bytes each lane may send per round: interactive, messages, bulk
+QUANTUM = (16 * 1024, 4 * 1024, 1024)
+
+# bytes queued in a lane before adding more data waits for the sender
+LANE_LIMIT = 64 * 1024
+
+# maximum size of the chunks large data is split into
+CHUNK = 16 * 1024
+
+# time in seconds the client has to read the remaining data when it is
+# closed, if the slow consumer timeout is not set
+CLOSE_TIMEOUT = 5.0
+
+# spill file entry header: length of the pickled priority and event
+SPILL_HEADER = 4
+
+
+def split(data: bytes) -> List[bytes]:
+    """
+    Split data into chunks of complete lines that are not larger than
+    CHUNK, unless a single line is larger
+    """
+
+    if len(data) <= CHUNK:
+        return [data]
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = data.rfind(b"\n", start, start + CHUNK) + 1
+        if end <= start:
+            # line is larger than a chunk, send it as a whole
+            end = data.find(b"\n", start + CHUNK) + 1 or len(data)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+
+class WriterStats:
+    """
+    Statistics of the data sent to clients
+    """
+
+    def __init__(self) -> None:
+        self.bytes_out = 0
+        self.slow_consumers = 0
+        self.disconnected = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    def get_lines(self) -> List[str]:
+        """
+        Get statistics as list of text lines
+        """
+
+        if not self.slow_consumers:
+            return []
+        return [f"slow consumers {self.slow_consumers} disconnected "
+                f"{self.disconnected} dropped events {self.dropped} "
+                f"spilled events {self.spilled}"]
+
+
+# pylint: disable=too-many-instance-attributes
+class ClientWriter:
+    """
+    Writer of the data sent to a client connection
+    """
+
+    def __init__(self, config: "Config", writer: asyncio.StreamWriter,
+                 stats: WriterStats) -> None:
+        self.config = config
+        self.writer = writer
+        self.stats = stats
+        self.timeout = config.get_slow_consumer_timeout()
+        self.max_buffer = config.get_slow_consumer_buffer()
+        self.policy = config.get_slow_consumer_policy()
+        self.max_spill = config.get_slow_consumer_spill()
+
+        # is the client a slow consumer, was it disconnected?
+        self.slow = False
+        self.closed = False
+
+        # output lanes with data, its priority and its event if it is one,
+        # their queued bytes and deficits in the current round
+        self._lanes: List[Deque[Tuple[int, bytes, Optional[Event]]]] = [
+            collections.deque() for _ in QUANTUM]
+        self._sizes = [0 for _ in QUANTUM]
+        self._deficits = [0 for _ in QUANTUM]
+        self._lane = 0
+
+        # lane whose round was interrupted by interactive data
+        self._resume: Optional[int] = None
+
+        # sender task, wakes up if data is added, wakes up waiting writers if
+        # data is removed
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._closing = False
+
+        # spill file in spill mode
+        self._spill: Optional[IO[bytes]] = None
+        self._spill_pos = 0
+
+    def setup(self) -> None:
+        """
+        Set up socket options and write buffer limits of the connection and
+        start sending
+        """
+
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            try:
+                if sock.family in (socket.AF_INET, socket.AF_INET6):
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                    int(self.config.get_tcp_nodelay()))
+                if self.config.get_socket_rcvbuf():
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                    self.config.get_socket_rcvbuf())
+                if self.config.get_socket_sndbuf():
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                                    self.config.get_socket_sndbuf())
+            except OSError as error:
+                error_msg = f"Error setting socket options: {error}"
+                logging.error(error_msg)
+
+        high = self.config.get_write_buffer_high()
+        low = self.config.get_write_buffer_low()
+        if high or low:
+            self.writer.transport.set_write_buffer_limits(high or None,
+                                                          low or None)
+
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, data: bytes, priority: int,
+            event: Optional[Event] = None) -> int:
+        """
+        Add data to the output lane of its priority and return the lane,
+        the event of the data is put back on the event queue if it is not
+        sent
+        """
+
+        lane = min(priority, PRIORITY_LOW)
+        if lane == PRIORITY_HIGH and not self._lanes[lane]:
+            # interactive data starts its round right away, the interrupted
+            # round continues afterwards
+            if self._lane != lane:
+                self._resume = self._lane
+                self._lane = lane
+            self._deficits[lane] = QUANTUM[lane]
+        for chunk in split(data):
+            self._lanes[lane].append((priority, chunk, event))
+            self._sizes[lane] += len(chunk)
+        self._ready.set()
+        return lane
+
+    def get(self) -> Optional[bytes]:
+        """
+        Get the next data to send from the output lanes with deficit round
+        robin or None if all lanes are empty
+        """
+
+        while any(self._lanes):
+            lane = self._lane
+            queue = self._lanes[lane]
+            if queue and len(queue[0][1]) <= self._deficits[lane]:
+                _priority, data, event = queue.popleft()
+                if event and queue and queue[0][2] is event:
+                    self._split_event(queue, event)
+                self._sizes[lane] -= len(data)
+                self._deficits[lane] -= len(data)
+                if not queue:
+                    self._next_lane()
+                return data
+            self._next_lane()
+        return None
+
+    @staticmethod
+    def _split_event(queue: Deque[Tuple[int, bytes, Optional[Event]]],
+                     event: Event) -> None:
+        """
+        The first chunk of a large event was sent: its remaining chunks at
+        the front of the lane get a new event with the remaining text
+        """
+
+        chunks = []
+        for _priority, chunk, item_event in queue:
+            if item_event is not event:
+                break
+            chunks.append(chunk)
+        rest = TextEvent(b"".join(chunks).decode(), event.priority)
+        for i, chunk in enumerate(chunks):
+            queue[i] = (queue[i][0], chunk, rest)
+
+    def _next_lane(self) -> None:
+        """
+        End the round of the current lane and start the round of the next
+        lane or continue the interrupted round
+        """
+
+        # empty lanes do not keep a deficit
+        lane = self._lane
+        if not self._lanes[lane]:
+            self._deficits[lane] = 0
+        if self._resume is not None:
+            self._lane = self._resume
+            self._resume = None
+            return
+        self._lane = (lane + 1) % len(self._lanes)
+        if self._lanes[self._lane]:
+            self._deficits[self._lane] += QUANTUM[self._lane]
+
+    def _refill(self) -> None:
+        """
+        In spill mode, move spilled events back to the lanes of their
+        priorities once the event lanes are empty and leave spill mode when
+        the file is empty
+        """
+
+        if not self._spill or self._lanes[PRIORITY_NORMAL] or \
+                self._lanes[PRIORITY_LOW]:
+            return
+        entries = self._read_spill(CHUNK)
+        if entries:
+            for priority, event in entries:
+                self.put(event.serialize().encode(), priority, event)
+            return
+        self._close_spill()
+        self.slow = False
+        logging.info("slow consumer caught up")
+
+    def _write(self, data: bytes) -> None:
+        """
+        Write data to the transport and count the sent bytes
+        """
+
+        self.stats.bytes_out += len(data)
+        self.writer.write(data)
+
+    async def _drain(self) -> bool:
+        """
+        Wait until the client read its data, return False if it is a slow
+        consumer
+        """
+
+        if self.max_buffer and \
+                self.writer.transport.get_write_buffer_size() > \
+                self.max_buffer:
+            return False
+        if not self.timeout or self._spill:
+            # in spill mode, events are not queued while waiting
+            await self.writer.drain()
+            return True
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _run(self) -> None:
+        """
+        Sender task: write data from the output lanes to the connection
+        """
+
+        try:
+            while not self.closed:
+                self._refill()
+                data = self.get()
+                if data is None:
+                    if self._closing:
+                        return
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                self._space.set()
+                self._write(data)
+                if not await self._drain():
+                    self._handle_slow()
+                    if self._spill:
+                        # wait for the client, events are spilled meanwhile
+                        await self.writer.drain()
+                elif not self._spill:
+                    self.slow = False
+        except ConnectionError:
+            # client is gone, remaining events are put back on the queue
+            pass
+        except OSError as error:
+            error_msg = f"Error sending data to client: {error}"
+            logging.error(error_msg)
+        finally:
+            # stop sending and wake up waiting writers, also if sending
+            # failed with an unexpected error, drop the client if it is not
+            # closed anyway
+            if not self._closing:
+                self.writer.transport.abort()
+            self.closed = True
+            self._space.set()
+
+    def _drop(self) -> None:
+        """
+        Drop the queued low priority events
+        """
+
+        kept: Deque[Tuple[int, bytes, Optional[Event]]] = \
+            collections.deque()
+        for item in self._lanes[PRIORITY_LOW]:
+            if item[0] == PRIORITY_LOW:
+                self._sizes[PRIORITY_LOW] -= len(item[1])
+                self.stats.dropped += 1
+            else:
+                kept.append(item)
+        self._lanes[PRIORITY_LOW] = kept
+        self._space.set()
+
+    def _disconnect(self) -> None:
+        """
+        Drop the slow consumer
+        """
+
+        logging.warning("disconnecting slow consumer")
+        self.stats.disconnected += 1
+        self.closed = True
+        self.writer.transport.abort()
+
+    def _start_spill(self) -> None:
+        """
+        Switch to spill mode: write events to the spill file until the
+        client caught up
+        """
+
+        self.config.get_dir().mkdir(parents=True, exist_ok=True)
+        # pylint: disable=consider-using-with
+        self._spill = tempfile.TemporaryFile(prefix="spill-",
+                                             dir=self.config.get_dir())
+        self._spill_pos = 0
+
+    def _write_spill(self, priority: int, event: Event) -> None:
+        """
+        Append event with its priority to the spill file
+        """
+
+        assert self._spill
+        data = pickle.dumps((priority, event), pickle.HIGHEST_PROTOCOL)
+        self._spill.seek(0, 2)
+        self._spill.write(len(data).to_bytes(SPILL_HEADER, "big") + data)
+
+    def _read_spill(self, size: Optional[int] = None) -> \
+            List[Tuple[int, Event]]:
+        """
+        Read the next spilled events with their priorities from the spill
+        file, stop after size bytes if size is set
+        """
+
+        assert self._spill
+        self._spill.seek(self._spill_pos)
+        start = self._spill_pos
+        entries = []
+        while size is None or self._spill_pos - start < size:
+            header = self._spill.read(SPILL_HEADER)
+            if len(header) < SPILL_HEADER:
+                break
+            data = self._spill.read(int.from_bytes(header, "big"))
+            self._spill_pos += SPILL_HEADER + len(data)
+            entries.append(pickle.loads(data))
+        return entries
+
+    def _close_spill(self) -> None:
+        """
+        Close and remove the spill file
+        """
+
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+    def _handle_slow(self) -> None:
+        """
+        Handle a slow consumer according to the policy
+        """
+
+        if self.slow:
+            # already handled as slow consumer and still too slow
+            self._disconnect()
+            return
+        self.stats.slow_consumers += 1
+        if self.policy == "disconnect":
+            self._disconnect()
+            return
+        logging.warning("slow consumer detected, policy %s", self.policy)
+        self.slow = True
+        if self.policy == "spill":
+            self._start_spill()
+        else:
+            self._drop()
+
+    async def send(self, data: str, priority: int = PRIORITY_HIGH,
+                   event: Optional[Event] = None) -> None:
+        """
+        Send data with priority to the client, wait if its output lane is
+        full. If data is the text of an event, the event is put back on the
+        event queue if it is not sent.
+        """
+
+        if self.closed:
+            return
+        if self.slow and priority in (PRIORITY_NORMAL, PRIORITY_LOW):
+            if self._spill:
+                self._write_spill(priority, event or TextEvent(data, priority))
+                self.stats.spilled += 1
+                if self.max_spill and \
+                        self._spill.tell() - self._spill_pos > self.max_spill:
+                    # client does not catch up, the spilled events are put
+                    # back on the queue
+                    self._disconnect()
+                return
+            if priority == PRIORITY_LOW:
+                self.stats.dropped += 1
+                return
+
+        lane = self.put(data.encode(), priority, event)
+        while self._sizes[lane] > LANE_LIMIT and not self.closed:
+            self._space.clear()
+            await self._space.wait()
+
+    def get_unsent(self) -> List[Event]:
+        """
+        Remove the events that were not sent to the client from the output
+        lanes and the spill file and return them
+        """
+
+        events: List[Event] = []
+        for lane, queue in enumerate(self._lanes):
+            # the chunks of an event are next to each other in its lane
+            for _priority, _data, event in queue:
+                if event and (not events or events[-1] is not event):
+                    events.append(event)
+            queue.clear()
+            self._sizes[lane] = 0
+        if self._spill:
+            events += [event for _priority, event in self._read_spill()]
+            self._close_spill()
+        return events
+
+    async def close(self) -> None:
+        """
+        Send the remaining data and stop sending data to the client. The
+        client has the slow consumer timeout to read the data, events that
+        were not sent can be retrieved with get_unsent() afterwards.
+        """
+
+        self._closing = True
+        self._ready.set()
+        if self._task:
+            done, _pending = await asyncio.wait(
+                [self._task], timeout=self.timeout or CLOSE_TIMEOUT)
+            if not done:
+                logging.warning("client did not read its remaining data")
+                self._task.cancel()
+                self.writer.transport.abort()
+            self._task = None
+        self.closed = True
@@ -0,0 +1,134 @@
+"""
+Account testing code
+"""
+
+import asyncio
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from nuqql_based.account import Account, AccountList
+from nuqql_based.callback import Callbacks
+from nuqql_based.config import Config
+from nuqql_based.event import EventBatch, MessageEvent, StatusEvent
+from nuqql_based.message import Message
+
+
+class AccountTest(unittest.TestCase):
+    """
+    Test accounts
+    """
+
+    def setUp(self) -> None:
+        # the queue is bound to the current event loop in python < 3.10
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.acc = Account(Config("test", "0"), Callbacks(), self.queue,
+                           aid=1)
+
+    def tearDown(self) -> None:
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_receive_msg(self) -> None:
+        """
+        Test receiving single events and formatted messages
+        """
+
+        event = MessageEvent(1, "user", "1234", "buddy", "test")
+        self.acc.receive_msg(event)
+        self.acc.receive_msg(Message.status(self.acc, "away"))
+        self.assertEqual(self.queue.qsize(), 2)
+        self.assertIs(self.queue.get_nowait(), event)
+        self.assertEqual(self.queue.get_nowait().serialize(),
+                         "status: account 1 status: away\r\n")
+        self.assertEqual(self.acc.get_history(), [event.serialize()])
+
+    def test_receive_msgs(self) -> None:
+        """
+        Test receiving a batch of events and formatted messages
+        """
+
+        events = [MessageEvent(1, "user", str(i), "buddy", f"test {i}")
+                  for i in range(100)]
+        msg = Message.message(self.acc, "1234", "buddy", "user", "text")
+        self.acc.receive_msgs(events + [StatusEvent(1, "away"), msg])
+        self.acc.receive_msgs([])
+
+        # all events are put on the queue as single item
+        self.assertEqual(self.queue.qsize(), 1)
+        batch = self.queue.get_nowait()
+        self.assertIsInstance(batch, EventBatch)
+        self.assertEqual(len(batch.events), 102)
+        self.assertEqual(batch.serialize(),
+                         "".join([event.serialize() for event in events]) +
+                         "status: account 1 status: away\r\n" + msg)
+
+        # only messages are added to the history
+        self.assertEqual(self.acc.get_history(),
+                         [event.serialize() for event in events] + [msg])
+
+    def test_history_size(self) -> None:
+        """
+        Test limiting the number of messages in the history
+        """
+
+        config = Config("test", "0")
+        config.get_from_args(["--history-size", "10"])
+        acc = Account(config, Callbacks(), self.queue, aid=1)
+        events = [MessageEvent(1, "user", str(i), "buddy", f"test {i}")
+                  for i in range(25)]
+        acc.receive_msgs(events[:20])
+        for event in events[20:]:
+            acc.receive_msg(event)
+
+        # only the newest messages are kept
+        self.assertEqual(acc.get_history(),
+                         [event.serialize() for event in events[15:]])
+
+
+class AccountListTest(unittest.TestCase):
+    """
+    Test account lists
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp()
+        self.config = Config("test", "0")
+        self.config._dir = pathlib.Path(  # pylint: disable=protected-access
+            self.test_dir)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def test_shards(self) -> None:
+        """
+        Test adding the same account in different shards
+        """
+
+        async def run() -> None:
+            queue: asyncio.Queue = asyncio.Queue()
+            shards = [AccountList(self.config, Callbacks(), queue,
+                                  shard=shard, num_shards=2)
+                      for shard in range(2)]
+            self.assertEqual(await shards[0].add("dummy", "user", "pw"),
+                             "info: added account 0.\r\n")
+            self.assertEqual(await shards[1].add("dummy", "user", "pw"),
+                             "info: account already exists.\r\n")
+            self.assertEqual(await shards[1].add("dummy", "other", "pw"),
+                             "info: added account 1.\r\n")
+            self.assertEqual(await shards[0].add("dummy", "other", "pw"),
+                             "info: account already exists.\r\n")
+
+            # accounts of the own shard are loaded from the accounts file
+            other = AccountList(self.config, Callbacks(), queue, shard=0,
+                                num_shards=2)
+            self.assertEqual(list(await other.load()), [0])
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Socket activation testing code
+"""
+
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from pathlib import Path
+
+from nuqql_based.main import VERSION
+
+# default socket timeout
+DEFAULT_TIMEOUT = 10
+
+
+class ActivationTest(unittest.TestCase):
+    """
+    Tests for running the backend on an inherited listening socket
+    """
+
+    def setUp(self) -> None:
+        self.path = Path(__file__).resolve().parents[1]
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def check_version(self, sock: socket.socket) -> None:
+        """
+        Check version reply of the backend and quit it
+        """
+
+        sock.settimeout(DEFAULT_TIMEOUT)
+        sock.sendall(b"version\r\n")
+        reply = sock.recv(1024).decode()
+        self.assertEqual(reply, f"info: version: based v{VERSION}\r\n")
+        sock.sendall(b"quit\r\n")
+
+    def test_fd(self) -> None:
+        """
+        Test listening socket passed with the --fd argument
+        """
+
+        # the client can connect before the backend is started
+        listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listen_sock.bind(("localhost", 0))
+        listen_sock.listen()
+        sock = socket.create_connection(listen_sock.getsockname())
+
+        fd = listen_sock.fileno()
+        proc = subprocess.Popen([sys.executable, f"{self.path}/based.py",
+                                 "--dir", self.test_dir, "--fd", str(fd)],
+                                pass_fds=(fd, ),
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+        listen_sock.close()
+        try:
+            self.check_version(sock)
+            self.assertEqual(proc.wait(DEFAULT_TIMEOUT), 0)
+        finally:
+            sock.close()
+            proc.kill()
+            proc.wait()
+
+    def test_launcher(self) -> None:
+        """
+        Test socket activation with LISTEN_FDS using the launcher script,
+        the backend is started on the first client connection
+        """
+
+        sockfile = f"{self.test_dir}/launcher.sock"
+        proc = subprocess.Popen([sys.executable, f"{self.path}/launcher.py",
+                                 "--af", "unix", "--sockfile", sockfile,
+                                 "--lazy", "--", sys.executable,
+                                 f"{self.path}/based.py", "--dir",
+                                 self.test_dir],
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            for _ in range(DEFAULT_TIMEOUT * 100):
+                try:
+                    sock.connect(sockfile)
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            self.check_version(sock)
+            self.assertEqual(proc.wait(DEFAULT_TIMEOUT), 0)
+        finally:
+            sock.close()
+            proc.kill()
+            proc.wait()
+
+    def test_restart(self) -> None:
+        """
+        Test restarting a crashing backend with a growing delay until the
+        restart limit is reached
+        """
+
+        runs = Path(self.test_dir) / "runs"
+        crash = f"open({str(runs)!r}, 'a').write('x'); raise SystemExit(3)"
+        start = time.monotonic()
+        proc = subprocess.run([sys.executable, f"{self.path}/launcher.py",
+                               "--af", "unix", "--sockfile",
+                               f"{self.test_dir}/launcher.sock", "--restart",
+                               "--restart-delay", "0.2", "--restart-limit",
+                               "2", "--", sys.executable, "-c", crash],
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL,
+                              timeout=DEFAULT_TIMEOUT, check=False)
+        self.assertEqual(proc.returncode, 3)
+        self.assertEqual(runs.read_text(), "xxx")
+        self.assertGreaterEqual(time.monotonic() - start, 0.2 + 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
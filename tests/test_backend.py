@@ -3,6 +3,7 @@ Backend testing code
 """
 
 import subprocess
+import sys
 import unittest
 import tempfile
 import shutil
@@ -10,7 +11,7 @@ import socket
 import time
 
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, List, Optional, Union
 
 from nuqql_based.main import VERSION
 from nuqql_based.message import Message
@@ -34,12 +35,13 @@ class BackendTest(unittest.TestCase):
         # create temporary directory
         self.test_dir = tempfile.mkdtemp()
 
-        # start backend as subprocess
+        # start backend as subprocess, in a shell if the command is a string
         self.path = Path(__file__).resolve().parents[1]
-        self.backend_cmd = ""
+        self.backend_cmd: Union[str, List[str]] = ""
         self._set_backend_cmd()
         self.proc: Optional[subprocess.Popen] = None
-        self.proc = subprocess.Popen(self.backend_cmd, shell=True,
+        self.proc = subprocess.Popen(self.backend_cmd,
+                                     shell=isinstance(self.backend_cmd, str),
                                      stdout=subprocess.DEVNULL,
                                      stderr=subprocess.DEVNULL)
 
@@ -387,6 +389,54 @@ class BackendInetTest(BackendTest):
         reply = self.recv_msg()
         self.assertEqual(reply, "status: account 0 status: away")
 
+    def test_stats(self) -> None:
+        """
+        Test the stats command
+        """
+
+        # add an account and call a callback
+        self.send_cmd("account add test test@example.com testpw")
+        reply = self.recv_msg()
+        self.assertEqual(reply, "info: added account 0.")
+        self.send_cmd("account 0 status get")
+        reply = self.recv_msg()
+        self.assertEqual(reply, "status: account 0 status: online")
+
+        # get stats, should contain get status callback
+        self.send_cmd("stats")
+        replies = []
+        reply = self.recv_msg()
+        while reply != "info: listed stats.":
+            self.assertTrue(reply.startswith("info: stats: "))
+            replies.append(reply)
+            reply = self.recv_msg()
+        self.assertTrue(any("callback GET_STATUS calls 1 " in reply
+                            for reply in replies))
+
+
+class BackendInetWorkersTest(BackendInetTest):
+    """
+    Test the backend with an AF_INET socket and worker processes
+    """
+
+    def _set_backend_cmd(self) -> None:
+        """
+        Set the backend command, without a shell, so terminating the
+        process terminates the backend and its worker processes
+        """
+
+        port = 34000 + self.test_run
+        self.backend_cmd = [sys.executable, f"{self.path}/based.py", "--dir",
+                            self.test_dir, "--af", "inet", "--port",
+                            str(port), "--workers", "2"]
+
+    def _set_server_addr(self) -> None:
+        """
+        Set the server address
+        """
+
+        self.server_addr = ("localhost", 34000 + self.test_run)
+
 
 class BackendInetPushAccountsTest(BackendTest):
     """
@@ -0,0 +1,306 @@
+"""
+Callback testing code
+"""
+
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from typing import Any, List, Optional, Tuple
+
+from nuqql_based.account import Account
+from nuqql_based.callback import Callback, Callbacks
+from nuqql_based.config import Config
+from nuqql_based.event import InfoEvent
+from nuqql_based.main import create_based
+from nuqql_based.memory import open_connection
+
+
+async def _sleep(_acc: Optional[Account], _cmd: Callback,
+                 params: Tuple) -> str:
+    """
+    Callback that sleeps for params[0] seconds
+    """
+
+    await asyncio.sleep(params[0])
+    return "done"
+
+
+async def _wait(_acc: Optional[Account], _cmd: Callback,
+                _params: Tuple) -> str:
+    """
+    Callback that times out waiting for something else
+    """
+
+    await asyncio.wait_for(asyncio.sleep(10), 0.01)
+    return "done"
+
+
+class CallbacksTest(unittest.TestCase):
+    """
+    Test callbacks
+    """
+
+    def test_timeout(self) -> None:
+        """
+        Test callback timeouts and timing
+        """
+
+        callbacks = Callbacks()
+        callbacks.add(Callback.GET_BUDDIES, _sleep, timeout=0.05)
+        callbacks.add(Callback.CHAT_LIST, _sleep)
+        callbacks.add(Callback.BASED_QUIT, _sleep)
+        callbacks.add(Callback.CHAT_USERS, _wait, timeout=5)
+        callbacks.set_default_timeout(0.05)
+
+        async def run() -> None:
+            # callback with its own timeout
+            reply = await callbacks.call(Callback.GET_BUDDIES, None, (0, ))
+            self.assertEqual(reply, "done")
+            reply = await callbacks.call(Callback.GET_BUDDIES, None, (10, ))
+            self.assertEqual(reply,
+                             "error: callback GET_BUDDIES timed out\r\n")
+
+            # callback with default timeout
+            reply = await callbacks.call(Callback.CHAT_LIST, None, (10, ))
+            self.assertEqual(reply, "error: callback CHAT_LIST timed out\r\n")
+
+            # based events ignore the default timeout
+            reply = await callbacks.call(Callback.BASED_QUIT, None, (0.1, ))
+            self.assertEqual(reply, "done")
+
+            # timeout errors of the callback are not callback timeouts
+            with self.assertRaises(asyncio.TimeoutError):
+                await callbacks.call(Callback.CHAT_USERS, None, ())
+            self.assertFalse(callbacks.running)
+
+        asyncio.run(run())
+
+        # check timing statistics
+        stats = callbacks.stats
+        self.assertEqual(stats.calls[Callback.GET_BUDDIES], 2)
+        self.assertEqual(stats.timeouts[Callback.GET_BUDDIES], 1)
+        self.assertEqual(stats.timeouts[Callback.CHAT_LIST], 1)
+        self.assertNotIn(Callback.CHAT_USERS, stats.timeouts)
+        slowest = stats.slowest(1)[0]
+        self.assertEqual(slowest.name, Callback.BASED_QUIT)
+        self.assertEqual(slowest.params, (0.1, ))
+        self.assertGreaterEqual(slowest.duration, 0.1)
+
+    def test_cache(self) -> None:
+        """
+        Test caching of callback results
+        """
+
+        calls = []
+
+        async def get_buddies(acc: Optional[Account], _cmd: Callback,
+                              params: Tuple) -> str:
+            calls.append((acc, params))
+            return f"buddies {len(calls)}"
+
+        callbacks = Callbacks()
+        callbacks.add(Callback.GET_BUDDIES, get_buddies)
+        with self.assertRaises(ValueError):
+            callbacks.cache.enable(Callback.SEND_MESSAGE, 10)
+        callbacks.cache.enable(Callback.GET_BUDDIES, 10)
+        acc0 = Account(None, callbacks, None, aid=0)   # type: ignore
+        acc1 = Account(None, callbacks, None, aid=1)   # type: ignore
+
+        async def run() -> None:
+            call = callbacks.call
+            # cached per account and parameters
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc0, (False, )),
+                             "buddies 1")
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc0, (False, )),
+                             "buddies 1")
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc0, (True, )),
+                             "buddies 2")
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc1, (False, )),
+                             "buddies 3")
+
+            # invalidate entries of an account
+            acc0.invalidate_cache(Callback.GET_BUDDIES)
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc0, (False, )),
+                             "buddies 4")
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc1, (False, )),
+                             "buddies 3")
+
+            # deleting an account invalidates its entries
+            await call(Callback.DEL_ACCOUNT, acc1, ())
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc1, (False, )),
+                             "buddies 5")
+
+            # size limit, new entry removes all other entries
+            callbacks.cache.size = 1
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc0, ("x", )),
+                             "buddies 6")
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc0, (False, )),
+                             "buddies 7")
+
+            # ttl
+            callbacks.cache.enable(Callback.GET_BUDDIES, 0)
+            await call(Callback.GET_BUDDIES, acc1, (False, ))
+            self.assertEqual(await call(Callback.GET_BUDDIES, acc1, (False, )),
+                             "buddies 9")
+
+        asyncio.run(run())
+        self.assertEqual(len(calls), 9)
+
+    def test_cache_receive(self) -> None:
+        """
+        Test caching a callback that replies with receive_msg()
+        """
+
+        test_dir = tempfile.mkdtemp()
+
+        async def run() -> None:
+            based = create_based()
+            await based.setup(["--dir", test_dir])
+            based.callbacks.cache.enable(Callback.GET_STATUS, 10)
+            await based.accounts.add("dummy", "user@example.com", "pw")
+            reader, writer = await open_connection(based.server)
+            for _ in range(2):
+                writer.write(b"account 0 status get\r\n")
+                reply = await asyncio.wait_for(reader.readline(), 10)
+                self.assertEqual(reply, b"status: account 0 status: "
+                                 b"online\r\n")
+            writer.write(b"bye\r\n")
+            await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            await writer.wait_closed()
+            await based.shutdown()
+
+        try:
+            asyncio.run(run())
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_collect_timeout(self) -> None:
+        """
+        Test collecting messages with a callback that times out
+        """
+
+        test_dir = tempfile.mkdtemp()
+
+        async def collect(_acc: Optional[Account], _cmd: Callback,
+                          _params: Tuple) -> List[str]:
+            await asyncio.sleep(10)
+            return []
+
+        async def run() -> None:
+            based = create_based()
+            await based.setup(["--dir", test_dir])
+            based.callbacks.add(Callback.COLLECT_MESSAGES, collect,
+                                timeout=0.05)
+            await based.accounts.add("dummy", "user@example.com", "pw")
+            reader, writer = await open_connection(based.server)
+            writer.write(b"account 0 collect\r\nbye\r\n")
+            reply = await asyncio.wait_for(reader.read(), 10)
+            self.assertEqual(reply.decode().splitlines(),
+                             ["error: callback COLLECT_MESSAGES timed out",
+                              "info: collected messages for account 0."])
+            writer.close()
+            await writer.wait_closed()
+            await based.shutdown()
+
+        try:
+            asyncio.run(run())
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_sync(self) -> None:
+        """
+        Test running synchronous callbacks in the thread pool
+        """
+
+        def blocking(_acc: Optional[Account], _cmd: Callback,
+                     params: Tuple) -> str:
+            time.sleep(params[0])
+            return threading.current_thread().name
+
+        callbacks = Callbacks()
+        callbacks.executor.set_size(2)
+        callbacks.add(Callback.GET_BUDDIES, blocking)
+        callbacks.add(Callback.CHAT_LIST, blocking, timeout=0.05)
+
+        async def run() -> None:
+            # callbacks run in parallel without blocking the event loop
+            start = time.perf_counter()
+            replies = await asyncio.gather(
+                callbacks.call(Callback.GET_BUDDIES, None, (0.2, )),
+                callbacks.call(Callback.GET_BUDDIES, None, (0.2, )),
+                asyncio.sleep(0.1))
+            self.assertLess(time.perf_counter() - start, 0.35)
+            self.assertTrue(replies[0].startswith("nuqql-based"))
+            self.assertNotEqual(replies[0], replies[1])
+
+            # callbacks have to wait for a free thread
+            callbacks.executor.set_size(1)
+            await asyncio.gather(
+                callbacks.call(Callback.GET_BUDDIES, None, (0.1, )),
+                callbacks.call(Callback.GET_BUDDIES, None, (0.1, )))
+            self.assertGreaterEqual(callbacks.executor.wait_max, 0.05)
+
+            # timeouts
+            reply = await callbacks.call(Callback.CHAT_LIST, None, (0.2, ))
+            self.assertEqual(reply, "error: callback CHAT_LIST timed out\r\n")
+
+        asyncio.run(run())
+        callbacks.executor.shutdown()
+
+        # check metrics after the timed out callback finished
+        time.sleep(0.3)
+        executor = callbacks.executor
+        self.assertEqual(executor.completed, 5)
+        self.assertEqual(executor.active, 0)
+        self.assertEqual(executor.queued, 0)
+
+    def test_sync_receive(self) -> None:
+        """
+        Test receiving messages in synchronous callbacks
+        """
+
+        threads = []
+
+        class Queue(asyncio.Queue):
+            """
+            Queue that keeps the threads items are put on it in
+            """
+
+            def put_nowait(self, item: Any) -> None:
+                threads.append(threading.current_thread())
+                super().put_nowait(item)
+
+        def get_status(acc: Optional[Account], _cmd: Callback,
+                       _params: Tuple) -> str:
+            assert acc
+            acc.receive_msg(InfoEvent("first"))
+            acc.receive_msgs([InfoEvent("second")])
+            acc.roster.update("buddy@example.com", status="online")
+            return ""
+
+        callbacks = Callbacks()
+        callbacks.add(Callback.GET_STATUS, get_status)
+
+        async def run() -> None:
+            queue = Queue()
+            acc = Account(Config("test", "0.1"), callbacks, queue)
+
+            # the messages are put on the queue in the event loop thread,
+            # before the callback returns
+            await callbacks.call(Callback.GET_STATUS, acc, ())
+            self.assertEqual(queue.get_nowait(), InfoEvent("first"))
+            self.assertEqual(queue.get_nowait().events, [InfoEvent("second")])
+            self.assertEqual(threads, [threading.main_thread()] * 2)
+            self.assertEqual(len(acc.roster), 1)
+
+        asyncio.run(run())
+        callbacks.executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
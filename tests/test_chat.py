@@ -0,0 +1,92 @@
+"""
+Chat store testing code
+"""
+
+import asyncio
+import unittest
+
+from nuqql_based.account import Account
+from nuqql_based.callback import Callbacks
+from nuqql_based.config import Config
+from nuqql_based.event import ChatListEvent, ChatUserEvent, EventBatch
+
+
+class ChatStoreTest(unittest.TestCase):
+    """
+    Test the chat store
+    """
+
+    def setUp(self) -> None:
+        # the queue is bound to the current event loop in python < 3.10
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.config = Config("test", "0")
+        self.acc = Account(self.config, Callbacks(), self.queue, aid=4)
+        self.acc.user = "me"
+        self.chats = self.acc.chats
+
+    def tearDown(self) -> None:
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_chats(self) -> None:
+        """
+        Test joining, renaming and leaving chats and updating chat users
+        """
+
+        self.chats.join("#a")
+        self.chats.join("#b", name="Chat B", user="myself")
+        self.chats.rename("#a", "Chat A")
+        self.assertEqual(self.chats.get_list_events(),
+                         [ChatListEvent(4, "#a", "Chat A", "me"),
+                          ChatListEvent(4, "#b", "Chat B", "myself")])
+
+        self.chats.user_update("#a", "u1", name="User 1")
+        self.chats.user_update_many("#a", [("u2", None, "invite"),
+                                           ("u3", "User 3", None)])
+        self.chats.user_update("#a", "u2", status="join")
+        self.chats.user_part("#a", "u3")
+        self.chats.user_update("#unknown", "u1")
+        self.assertEqual(self.chats.get_user_events("#a"),
+                         [ChatUserEvent(4, "#a", "u1", "User 1", "join"),
+                          ChatUserEvent(4, "#a", "u2", "u2", "join")])
+        self.assertEqual(self.chats.get_user_events("#b"), [])
+
+        self.chats.part("#a")
+        self.assertEqual(len(self.chats), 1)
+        self.assertEqual(self.chats.get_user_events("#a"), [])
+
+        # no changes are pushed by default
+        self.assertTrue(self.queue.empty())
+
+    def test_push_chats(self) -> None:
+        """
+        Test pushing chat changes to the client
+        """
+
+        self.config._push_chats = True  # pylint: disable=protected-access
+        self.chats.join("#a")
+        self.chats.user_update_many("#a", [("u1", None, None),
+                                           ("u2", None, None)])
+        self.chats.user_update("#a", "u1")
+        self.chats.user_part("#a", "u2")
+        self.chats.part("#a")
+        self.chats.part("#unknown")
+
+        self.assertEqual(self.queue.get_nowait(),
+                         ChatListEvent(4, "#a", "#a", "me"))
+        self.assertEqual(self.queue.get_nowait(),
+                         EventBatch([ChatUserEvent(4, "#a", "u1", "u1",
+                                                   "join"),
+                                     ChatUserEvent(4, "#a", "u2", "u2",
+                                                   "join")]))
+        self.assertEqual(self.queue.get_nowait(),
+                         ChatUserEvent(4, "#a", "u2", "u2", "part"))
+        self.assertEqual(self.queue.get_nowait(),
+                         ChatUserEvent(4, "#a", "me", "me", "part"))
+        self.assertTrue(self.queue.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
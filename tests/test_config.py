@@ -0,0 +1,61 @@
+"""
+Config testing code
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from nuqql_based.config import Config
+
+
+class ConfigTest(unittest.TestCase):
+    """
+    Config tests
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def test_options(self) -> None:
+        """
+        Test backend specific options
+        """
+
+        # default values
+        config = Config("test", "0.1")
+        config.add_option("my-int", 1, "int option")
+        config.add_option("my-float", 0.5, "float option")
+        config.add_option("my-flag", False, "bool option")
+        config.add_option("my-str", "abc", "str option")
+        config.init(["--dir", self.test_dir])
+        self.assertEqual(config.get_option("my-int"), 1)
+        self.assertEqual(config.get_option("my-float"), 0.5)
+        self.assertEqual(config.get_option("my-flag"), False)
+        self.assertEqual(config.get_option("my-str"), "abc")
+
+        # config file and command line arguments
+        with open(Path(self.test_dir) / "config.ini", "w",
+                  encoding="UTF-8") as config_file:
+            config_file.write("[backend]\nmy-int = 2\nmy-float = 1.5\n"
+                              "my-flag = yes\n")
+        config = Config("test", "0.1")
+        config.add_option("my-int", 1, "int option")
+        config.add_option("my-float", 0.5, "float option")
+        config.add_option("my-flag", False, "bool option")
+        config.add_option("my-str", "abc", "str option")
+        config.init(["--dir", self.test_dir, "--my-float", "2.5",
+                     "--my-str", "xyz"])
+        self.assertEqual(config.get_option("my-int"), 2)
+        self.assertEqual(config.get_option("my-float"), 2.5)
+        self.assertEqual(config.get_option("my-flag"), True)
+        self.assertEqual(config.get_option("my-str"), "xyz")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Host testing code
+"""
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+from nuqql_based.account import Account
+from nuqql_based.based import Based
+from nuqql_based.callback import Callback
+from nuqql_based.host import Host
+
+
+def welcome(_acc: Optional[Account], _cmd: Callback, _params: Tuple) -> str:
+    """
+    Synchronous welcome callback for testing
+    """
+
+    return ""
+
+
+class HostTest(unittest.TestCase):
+    """
+    Tests for multiple backends in one process
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    async def run_cmds(self, sockfile: Path, *cmds: str) -> str:
+        """
+        Connect to a backend, run commands and return the replies
+        """
+
+        for _ in range(100):
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    str(sockfile))
+                break
+            except OSError:
+                await asyncio.sleep(0.05)
+        for cmd in cmds:
+            writer.write(f"{cmd}\r\n".encode())
+        reply = await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+        await writer.wait_closed()
+        return reply.decode()
+
+    def test_host(self) -> None:
+        """
+        Test running two backends in one host
+        """
+
+        async def run() -> None:
+            host = Host()
+            for name in ("based1", "based2"):
+                based = Based(name, "0.1")
+                based.set_callbacks([(Callback.HELP_WELCOME, welcome)])
+                host.add(based, ["--dir", str(self.test_dir / name), "--af",
+                                 "unix"])
+            task = asyncio.create_task(
+                host.start(["--dir", str(self.test_dir / "host")]))
+
+            # backends use their own config and listeners
+            reply = await self.run_cmds(self.test_dir / "based1/based1.sock",
+                                        "version", "bye")
+            self.assertEqual(reply, "info: version: based1 v0.1\r\n")
+            reply = await self.run_cmds(self.test_dir / "based2/based2.sock",
+                                        "version", "stats", "quit")
+
+            # thread pool and statistics are shared
+            self.assertIn("info: version: based2 v0.1\r\n", reply)
+            self.assertIn("stats: backend based1 callback HELP_WELCOME "
+                          "calls 1 ", reply)
+            self.assertIn("stats: backend based2 callback HELP_WELCOME "
+                          "calls 1 ", reply)
+            self.assertEqual(reply.count("stats: executor threads 4 "), 1)
+            self.assertIn("stats: executor threads 4 active 0 queued 0 max "
+                          "queued 1 completed 2 ", reply)
+
+            # backends quit independently, host quits after all backends
+            self.assertFalse(task.done())
+            await self.run_cmds(self.test_dir / "based1/based1.sock", "quit")
+            await asyncio.wait_for(task, 10)
+
+        asyncio.run(run())
+
+        # logging is shared
+        self.assertTrue((self.test_dir / "host/host.log").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
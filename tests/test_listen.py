@@ -0,0 +1,100 @@
+"""
+Multiple listen endpoints testing code
+"""
+
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from pathlib import Path
+from typing import Any
+
+# default socket timeout
+DEFAULT_TIMEOUT = 10
+
+# listen port of the backend
+PORT = 35100
+
+
+class ListenTest(unittest.TestCase):
+    """
+    Tests for listening on AF_INET and AF_UNIX endpoints at the same time
+    """
+
+    def setUp(self) -> None:
+        self.path = Path(__file__).resolve().parents[1]
+        self.test_dir = tempfile.mkdtemp()
+        self.proc = subprocess.Popen([sys.executable,
+                                      f"{self.path}/based.py", "--dir",
+                                      self.test_dir, "--listen",
+                                      f"inet:localhost:{PORT}", "--listen",
+                                      "unix:listen.sock"],
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL)
+
+    def tearDown(self) -> None:
+        self.proc.terminate()
+        self.proc.wait()
+        shutil.rmtree(self.test_dir)
+
+    def run_cmd(self, family: int, addr: Any, cmd: str, end: str) -> str:
+        """
+        Run command in a new client connection, return replies until end
+        """
+
+        for _ in range(DEFAULT_TIMEOUT * 10):
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.connect(addr)
+                break
+            except OSError:
+                sock.close()
+                time.sleep(0.1)
+        else:
+            raise TimeoutError("server did not start")
+
+        with sock:
+            sock.settimeout(DEFAULT_TIMEOUT)
+            sock.sendall(f"{cmd}\r\n".encode())
+            replies = ""
+            while end not in replies:
+                data = sock.recv(1024)
+                if not data:
+                    break
+                replies += data.decode()
+
+            # wait until the server closed the connection, so it accepts the
+            # next client
+            sock.sendall(b"bye\r\n")
+            while sock.recv(1024):
+                pass
+        return replies
+
+    def test_listen(self) -> None:
+        """
+        Test accounts are shared between inet and unix endpoints
+        """
+
+        inet = (socket.AF_INET, ("localhost", PORT))
+        unix = (socket.AF_UNIX, f"{self.test_dir}/listen.sock")
+
+        reply = self.run_cmd(*inet, "account add dummy user@test pw",
+                             "account")
+        self.assertEqual(reply, "info: added account 0.\r\n")
+        reply = self.run_cmd(*unix, "account list", "listed accounts.")
+        self.assertEqual(reply, "account: 0 () dummy user@test [online]\r\n"
+                         "info: listed accounts.\r\n")
+
+        reply = self.run_cmd(*unix, "account add dummy other@test pw",
+                             "account")
+        self.assertEqual(reply, "info: added account 1.\r\n")
+        reply = self.run_cmd(*inet, "account list", "listed accounts.")
+        self.assertIn("account: 1 () dummy other@test", reply)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Load benchmark testing code
+"""
+
+import argparse
+import unittest
+
+from benchmarks.compare import compare
+from benchmarks.load import COMMANDS, DEFAULT_MIX, parse_mix, run
+
+
+class LoadTest(unittest.TestCase):
+    """
+    Load benchmark tests
+    """
+
+    def test_parse_mix(self) -> None:
+        """
+        Test parsing command mixes
+        """
+
+        self.assertEqual(parse_mix("send=3,collect"),
+                         {"send": 3, "collect": 1})
+        with self.assertRaises(ValueError):
+            parse_mix("unknown=1")
+        with self.assertRaises(ValueError):
+            parse_mix("send=0")
+
+    def test_run(self) -> None:
+        """
+        Test a short benchmark run with all commands
+        """
+
+        args = argparse.Namespace(af="unix", port=0, connect=None,
+                                  backend_args="", mix=DEFAULT_MIX,
+                                  requests=200, concurrency=4, seed=0)
+        results = run(args)
+        self.assertGreater(results["throughput_rps"], 0)
+        self.assertEqual(results["latency"]["all"]["count"], 200)
+        for cmd in COMMANDS:
+            self.assertIn("p999_us", results["latency"][cmd])
+        self.assertIn("rss_kb", results["memory"])
+
+        # comparing with itself does not show regressions
+        self.assertEqual(compare(results, results, 0.0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
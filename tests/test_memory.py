@@ -0,0 +1,140 @@
+"""
+In-memory transport testing code
+"""
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from typing import Awaitable, Callable
+
+from nuqql_based.based import Based
+from nuqql_based.main import VERSION, create_based
+from nuqql_based.memory import open_connection
+
+
+class MemoryTest(unittest.TestCase):
+    """
+    Tests for clients connected with an in-memory transport
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def run_based(self, test: Callable[[Based], Awaitable[None]]) -> None:
+        """
+        Set up a backend, run the test coroutine function with it and shut
+        the backend down
+        """
+
+        async def run() -> None:
+            based = create_based()
+            await based.setup(["--dir", self.test_dir])
+            try:
+                await test(based)
+            finally:
+                await based.shutdown()
+
+        asyncio.run(run())
+
+    def test_commands(self) -> None:
+        """
+        Test commands and incoming messages over an in-memory connection
+        """
+
+        async def test(based: Based) -> None:
+            reader, writer = await open_connection(based.server)
+            writer.write(b"version\r\n")
+            self.assertEqual(await reader.readline(),
+                             f"info: version: based v{VERSION}\r\n".encode())
+
+            # add account and send a message, the dummy backend echoes it
+            writer.write(b"account add dummy user@example.com pw\r\n")
+            self.assertEqual(await reader.readline(),
+                             b"info: added account 0.\r\n")
+            writer.write(b"account 0 send buddy@example.com test\r\n")
+            reply = await asyncio.wait_for(reader.readline(), 10)
+            self.assertTrue(reply.startswith(b"message: 0 user@example.com "))
+            self.assertTrue(reply.endswith(b" buddy@example.com TEST\r\n"))
+
+            # only one client can be connected at a time
+            reader2, _writer2 = await open_connection(based.server)
+            self.assertEqual(await asyncio.wait_for(reader2.read(), 10), b"")
+
+            # server closes the connection after bye
+            writer.write(b"bye\r\n")
+            self.assertEqual(await asyncio.wait_for(reader.read(), 10), b"")
+            writer.close()
+            await writer.wait_closed()
+            self.assertFalse(based.server.connected)
+
+            # reconnect
+            reader, writer = await open_connection(based.server)
+            writer.write(b"account list\r\n")
+            reply = await asyncio.wait_for(reader.readline(), 10)
+            self.assertTrue(reply.startswith(b"account: 0 ("))
+            writer.close()
+            await writer.wait_closed()
+
+        self.run_based(test)
+
+    def test_flow_control(self) -> None:
+        """
+        Test that a client that does not read slows down the server
+        """
+
+        async def test(based: Based) -> None:
+            reader, writer = await open_connection(based.server, limit=1024)
+            writer.write(b"account add dummy user@example.com pw\r\n")
+            await reader.readline()
+            for i in range(1000):
+                writer.write(
+                    f"account 0 send buddy@example.com {i}\r\n".encode())
+            await writer.drain()
+
+            # the reader buffer is limited, so the server waits for the
+            # client instead of sending all replies
+            await asyncio.sleep(0.1)
+            self.assertLess(based.server.output.bytes_out, 4096)
+            for i in range(1000):
+                reply = await asyncio.wait_for(reader.readline(), 10)
+                self.assertTrue(reply.endswith(f" {i}\r\n".encode()))
+            writer.close()
+            await writer.wait_closed()
+
+        self.run_based(test)
+
+    def test_startup(self) -> None:
+        """
+        Test setting up another backend and connecting to it without
+        starting its listeners, its startup time is measured by
+        benchmarks/startup.py
+        """
+
+        async def test(based: Based) -> None:
+            other = create_based()
+            await other.setup(["--dir", self.test_dir, "--sockfile",
+                               "other"])
+            self.assertFalse(other.server.servers)
+            reader, writer = await open_connection(other.server)
+            writer.write(b"version\r\nbye\r\n")
+            self.assertEqual(await asyncio.wait_for(reader.read(), 10),
+                             f"info: version: based v{VERSION}\r\n".encode())
+            writer.close()
+            await writer.wait_closed()
+            await other.shutdown()
+
+            # the connection does not affect the first backend
+            self.assertFalse(based.server.connected)
+            self.assertEqual(based.server.connections, 0)
+            self.assertEqual(other.server.connections, 1)
+
+        self.run_based(test)
+
+
+if __name__ == '__main__':
+    unittest.main()
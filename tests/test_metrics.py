@@ -0,0 +1,137 @@
+"""
+Metrics server testing code
+"""
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from nuqql_based.main import create_based
+from nuqql_based.memory import open_connection
+from nuqql_based.metrics import escape
+
+
+class MetricsTest(unittest.TestCase):
+    """
+    Tests for serving metrics in the Prometheus text format
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def run_server(self, test: Callable[[], Awaitable[None]]) -> None:
+        """
+        Run the server with the metrics server and the test coroutine
+        function
+        """
+
+        async def run() -> None:
+            # the backend is bound to the event loop in python < 3.10
+            # pylint: disable=attribute-defined-outside-init
+            self.based = create_based()
+            await self.based.setup(["--dir", str(self.test_dir), "--af",
+                                    "unix", "--metrics", "unix:metrics.sock"])
+            task = asyncio.create_task(self.based.server._run())
+
+            # wait until the metrics server is listening
+            for _ in range(100):
+                if (self.test_dir / "metrics.sock").exists():
+                    break
+                await asyncio.sleep(0.1)
+
+            try:
+                await test()
+            finally:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                await self.based.shutdown()
+
+        asyncio.run(run())
+
+    async def request(self, request: str) -> str:
+        """
+        Send HTTP request to the metrics server and return the response
+        """
+
+        reader, writer = await asyncio.open_unix_connection(
+            str(self.test_dir / "metrics.sock"))
+        writer.write(request.encode())
+        response = await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+        await writer.wait_closed()
+        return response.decode()
+
+    def test_escape(self) -> None:
+        """
+        Test escaping label values
+        """
+
+        self.assertEqual(escape('a\\b"c\nd'), 'a\\\\b\\"c\\nd')
+
+    def test_metrics(self) -> None:
+        """
+        Test scraping the metrics after handling commands
+        """
+
+        async def test() -> None:
+            await self.based.accounts.add("dummy", "user@example.com", "pw")
+            reader, writer = await open_connection(self.based.server)
+            writer.write(b"account 0 send buddy@example.com test\r\n")
+            await asyncio.wait_for(reader.readline(), 10)
+
+            response = await self.request("GET /metrics HTTP/1.1\r\n"
+                                          "Host: localhost\r\n\r\n")
+            header, _sep, body = response.partition("\r\n\r\n")
+            self.assertTrue(header.startswith("HTTP/1.0 200 OK\r\n"))
+            self.assertIn("Content-Type: text/plain; version=0.0.4", header)
+            self.assertIn('nuqql_based_clients_connected{backend="based"} 1',
+                          body)
+            self.assertIn('nuqql_based_commands_total{backend="based",'
+                          'command="account send"} 1', body)
+            self.assertIn('nuqql_based_command_duration_seconds_count'
+                          '{backend="based",command="account send"} 1', body)
+            self.assertIn('nuqql_based_callback_duration_seconds_count'
+                          '{backend="based",callback="SEND_MESSAGE"} 1', body)
+            self.assertIn('nuqql_based_history_messages{backend="based",'
+                          'account="0"} 1', body)
+            self.assertIn('nuqql_based_received_bytes_total'
+                          '{backend="based"} 39', body)
+            self.assertIn("# TYPE nuqql_based_queue_depth gauge", body)
+            for line in body.splitlines():
+                if not line.startswith("#"):
+                    float(line.rsplit(" ", 1)[1])
+
+            writer.write(b"bye\r\n")
+            await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            await writer.wait_closed()
+
+        self.run_server(test)
+
+    def test_errors(self) -> None:
+        """
+        Test invalid requests to the metrics server
+        """
+
+        async def test() -> None:
+            response = await self.request("GET /other HTTP/1.1\r\n\r\n")
+            self.assertTrue(response.startswith("HTTP/1.0 404 Not Found\r\n"))
+            response = await self.request("POST /metrics HTTP/1.1\r\n\r\n")
+            self.assertTrue(response.startswith(
+                "HTTP/1.0 405 Method Not Allowed\r\n"))
+
+        self.run_server(test)
+
+
+if __name__ == '__main__':
+    unittest.main()
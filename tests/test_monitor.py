@@ -0,0 +1,163 @@
+"""
+Event loop monitor testing code
+"""
+
+import asyncio
+import shutil
+import tempfile
+import time
+import unittest
+
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from nuqql_based.account import Account
+from nuqql_based.based import Based
+from nuqql_based.callback import Callback
+from nuqql_based.memory import open_connection
+from nuqql_based.monitor import LoopMonitor
+
+
+async def send_message(_acc: Optional[Account], _cmd: Callback,
+                       _params: Tuple) -> str:
+    """
+    Send message callback that blocks the event loop
+    """
+
+    time.sleep(0.3)
+    return ""
+
+
+class MonitorTest(unittest.TestCase):
+    """
+    Tests for the event loop monitor
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp()
+        self.monitor = LoopMonitor(0.1)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def run_monitored(self, test: Callable[[], Awaitable[None]]) -> None:
+        """
+        Run the test coroutine function in an event loop with the monitor
+        """
+
+        async def run() -> None:
+            self.monitor.start()
+            try:
+                await test()
+            finally:
+                await self.monitor.stop()
+
+        asyncio.run(run())
+
+    def test_lag(self) -> None:
+        """
+        Test measuring the lag without stalls
+        """
+
+        async def test() -> None:
+            await asyncio.sleep(0.3)
+            self.assertGreater(self.monitor.samples, 2)
+            self.assertFalse(self.monitor.stalls)
+            self.assertTrue(self.monitor.get_lines()[0].startswith(
+                "loop lag samples "))
+
+        self.run_monitored(test)
+
+    def test_stall(self) -> None:
+        """
+        Test attributing stalls to functions and callbacks
+        """
+
+        async def test() -> None:
+            # stall in a function
+            await asyncio.sleep(0.1)
+            time.sleep(0.3)
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(self.monitor.stalls), 1)
+            activity = next(iter(self.monitor.stalls))
+            self.assertTrue(activity.startswith("function test "
+                                                "test_monitor.py:"), activity)
+
+            # stall in a callback, shown in the stats
+            based = Based("test", "0.1")
+            based.set_callbacks([(Callback.SEND_MESSAGE, send_message)])
+            await based.setup(["--dir", self.test_dir])
+            based.server.monitor = self.monitor
+            self.monitor.servers.append(based.server)
+            await based.accounts.add("dummy", "user@example.com", "pw")
+            reader, writer = await open_connection(based.server)
+            writer.write(b"account 0 send buddy@example.com test\r\n")
+
+            # the stall is counted when the monitor task runs again
+            await asyncio.sleep(0.2)
+            writer.write(b"stats\r\nbye\r\n")
+            reply = (await asyncio.wait_for(reader.read(), 10)).decode()
+            writer.close()
+            await writer.wait_closed()
+            await based.shutdown()
+            self.assertIn("info: stats: loop stalls 1 max ", reply)
+            self.assertIn(" in callback SEND_MESSAGE account 0\r\n", reply)
+
+        self.run_monitored(test)
+
+    def test_stall_timeout(self) -> None:
+        """
+        Test attributing stalls to callbacks that run with a timeout
+        """
+
+        async def test() -> None:
+            based = Based("test", "0.1")
+            based.set_callbacks([(Callback.SEND_MESSAGE, send_message)])
+            await based.setup(["--dir", self.test_dir, "--callback-timeout",
+                               "5"])
+            based.server.monitor = self.monitor
+            self.monitor.servers.append(based.server)
+            await based.accounts.add("dummy", "user@example.com", "pw")
+            reader, writer = await open_connection(based.server)
+            writer.write(b"account 0 send buddy@example.com test\r\n")
+            await asyncio.sleep(0.5)
+            writer.write(b"bye\r\n")
+            await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            await writer.wait_closed()
+            await based.shutdown()
+            self.assertEqual(list(self.monitor.stalls),
+                             ["callback SEND_MESSAGE account 0"])
+
+        self.run_monitored(test)
+
+    def test_stall_command(self) -> None:
+        """
+        Test attributing stalls to commands
+        """
+
+        async def test() -> None:
+            based = Based("test", "0.1")
+            await based.setup(["--dir", self.test_dir])
+            self.monitor.servers.append(based.server)
+            get_stats = based.server.get_stats
+
+            def blocking_get_stats(executor: bool = True) -> List[str]:
+                time.sleep(0.3)
+                return get_stats(executor)
+
+            based.server.get_stats = blocking_get_stats  # type: ignore
+            reader, writer = await open_connection(based.server)
+            writer.write(b"stats\r\n")
+            await asyncio.sleep(0.5)
+            writer.write(b"bye\r\n")
+            await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            await writer.wait_closed()
+            await based.shutdown()
+            self.assertEqual(list(self.monitor.stalls), ["command stats"])
+
+        self.run_monitored(test)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Parser testing code
+"""
+
+import unittest
+
+from nuqql_based.account import Account
+from nuqql_based.event import Event, RawEvent, InfoEvent, ErrorEvent, \
+    AccountEvent, BuddyEvent, StatusEvent, MessageEvent, ChatUserEvent, \
+    ChatListEvent, ChatMsgEvent
+from nuqql_based.message import Message
+from nuqql_based.parser import Parser, parse_line, parse_lines
+
+
+class ParserTest(unittest.TestCase):
+    """
+    Test the nuqql message parser
+    """
+
+    def setUp(self) -> None:
+        # account only used for formatting messages
+        self.acc = Account(None, None, None, aid=3)   # type: ignore
+        self.acc.name = "name"
+        self.acc.type = "test"
+        self.acc.user = "user@example.com"
+
+    def test_parse_line(self) -> None:
+        """
+        Test parsing all message types formatted by Message
+        """
+
+        cases = [
+            (Message.info("listed accounts."),
+             InfoEvent("listed accounts.")),
+            (Message.error("invalid account"),
+             ErrorEvent("invalid account")),
+            (Message.account(self.acc),
+             AccountEvent(3, "name", "test", "user@example.com", "online")),
+            (Message.buddy(self.acc, "buddy@example.com", "", ""),
+             BuddyEvent(3, "", "buddy@example.com", "")),
+            (Message.buddy(self.acc, "buddy@example.com", "my buddy",
+                           "away"),
+             BuddyEvent(3, "away", "buddy@example.com", "my buddy")),
+            (Message.status(self.acc, "away"),
+             StatusEvent(3, "away")),
+            (Message.message(self.acc, "1234", "buddy@example.com",
+                             "user@example.com", "a <b>\nc & d"),
+             MessageEvent(3, "user@example.com", "1234",
+                          "buddy@example.com", "a <b>\nc & d")),
+            (Message.chat_user(self.acc, "chat", "uid", "user name",
+                               "join"),
+             ChatUserEvent(3, "chat", "uid", "user name", "join")),
+            (Message.chat_list(self.acc, "chat_id", "chat name",
+                               "user@example.com"),
+             ChatListEvent(3, "chat_id", "chat name", "user@example.com")),
+            (Message.chat_msg(self.acc, "1234", "buddy", "chat", "<br/>"),
+             ChatMsgEvent(3, "chat", "1234", "buddy", "<br/>")),
+            ("something else", RawEvent("something else")),
+            ("message: broken", RawEvent("message: broken")),
+            ("status: numbers 0 status: online",
+             RawEvent("status: numbers 0 status: online")),
+        ]
+        for line, event in cases:
+            self.assertEqual(parse_line(line.rstrip("\r\n")), event)
+
+    def test_serialize(self) -> None:
+        """
+        Test that parsing serialized events returns the same events
+        """
+
+        events = [
+            InfoEvent("info"),
+            ErrorEvent("error"),
+            AccountEvent(1, "", "test", "user@example.com", "online"),
+            BuddyEvent(1, "away", "buddy@example.com", "alias"),
+            StatusEvent(1, "away"),
+            MessageEvent(1, "user", "1234", "buddy", "a <b>\n&amp;"),
+            ChatUserEvent(1, "chat", "uid", "name", "join"),
+            ChatListEvent(1, "chat_id", "name", "user"),
+            ChatMsgEvent(1, "chat", "1234", "buddy", "a\nb"),
+            RawEvent("raw"),
+        ]
+        text = "".join(event.serialize() for event in events)
+        self.assertEqual(parse_lines(text), events)
+
+        # the base class cannot be serialized, events are not hashable
+        # pylint: disable=abstract-class-instantiated
+        with self.assertRaises(TypeError):
+            Event()     # type: ignore
+        with self.assertRaises(TypeError):
+            hash(InfoEvent("info"))
+
+    def test_parse_lines(self) -> None:
+        """
+        Test parsing a batch of lines
+        """
+
+        text = Message.info("a") + Message.error("b") + Message.info("c")
+        self.assertEqual(parse_lines(text), [InfoEvent("a"), ErrorEvent("b"),
+                                             InfoEvent("c")])
+        self.assertEqual(parse_lines(""), [])
+        self.assertEqual(parse_lines("\r\n" + Message.info("a") + "\r\n"),
+                         [InfoEvent("a")])
+
+    def test_feed(self) -> None:
+        """
+        Test incremental parsing of partial buffers
+        """
+
+        data = (Message.info("first") + Message.status(self.acc, "online") +
+                Message.message(self.acc, "1", "a", "b", "ä")).encode()
+
+        # feed byte by byte
+        parser = Parser()
+        events = []
+        for i in range(len(data)):
+            events += parser.feed(data[i:i + 1])
+        self.assertEqual(events, [InfoEvent("first"), StatusEvent(3, "online"),
+                                  MessageEvent(3, "b", "1", "a", "ä")])
+        self.assertEqual(parser.pending(), b"")
+
+        # feed everything at once with a trailing incomplete line
+        parser = Parser()
+        events = parser.feed(data + b"info: incomp")
+        self.assertEqual(len(events), 3)
+        self.assertEqual(parser.pending(), b"info: incomp")
+        self.assertEqual(parser.feed(b"lete\r\n"), [InfoEvent("incomplete")])
+
+        # empty lines are skipped
+        self.assertEqual(parser.feed(b"\r\n\r\ninfo: a\r\n"),
+                         [InfoEvent("a")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Profiler testing code
+"""
+
+import asyncio
+import pstats
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from nuqql_based.main import create_based
+from nuqql_based.memory import open_connection
+
+
+class ProfilerTest(unittest.TestCase):
+    """
+    Tests for on-demand profiling
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def run_client(self, test: Callable[[], Awaitable[None]]) -> None:
+        """
+        Set up the backend, connect a client and run the test coroutine
+        function
+        """
+
+        async def run() -> None:
+            # the backend is bound to the event loop in python < 3.10
+            # pylint: disable=attribute-defined-outside-init
+            self.based = create_based()
+            await self.based.setup(["--dir", str(self.test_dir),
+                                    "--profile-time", "0.2"])
+            self.reader, self.writer = await open_connection(
+                self.based.server)
+            try:
+                await test()
+            finally:
+                self.writer.close()
+                await self.writer.wait_closed()
+                await self.based.shutdown()
+
+        asyncio.run(run())
+
+    async def cmd(self, cmd: str) -> str:
+        """
+        Send command and return the reply
+        """
+
+        self.writer.write(f"{cmd}\r\n".encode())
+        reply = await asyncio.wait_for(self.reader.readline(), 10)
+        return reply.decode()
+
+    def test_profile(self) -> None:
+        """
+        Test profiling for the configured time and stopping it
+        """
+
+        async def test() -> None:
+            reply = await self.cmd("profile")
+            self.assertTrue(reply.startswith("info: started profiling, stats "
+                                             "file: "))
+            self.assertEqual(await self.cmd("profile"),
+                             "error: profiling is already running\r\n")
+            await self.cmd("version")
+            await asyncio.sleep(0.3)
+
+            # stats are written when the time is over
+            self.assertFalse(self.based.server.profiler.is_running())
+            path = Path(reply.split("stats file: ")[1][:-3])
+            self.assertEqual(path.parent, self.test_dir)
+            stats = pstats.Stats(str(path))
+            self.assertTrue(any(func[2] == "_handle_version"
+                                for func in stats.stats))  # type: ignore
+            self.assertTrue(path.with_suffix(".txt").exists())
+
+            # stop profiling before the time is over
+            self.assertEqual(await self.cmd("profile stop"),
+                             "error: profiling is not running\r\n")
+            await self.cmd("profile 10")
+            reply = await self.cmd("profile stop")
+            self.assertTrue(reply.startswith("info: wrote profiling stats "
+                                             "to "))
+            self.assertEqual(await self.cmd("profile abc"),
+                             "error: invalid profiling duration\r\n")
+
+        self.run_client(test)
+
+    def test_tasks(self) -> None:
+        """
+        Test dumping all running tasks
+        """
+
+        async def test() -> None:
+            reply = await self.cmd("profile tasks")
+            self.assertTrue(reply.startswith("info: dumped tasks to "))
+            path = Path(reply[len("info: dumped tasks to "):-3])
+            tasks = path.read_text(encoding="UTF-8")
+            self.assertIn("_handle_client", tasks)
+            self.assertIn("_handle_incoming", tasks)
+
+        self.run_client(test)
+
+
+if __name__ == '__main__':
+    unittest.main()
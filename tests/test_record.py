@@ -0,0 +1,145 @@
+"""
+Session recording testing code
+"""
+
+import argparse
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+from benchmarks.replay import run
+from nuqql_based import record
+from nuqql_based.account import Account
+from nuqql_based.callback import Callback
+from nuqql_based.event import InfoEvent, TextEvent
+from nuqql_based.main import create_based
+from nuqql_based.memory import open_connection
+
+
+class RecordTest(unittest.TestCase):
+    """
+    Tests for recording and replaying client sessions
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def test_load(self) -> None:
+        """
+        Test writing and loading recordings
+        """
+
+        for name in ("test.rec", "test.rec.gz"):
+            recorder = record.Recorder(self.test_dir / name)
+            recorder.start("test", "0.1", [])
+            recorder.command("account 0 send user a\\b\nc")
+            result = InfoEvent("result")
+            record.add_result(result)
+            recorder.command_done()
+            record.add_result(InfoEvent("other"))
+            event = TextEvent("info: first\r\ninfo: second\r\n")
+            recorder.event(event, event.serialize())
+            recorder.event(result, result.serialize())
+            recorder.stop()
+            recorder.start("test", "0.1", [])
+            recorder.stop()
+
+            sessions = record.load(self.test_dir / name)
+            self.assertEqual(len(sessions), 2)
+            self.assertEqual([(kind, text) for _, kind, text in sessions[0]
+                              if kind != record.SESSION],
+                             [(record.COMMAND, "account 0 send user a\\b\nc"),
+                              (record.EVENT, "info: first"),
+                              (record.EVENT, "info: second"),
+                              (record.RESULT, "info: result")])
+            self.assertEqual(len(sessions[1]), 1)
+
+        (self.test_dir / "invalid.rec").write_text("0.0 C version\n")
+        with self.assertRaises(ValueError):
+            record.load(self.test_dir / "invalid.rec")
+
+    def test_record(self) -> None:
+        """
+        Test recording a client session and replaying it
+        """
+
+        async def record_session() -> None:
+            based = create_based()
+            await based.setup(["--dir", str(self.test_dir), "--record",
+                               "session.rec"])
+            await based.accounts.add("dummy", "user@example.com", "pw")
+            reader, writer = await open_connection(based.server)
+            writer.write(b"account 0 send buddy@example.com test\r\n")
+            await asyncio.wait_for(reader.readline(), 10)
+            writer.write(b"account 0 buddies\r\nbye\r\n")
+            await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            await writer.wait_closed()
+            await based.shutdown()
+
+        asyncio.run(record_session())
+
+        sessions = record.load(self.test_dir / "session.rec")
+        self.assertEqual(len(sessions), 1)
+        kinds = [kind for _, kind, _ in sessions[0]]
+        self.assertEqual(kinds, [record.SESSION, record.ACCOUNT,
+                                 record.COMMAND, record.RESULT,
+                                 record.COMMAND, record.COMMAND])
+        self.assertEqual(sessions[0][1][2], "0 dummy user@example.com")
+
+        # replay the recording as fast as possible, in its own event loop
+        args = argparse.Namespace(recording=str(self.test_dir /
+                                                "session.rec"),
+                                  af="memory", connect=None,
+                                  backend_args="", speed=0.0, events=True)
+        results = run(args)
+        self.assertEqual(results["commands"], 3)
+
+        # the echo of the sent message is a result of the replayed command
+        self.assertEqual(results["events"], 0)
+        # incoming messages can still be queued when the server handles bye
+        self.assertGreaterEqual(results["replies"], 2)
+        self.assertGreater(results["throughput_rps"], 0)
+
+    def test_sync_result(self) -> None:
+        """
+        Test recording events received in synchronous callbacks as results
+        """
+
+        def send_message(acc: Optional[Account], _cmd: Callback,
+                         params: Tuple) -> str:
+            assert acc
+            acc.receive_msg(InfoEvent(f"sent {params[1]}"))
+            return ""
+
+        async def record_session() -> None:
+            based = create_based()
+            await based.setup(["--dir", str(self.test_dir), "--record",
+                               "session.rec"])
+            based.callbacks.add(Callback.SEND_MESSAGE, send_message)
+            await based.accounts.add("dummy", "user@example.com", "pw")
+            reader, writer = await open_connection(based.server)
+            writer.write(b"account 0 send buddy@example.com test\r\n")
+            await asyncio.wait_for(reader.readline(), 10)
+            writer.write(b"bye\r\n")
+            await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            await writer.wait_closed()
+            await based.shutdown()
+
+        asyncio.run(record_session())
+
+        sessions = record.load(self.test_dir / "session.rec")
+        self.assertIn((record.RESULT, "info: sent test"),
+                      [(kind, text) for _, kind, text in sessions[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
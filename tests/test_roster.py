@@ -0,0 +1,88 @@
+"""
+Roster testing code
+"""
+
+import asyncio
+import unittest
+
+from nuqql_based.account import Account
+from nuqql_based.callback import Callbacks
+from nuqql_based.config import Config
+from nuqql_based.event import BuddyEvent, EventBatch
+
+
+class RosterTest(unittest.TestCase):
+    """
+    Test the buddy roster
+    """
+
+    def setUp(self) -> None:
+        # the queue is bound to the current event loop in python < 3.10
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.config = Config("test", "0")
+        self.acc = Account(self.config, Callbacks(), self.queue, aid=2)
+        self.roster = self.acc.roster
+
+    def tearDown(self) -> None:
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_update(self) -> None:
+        """
+        Test adding, updating and removing buddies
+        """
+
+        self.roster.update("a@example.com", alias="A", status="online")
+        self.roster.update("b@example.com")
+        self.roster.update_many([("c@example.com", "C", "away"),
+                                 ("d@example.com", None, "offline")])
+        self.assertEqual(len(self.roster), 4)
+        self.assertEqual(
+            sorted(buddy.name for buddy in self.roster.get_buddies()),
+            ["a@example.com", "b@example.com", "c@example.com",
+             "d@example.com"])
+        self.assertEqual(
+            sorted(buddy.name for buddy in self.roster.get_buddies(True)),
+            ["a@example.com", "c@example.com"])
+
+        # presence changes
+        self.roster.update("a@example.com", status="Offline")
+        self.roster.update("d@example.com", status="online")
+        self.roster.remove("c@example.com")
+        self.assertEqual(self.roster.get_events(True),
+                         [BuddyEvent(2, "online", "d@example.com", "")])
+        buddy = self.roster.get("a@example.com")
+        assert buddy
+        self.assertEqual(buddy.alias, "A")
+        self.assertFalse(buddy.is_online())
+
+        # no deltas are pushed by default
+        self.assertTrue(self.queue.empty())
+
+    def test_push_buddies(self) -> None:
+        """
+        Test pushing buddy changes to the client
+        """
+
+        self.config._push_buddies = True  # pylint: disable=protected-access
+        self.roster.update("a@example.com", status="online")
+        self.roster.update("a@example.com", status="online")
+        self.roster.update_many([("a@example.com", "A", None),
+                                 ("b@example.com", None, None)])
+        self.roster.remove("b@example.com")
+
+        self.assertEqual(self.queue.get_nowait(),
+                         BuddyEvent(2, "online", "a@example.com", ""))
+        self.assertEqual(self.queue.get_nowait(),
+                         EventBatch([BuddyEvent(2, "online", "a@example.com",
+                                                "A"),
+                                     BuddyEvent(2, "", "b@example.com", "")]))
+        self.assertEqual(self.queue.get_nowait(),
+                         BuddyEvent(2, "offline", "b@example.com", ""))
+        self.assertTrue(self.queue.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
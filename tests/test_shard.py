@@ -0,0 +1,132 @@
+"""
+Sharding mode testing code
+"""
+
+import configparser
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from pathlib import Path
+from typing import List, Set
+
+# default socket timeout
+DEFAULT_TIMEOUT = 10
+
+# listen port of the backend
+PORT = 35000
+
+
+class ShardTest(unittest.TestCase):
+    """
+    Tests for sharding accounts across processes listening on the same port
+    """
+
+    def setUp(self) -> None:
+        self.path = Path(__file__).resolve().parents[1]
+        self.test_dir = tempfile.mkdtemp()
+        self.proc = subprocess.Popen([sys.executable,
+                                      f"{self.path}/based.py", "--dir",
+                                      self.test_dir, "--af", "inet",
+                                      "--port", str(PORT), "--shards", "2"],
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL)
+
+    def tearDown(self) -> None:
+        self.proc.terminate()
+        self.proc.wait()
+        shutil.rmtree(self.test_dir)
+
+    @staticmethod
+    def connect() -> socket.socket:
+        """
+        Connect to the backend, tries to reach server for 10 seconds
+        """
+
+        for _ in range(DEFAULT_TIMEOUT * 10):
+            try:
+                sock = socket.create_connection(("localhost", PORT))
+                sock.settimeout(DEFAULT_TIMEOUT)
+                return sock
+            except OSError:
+                time.sleep(0.1)
+        raise TimeoutError("server did not start")
+
+    def run_cmds(self, cmds: List[str], end: str) -> str:
+        """
+        Run commands in a new client connection, return replies until end
+        """
+
+        with self.connect() as sock:
+            sock.sendall("".join(f"{cmd}\r\n" for cmd in cmds).encode())
+            replies = ""
+            while end not in replies:
+                data = sock.recv(1024)
+                if not data:
+                    break
+                replies += data.decode()
+
+            # wait until the server closed the connection, so it accepts the
+            # next client
+            sock.sendall(b"bye\r\n")
+            while sock.recv(1024):
+                pass
+        return replies
+
+    def test_shards(self) -> None:
+        """
+        Test adding accounts in different shard processes
+        """
+
+        acc_ids: Set[int] = set()
+        for i in range(20):
+            reply = self.run_cmds([f"account add dummy user{i}@test pw"],
+                                  "account")
+            self.assertTrue(reply.startswith("info: added account "))
+            acc_ids.add(int(reply.split()[3].strip(".")))
+
+            # accounts of other shards are not listed, shards can be empty
+            reply = self.run_cmds(["account list"], "listed accounts.")
+            listed = [int(line.split()[1]) for line in reply.split("\r\n")
+                      if line.startswith("account: ")]
+            self.assertLessEqual(len({acc_id % 2 for acc_id in listed}), 1)
+
+        # connections are distributed to both shards, account IDs are unique
+        self.assertEqual(len(acc_ids), 20)
+        self.assertEqual({acc_id % 2 for acc_id in acc_ids}, {0, 1})
+
+        # accounts file contains the accounts of all shards
+        accconf = configparser.ConfigParser()
+        accconf.read(f"{self.test_dir}/accounts.ini")
+        self.assertEqual({int(accconf[section]["id"])
+                          for section in accconf.sections()}, acc_ids)
+
+    def test_other_shard(self) -> None:
+        """
+        Test commands for accounts of the other shard
+        """
+
+        with self.connect() as sock:
+            sock.sendall(b"account add dummy user@test pw\r\n")
+            reply = sock.recv(1024).decode()
+            self.assertTrue(reply.startswith("info: added account "))
+            acc_id = int(reply.split()[3].strip("."))
+
+            # the other shard handles the next account ID, this shard the
+            # one after it
+            sock.sendall(f"account {acc_id + 1} status get\r\n".encode())
+            self.assertEqual(sock.recv(1024),
+                             b"error: account belongs to another shard\r\n")
+            sock.sendall(f"account {acc_id + 2} status get\r\n".encode())
+            self.assertEqual(sock.recv(1024), b"error: invalid account\r\n")
+            sock.sendall(b"bye\r\n")
+            while sock.recv(1024):
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Dummy backend traffic simulation testing code
+"""
+
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from pathlib import Path
+
+# default socket timeout
+DEFAULT_TIMEOUT = 10
+
+
+class SimulationTest(unittest.TestCase):
+    """
+    Tests for the synthetic traffic mode of the dummy backend
+    """
+
+    def setUp(self) -> None:
+        self.path = Path(__file__).resolve().parents[1]
+        self.test_dir = tempfile.mkdtemp()
+        self.proc = subprocess.Popen([sys.executable,
+                                      f"{self.path}/based.py", "--dir",
+                                      self.test_dir, "--af", "unix",
+                                      "--push-buddies", "--sim-rate", "100",
+                                      "--sim-buddies", "20", "--sim-chats",
+                                      "2", "--sim-churn", "50"],
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        for _ in range(DEFAULT_TIMEOUT * 10):
+            try:
+                self.sock.connect(f"{self.test_dir}/based.sock")
+                break
+            except OSError:
+                time.sleep(0.1)
+        self.sock.settimeout(DEFAULT_TIMEOUT)
+
+    def tearDown(self) -> None:
+        self.sock.close()
+        self.proc.terminate()
+        self.proc.wait()
+        shutil.rmtree(self.test_dir)
+
+    def test_simulation(self) -> None:
+        """
+        Test simulated roster, chats, messages and presence changes
+        """
+
+        self.sock.sendall(b"account add dummy user@example.com pw\r\n")
+        buf = ""
+        kinds = set()
+        while kinds != {"message", "chat", "buddy"}:
+            data = self.sock.recv(4096)
+            self.assertTrue(data)
+            buf += data.decode()
+            *lines, buf = buf.split("\r\n")
+            for line in lines:
+                if line.startswith("message: 0 user@example.com "):
+                    kinds.add("message")
+                if line.startswith("chat: msg: 0 chat"):
+                    kinds.add("chat")
+                if line.startswith("buddy: 0 status: "):
+                    kinds.add("buddy")
+
+        # roster and chats are answered from the account's stores
+        self.sock.sendall(b"account 0 buddies\r\naccount 0 chat list\r\n")
+        buddies = set()
+        chats = set()
+        while "info: got buddies" not in buf or len(chats) < 2:
+            data = self.sock.recv(4096)
+            self.assertTrue(data)
+            buf += data.decode()
+            for line in buf.split("\r\n")[:-1]:
+                if line.startswith("buddy: 0 status: "):
+                    buddies.add(line.split(" name: ")[1].split()[0])
+                if line.startswith("chat: list: 0 "):
+                    chats.add(line.split()[3])
+        self.assertEqual(len(buddies), 20)
+        self.assertEqual(chats, {"chat0@simulation", "chat1@simulation"})
+
+
+if __name__ == '__main__':
+    unittest.main()
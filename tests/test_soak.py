@@ -0,0 +1,53 @@
+"""
+Soak test harness testing code
+"""
+
+import argparse
+import unittest
+
+from benchmarks.soak import run
+
+
+class SoakTest(unittest.TestCase):
+    """
+    Soak test harness tests
+    """
+
+    @staticmethod
+    def get_args(backend_args: str) -> argparse.Namespace:
+        """
+        Get arguments of a short soak test run, the warm-up runs the
+        backend code often enough that python < 3.11 allocated its inline
+        caches and the callback statistics reached their size
+        """
+
+        return argparse.Namespace(accounts=2, cycles=10, warmup=20,
+                                  interval=5, requests=100, concurrency=4,
+                                  mix="send=1", seed=0,
+                                  backend_args=backend_args,
+                                  max_per_connection=512,
+                                  max_per_account=16384, frames=1, top=5)
+
+    def test_limited_history(self) -> None:
+        """
+        Test that memory does not grow with a limited history
+        """
+
+        results = run(self.get_args("--history-size 20"))
+        self.assertTrue(results["passed"], results)
+        self.assertEqual([sample[0] for sample in results["samples"]],
+                         [5, 10])
+
+    def test_unlimited_history(self) -> None:
+        """
+        Test that growth of an unlimited history is detected and attributed
+        """
+
+        results = run(self.get_args(""))
+        self.assertFalse(results["passed"])
+        self.assertGreater(results["per_connection_bytes"], 512)
+        self.assertTrue(results["top"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+"""
+Startup time testing code
+"""
+
+import os
+import unittest
+
+from benchmarks.startup import DEFAULT_THRESHOLD, measure_startup
+
+
+class StartupTest(unittest.TestCase):
+    """
+    Startup time tests
+    """
+
+    def test_startup_time(self) -> None:
+        """
+        Test that the server accepts its first connection within the
+        threshold, which can be set with NUQQL_STARTUP_THRESHOLD
+        """
+
+        threshold = float(os.environ.get("NUQQL_STARTUP_THRESHOLD",
+                                         DEFAULT_THRESHOLD))
+        self.assertLess(measure_startup(), threshold)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Worker process testing code
+"""
+
+import asyncio
+import pathlib
+import shutil
+import socket
+import tempfile
+import unittest
+
+from typing import Optional, Tuple
+
+from nuqql_based.account import Account
+from nuqql_based.callback import Callback, Callbacks
+from nuqql_based.config import Config
+from nuqql_based.worker import WorkerPool, _worker_main, read_frame, \
+    write_frame
+
+
+async def get_status(_acc: Optional[Account], _cmd: Callback,
+                     _params: Tuple) -> str:
+    """
+    Slow get status callback
+    """
+
+    await asyncio.sleep(0.5)
+    return "status: slow\r\n"
+
+
+async def send_message(_acc: Optional[Account], _cmd: Callback,
+                       _params: Tuple) -> str:
+    """
+    Fast send message callback
+    """
+
+    return "info: sent\r\n"
+
+
+class WorkerTest(unittest.TestCase):
+    """
+    Tests for handling requests in a worker
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp()
+        self.config = Config("test", "0")
+        self.config._dir = pathlib.Path(  # pylint: disable=protected-access
+            self.test_dir)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def test_requests(self) -> None:
+        """
+        Test a slow request does not delay other requests
+        """
+
+        callbacks = Callbacks()
+        callbacks.add(Callback.GET_STATUS, get_status)
+        callbacks.add(Callback.SEND_MESSAGE, send_message)
+
+        async def run() -> None:
+            # run the worker in this process
+            front_sock, worker_sock = socket.socketpair()
+            worker = asyncio.create_task(_worker_main(0, worker_sock,
+                                                      self.config,
+                                                      callbacks))
+            reader, writer = await asyncio.open_connection(sock=front_sock)
+            write_frame(writer, (0, ("add", 0, "test", "user", "pw")))
+            self.assertEqual((await read_frame(reader))[1], 0)
+
+            # the reply to the second request is sent first
+            write_frame(writer, (1, ("msg", "account 0 status get")))
+            write_frame(writer, (2, ("msg", "account 0 send buddy test")))
+            replies = [await asyncio.wait_for(read_frame(reader), 10)
+                       for _ in range(2)]
+            self.assertEqual([reply[:2] for reply in replies],
+                             [("R", 2), ("R", 1)])
+            self.assertIn("status: slow", replies[1][2][1])
+
+            writer.close()
+            await writer.wait_closed()
+            await asyncio.wait_for(worker, 10)
+
+        asyncio.run(run())
+
+    def test_errors(self) -> None:
+        """
+        Test errors while handling requests are replied to the front process
+        """
+
+        callbacks = Callbacks()
+
+        async def run() -> None:
+            # run the worker in this process and connect the front process
+            # side of the worker pool to it
+            front_sock, worker_sock = socket.socketpair()
+            task = asyncio.create_task(_worker_main(0, worker_sock,
+                                                    self.config, callbacks))
+            pool = WorkerPool(self.config, callbacks, asyncio.Queue(), 1)
+            worker = pool.workers[0]
+            worker.reader, worker.writer = await asyncio.open_connection(
+                sock=front_sock)
+            # pylint: disable=protected-access
+            worker._task = asyncio.create_task(worker._read_frames())
+            await worker.request("add", 0, "test", "user", "pw")
+
+            # invalid collect time
+            reply = await asyncio.wait_for(
+                pool.handle_msg(0, "account 0 collect abc"), 10)
+            self.assertTrue(reply.startswith("error: ValueError("))
+
+            # the worker still handles requests
+            self.assertEqual(await pool.get_history(), {0: 0})
+
+            await pool.stop()
+            await asyncio.wait_for(task, 10)
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,394 @@
+"""
+Client writer and slow consumer testing code
+"""
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from typing import Awaitable, Callable, List
+
+from nuqql_based.config import Config
+from nuqql_based.event import PRIORITY_HIGH, PRIORITY_LOW, BuddyEvent, \
+    Event, EventBatch, InfoEvent
+from nuqql_based.main import create_based
+from nuqql_based.memory import open_connection
+from nuqql_based.writer import CHUNK, LANE_LIMIT, PRIORITY_BULK, \
+    ClientWriter, WriterStats, split
+
+# buffer limit of the client, the server has to wait if the client does not
+# read more than twice this limit
+LIMIT = 1024
+
+
+class BrokenTransport:
+    """
+    Transport of a connection that fails sending data
+    """
+
+    def __init__(self) -> None:
+        self.aborted = False
+
+    def abort(self) -> None:
+        """
+        Abort the connection
+        """
+
+        self.aborted = True
+
+
+class BrokenWriter:
+    """
+    Stream writer of a connection that fails sending data
+    """
+
+    def __init__(self) -> None:
+        self.transport = BrokenTransport()
+
+    @staticmethod
+    def get_extra_info(_name: str) -> None:
+        """
+        Get extra information about the connection, there is none
+        """
+
+        return None
+
+    @staticmethod
+    def write(_data: bytes) -> None:
+        """
+        Write data to the connection, this always fails
+        """
+
+        raise OSError("test error")
+
+
+class LaneTest(unittest.TestCase):
+    """
+    Tests for the output lanes
+    """
+
+    def setUp(self) -> None:
+        # the writer is bound to the current event loop in python < 3.10
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = ClientWriter(Config("test", "0.1"), None,  # type: ignore
+                                   WriterStats())
+
+    def tearDown(self) -> None:
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_split(self) -> None:
+        """
+        Test splitting data into chunks of complete lines
+        """
+
+        data = b"".join([f"info: {i:08}\r\n".encode() for i in range(5000)])
+        chunks = split(data)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), data)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), CHUNK)
+            self.assertTrue(chunk.endswith(b"\r\n"))
+        self.assertEqual(split(b"a" * (CHUNK + 1)), [b"a" * (CHUNK + 1)])
+
+    def test_priority(self) -> None:
+        """
+        Test interactive data overtakes queued bulk data
+        """
+
+        for _ in range(100):
+            self.client.put(b"b" * 100 + b"\r\n", PRIORITY_LOW)
+        self.client.put(b"a\r\n", PRIORITY_HIGH)
+        self.client.put(b"c\r\n", PRIORITY_BULK)
+        sent = []
+        data = self.client.get()
+        while data is not None:
+            sent.append(data)
+            data = self.client.get()
+        self.assertEqual(len(sent), 102)
+        self.assertEqual(sent[0], b"a\r\n")
+        self.assertEqual(sent[-1], b"c\r\n")
+
+    def test_fairness(self) -> None:
+        """
+        Test bulk data is not starved by interactive data
+        """
+
+        for _ in range(1000):
+            self.client.put(b"a" * 100 + b"\r\n", PRIORITY_HIGH)
+        for _ in range(10):
+            self.client.put(b"b\r\n", PRIORITY_LOW)
+        sent = [self.client.get() for _ in range(500)]
+        self.assertIn(b"b\r\n", sent)
+
+    def test_unsent(self) -> None:
+        """
+        Test getting the events that were not sent
+        """
+
+        events = [BuddyEvent(0, "online", f"{i}@example.com", "")
+                  for i in range(3)]
+        for event in events:
+            self.client.put(event.serialize().encode(), PRIORITY_LOW, event)
+        self.client.put(b"reply\r\n", PRIORITY_LOW)
+        large = EventBatch([BuddyEvent(0, "online", f"{i:08}@example.com",
+                                       "") for i in range(1000)])
+        data = large.serialize().encode()
+        self.client.put(data, PRIORITY_LOW, large)
+
+        # the original events are returned, the rest of an event that was
+        # sent partly keeps the priority of the event
+        self.assertEqual(self.client.get(), events[0].serialize().encode())
+        self.assertEqual(self.client.get_unsent(), events[1:] + [large])
+        for event in events:
+            self.client.put(event.serialize().encode(), PRIORITY_LOW, event)
+        self.client.put(data, PRIORITY_LOW, large)
+        sent = b"".join([self.client.get() or b"" for _ in range(4)])
+        unsent = self.client.get_unsent()
+        self.assertEqual(len(unsent), 1)
+        self.assertEqual(unsent[0].priority, PRIORITY_LOW)
+        self.assertEqual(sent + unsent[0].serialize().encode(),
+                         b"".join([event.serialize().encode()
+                                   for event in events]) + data)
+
+
+class WriterTest(unittest.TestCase):
+    """
+    Tests for sending data and handling slow consumers
+    """
+
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def run_based(self, test: Callable[[], Awaitable[None]]) -> None:
+        """
+        Run the test coroutine function and shut the backend down
+        """
+
+        async def run() -> None:
+            # the backend is bound to the event loop in python < 3.10
+            # pylint: disable=attribute-defined-outside-init
+            self.based = create_based()
+            try:
+                await test()
+            finally:
+                await self.based.shutdown()
+
+        asyncio.run(run())
+
+    async def run_slow(self, policy: str, before: List[Event],
+                       after: List[Event], *args: str) -> List[str]:
+        """
+        Put events on the queue of a client that stops reading until the
+        slow consumer timeout expired and more events after it expired, then
+        read and return all replies; args are additional backend arguments
+        """
+
+        await self.based.setup(["--dir", self.test_dir,
+                                "--slow-consumer-timeout", "0.2",
+                                "--slow-consumer-policy", policy, *args])
+        reader, writer = await open_connection(self.based.server, LIMIT)
+        for event in before:
+            self.based.queue.put_nowait(event)
+        await asyncio.sleep(0.5)
+        for event in after:
+            self.based.queue.put_nowait(event)
+        await asyncio.sleep(0.1)
+
+        writer.write(b"version\r\nbye\r\n")
+        replies = await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+        await writer.wait_closed()
+        return replies.decode().splitlines()
+
+    def test_disconnect(self) -> None:
+        """
+        Test disconnecting a slow consumer
+        """
+
+        async def test() -> None:
+            events = [InfoEvent(f"{i:04}" + "a" * 1000) for i in range(200)]
+            replies = await self.run_slow("disconnect", events, [])
+            self.assertFalse([reply for reply in replies
+                              if reply.startswith("info: version: ")])
+            self.assertEqual(self.based.server.output.disconnected, 1)
+            self.assertFalse(self.based.server.connected)
+
+            # events that were not sent are queued again for the next client
+            queued = []
+            while not self.based.queue.empty():
+                queued.append(self.based.queue.get_nowait())
+            self.assertTrue(queued)
+            self.assertEqual(queued, events[len(replies):])
+            for event, original in zip(queued, events[len(replies):]):
+                self.assertIs(event, original)
+
+        self.run_based(test)
+
+    def test_drop(self) -> None:
+        """
+        Test dropping low priority events for a slow consumer
+        """
+
+        async def test() -> None:
+            events = [InfoEvent("a" * 2000), InfoEvent("b" * 2000),
+                      BuddyEvent(0, "online", "a@example.com", "a")]
+            buddies = [BuddyEvent(0, "online", "b@example.com", "b")
+                       for _ in range(10)]
+            replies = await self.run_slow("drop", events, buddies)
+            self.assertEqual(len(replies), 3)
+            self.assertTrue(replies[1].startswith("info: bbb"))
+            self.assertTrue(replies[2].startswith("info: version: "))
+            output = self.based.server.output
+            self.assertEqual(output.slow_consumers, 1)
+            self.assertEqual(output.dropped, 11)
+            self.assertEqual(output.disconnected, 0)
+
+        self.run_based(test)
+
+    def test_spill(self) -> None:
+        """
+        Test spilling events to a file for a slow consumer
+        """
+
+        async def test() -> None:
+            events: List[Event] = [InfoEvent("a" * 2000),
+                                   InfoEvent("b" * 2000)]
+            spilled: List[Event] = [BuddyEvent(0, "online", f"{i}@example.com",
+                                               "") for i in range(10)]
+            spilled.append(InfoEvent("c"))
+            replies = await self.run_slow("spill", events, spilled)
+            self.assertEqual(len(replies), 14)
+            self.assertTrue(replies[2].startswith("info: version: "))
+
+            # spilled events keep their priorities, the info event overtakes
+            # the buddy updates
+            self.assertEqual(replies[3:], [event.serialize()[:-2]
+                                           for event in spilled[-1:] +
+                                           spilled[:-1]])
+            output = self.based.server.output
+            self.assertEqual(output.slow_consumers, 1)
+            self.assertEqual(output.spilled, 11)
+            self.assertEqual(output.disconnected, 0)
+
+        self.run_based(test)
+
+    def test_spill_limit(self) -> None:
+        """
+        Test disconnecting a slow consumer if its spill file is too large
+        """
+
+        async def test() -> None:
+            events: List[Event] = [InfoEvent("a" * 2000),
+                                   InfoEvent("b" * 2000)]
+            spilled: List[Event] = [BuddyEvent(0, "online", f"{i}@example.com",
+                                               "") for i in range(100)]
+            replies = await self.run_slow("spill", events, spilled,
+                                          "--slow-consumer-spill", "1000")
+            self.assertFalse([reply for reply in replies
+                              if reply.startswith("info: version: ")])
+            output = self.based.server.output
+            self.assertEqual(output.slow_consumers, 1)
+            self.assertEqual(output.disconnected, 1)
+            self.assertFalse(self.based.server.connected)
+
+            # events that were not sent, including the spilled events, are
+            # queued again for the next client as events of their types
+            queued = []
+            while not self.based.queue.empty():
+                queued.append(self.based.queue.get_nowait())
+            self.assertEqual(replies + [event.serialize()[:-2]
+                                        for event in queued],
+                             [event.serialize()[:-2]
+                              for event in events + spilled])
+            self.assertEqual([type(event) for event in queued],
+                             [type(event) for event in events + spilled]
+                             [len(replies):])
+
+        self.run_based(test)
+
+    def test_close(self) -> None:
+        """
+        Test closing a client that does not read its remaining data
+        """
+
+        async def test() -> None:
+            await self.based.setup(["--dir", self.test_dir,
+                                    "--slow-consumer-timeout", "0.2",
+                                    "--slow-consumer-policy", "spill"])
+            reader, writer = await open_connection(self.based.server, LIMIT)
+            events = [InfoEvent(f"{i:04}" + "a" * 1000) for i in range(20)]
+            for event in events:
+                self.based.queue.put_nowait(event)
+            await asyncio.sleep(0.5)
+            writer.write(b"bye\r\n")
+            await asyncio.sleep(0.5)
+            self.assertFalse(self.based.server.connected)
+
+            # events that were not sent are queued again for the next client
+            replies = (await asyncio.wait_for(reader.read(), 10)).decode()
+            queued = []
+            while not self.based.queue.empty():
+                queued.append(self.based.queue.get_nowait().serialize()[:-2])
+            self.assertTrue(queued)
+            self.assertEqual(replies.splitlines() + queued,
+                             [event.serialize()[:-2] for event in events])
+            writer.close()
+            await writer.wait_closed()
+
+        self.run_based(test)
+
+    def test_error(self) -> None:
+        """
+        Test failing to send data does not block adding more data
+        """
+
+        async def test() -> None:
+            writer = BrokenWriter()
+            client = ClientWriter(Config("test", "0.1"),
+                                  writer,  # type: ignore
+                                  WriterStats())
+            client.setup()
+            data = "a" * 100 + "\r\n"
+            await asyncio.wait_for(client.send(data * (LANE_LIMIT // 50)), 10)
+            self.assertTrue(client.closed)
+            self.assertTrue(writer.transport.aborted)
+            await client.close()
+
+        self.run_based(test)
+
+    def test_lanes(self) -> None:
+        """
+        Test replies overtake a presence flood
+        """
+
+        async def test() -> None:
+            await self.based.setup(["--dir", self.test_dir])
+            reader, writer = await open_connection(self.based.server, LIMIT)
+            for i in range(500):
+                self.based.queue.put_nowait(BuddyEvent(0, "online",
+                                                       f"{i}@example.com", ""))
+            await asyncio.sleep(0.1)
+            writer.write(b"version\r\nbye\r\n")
+            await asyncio.sleep(0.1)
+
+            replies = (await asyncio.wait_for(reader.read(), 10)).decode()
+            lines = replies.splitlines()
+            self.assertEqual(len(lines), 501)
+            version = [i for i, line in enumerate(lines)
+                       if line.startswith("info: version: ")]
+            self.assertEqual(len(version), 1)
+            self.assertLess(version[0], 250)
+            writer.close()
+            await writer.wait_closed()
+
+        self.run_based(test)
+
+
+if __name__ == '__main__':
+    unittest.main()